@@ -0,0 +1,153 @@
+"""
+Consumer throughput with 1 to 16 key lanes against local stand-ins for S3, Redis and MongoDB.
+
+Each stand-in call costs a fixed round trip plus a per-item cost, and a small share of the
+records are delete_all_snaps for users with a couple of thousand snaps, which is what used
+to hold up every other record in the batch.
+
+    python -m backend.benchmarks.bench_consumer_concurrency
+"""
+import json
+import time
+import random
+import argparse
+from unittest.mock import patch
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.infra import messaging
+
+class StandInRecord:
+    def __init__(self, message: dict, key: str, offset: int):
+        self._value = json.dumps(message).encode("utf-8")
+        self._key = key.encode("utf-8")
+        self._offset = offset
+
+    def topic(self):
+        return "bench"
+
+    def partition(self):
+        return 0
+
+    def offset(self):
+        return self._offset
+
+    def key(self):
+        return self._key
+
+    def value(self):
+        return self._value
+
+class StandInS3:
+    def __init__(self, snaps_per_user: int):
+        self.snaps_per_user = snaps_per_user
+
+    def delete_objects(self, Bucket, Delete):
+        time.sleep(0.020 + 0.00005 * len(Delete["Objects"]))
+        return {}
+
+    def get_paginator(self, operation):
+        return self
+
+    def paginate(self, Bucket, Prefix, PaginationConfig, **kwargs):
+        page_size = PaginationConfig["PageSize"]
+
+        for start in range(0, self.snaps_per_user, page_size):
+            time.sleep(0.015)
+            yield { "Contents": [{ "Key": f"{Prefix}{i}.jpg" } for i in range(start, min(start + page_size, self.snaps_per_user))] }
+
+class StandInRedisPipeline:
+    def __init__(self):
+        self.commands = 0
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands += 1
+
+        return queue
+
+    def execute(self, raise_on_error):
+        time.sleep(0.0005 + 0.00002 * self.commands)
+        return [1] * self.commands
+
+class StandInRedis:
+    def pipeline(self, transaction):
+        return StandInRedisPipeline()
+
+    def get(self, key):
+        time.sleep(0.0005)
+        return None
+
+    def set(self, *args, **kwargs):
+        time.sleep(0.0005)
+
+    def delete(self, *args):
+        time.sleep(0.0005)
+
+class StandInMongoCollection:
+    def bulk_write(self, writes, ordered):
+        time.sleep(0.002 + 0.0001 * len(writes))
+
+def _make_batches(batches: int, batch_size: int) -> list[list]:
+    rng = random.Random(7)
+    offset = 0
+    result = []
+
+    for _ in range(batches):
+        batch = []
+
+        for _ in range(batch_size):
+            user_id = rng.randint(1, 500)
+            s3_key = f"{user_id}/snap/{rng.getrandbits(32)}.jpg"
+            roll = rng.random()
+
+            if roll < 0.40:
+                message, key = { "operation": "delete_session", "session_key": f"session:{user_id}" }, f"session:{user_id}"
+            elif roll < 0.80:
+                message, key = { "operation": "write_img_caption", "s3_key": s3_key, "caption": "bench" }, s3_key
+            elif roll < 0.97:
+                message, key = { "operation": "delete_snap", "s3_key": s3_key }, s3_key
+            else:
+                message, key = { "operation": "delete_all_snaps", "user_id": user_id }, str(user_id)
+
+            batch.append(StandInRecord(message, key, offset))
+            offset += 1
+
+        result.append(batch)
+
+    return result
+
+def _run(lanes: int, batches: list[list]) -> float:
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=lanes) as executor:
+        for batch in batches:
+            tracker = messaging.PartitionOffsetTracker(batch)
+            messaging.process_with_retries(batch, tracker, executor, lanes)
+
+    return sum(len(batch) for batch in batches) / (time.perf_counter() - start)
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batches", type=int, default=10)
+    parser.add_argument("--snaps-per-user", type=int, default=2000)
+    args = parser.parse_args()
+
+    batches = _make_batches(args.batches, messaging.BATCH_SIZE)
+    unthrottled = { "initial_rate": 1e9, "min_rate": 1e9, "max_rate": 1e9, "target_latency": 60, "increase_step": 0 }
+
+    with patch.object(messaging, "S3_CLIENT", StandInS3(args.snaps_per_user)), \
+         patch.object(messaging, "REDIS_CLIENT", StandInRedis()), \
+         patch.object(messaging, "MONGO_COLLECTION", StandInMongoCollection()), \
+         patch.object(messaging, "S3_BUCKET", messaging.AdaptiveTokenBucket("s3", **unthrottled)), \
+         patch.object(messaging, "REDIS_BUCKET", messaging.AdaptiveTokenBucket("redis", **unthrottled)), \
+         patch.object(messaging, "MONGODB_BUCKET", messaging.AdaptiveTokenBucket("mongodb", **unthrottled)):
+        print(f"{'lanes':>6}{'msgs/sec':>12}{'speedup':>10}")
+        baseline = None
+
+        for lanes in (1, 2, 4, 8, 16):
+            throughput = _run(lanes, batches)
+            baseline = baseline or throughput
+            print(f"{lanes:>6}{throughput:>12.0f}{throughput / baseline:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Local ONNX detection under concurrent uploads, each image detected on its own (unbatched)
+against DetectionBatcher gathering images that arrive within `--max-wait-ms` into one
+`detect_batch` call of up to `--max-batch-size`.
+
+Reports images/sec and p95 latency per concurrency level. Use a YOLO export with a dynamic
+batch axis so a batch is a single session run:
+
+    yolo export model=yolo11n.pt format=onnx dynamic=True
+    python -m backend.benchmarks.bench_detection_batching --model yolo11n.onnx
+"""
+import io
+import time
+import asyncio
+import argparse
+
+from PIL import Image
+
+from backend.services.computer_vision import OnnxDetector, DetectionBatcher
+
+def _p95(latencies: list[float]) -> float:
+    ordered = sorted(latencies)
+    return ordered[int(len(ordered) * 0.95) - 1 if len(ordered) > 1 else 0]
+
+def _snap_bytes() -> bytes:
+    "A phone-sized JPEG, decoding and letterboxing it is part of what's measured"
+
+    buffer = io.BytesIO()
+    Image.effect_noise((1280, 960), 64).convert("RGB").save(buffer, format="JPEG", quality=85)
+
+    return buffer.getvalue()
+
+async def _run(detector, img_content: bytes, concurrency: int, images: int) -> tuple[float, float]:
+    latencies = []
+    remaining = images
+
+    async def uploader() -> None:
+        nonlocal remaining
+
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            await detector.detect(img_content)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(uploader() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return images / elapsed, _p95(latencies) * 1000
+
+async def _compare(args: argparse.Namespace) -> None:
+    img_content = _snap_bytes()
+    onnx_detector = OnnxDetector(args.model, processes=args.processes)
+    batcher = DetectionBatcher(onnx_detector, args.max_batch_size, args.max_wait_ms)
+
+    # Spawns the workers and loads the model in each before anything is timed
+    await asyncio.gather(*(onnx_detector.detect(img_content) for _ in range(args.processes * 2)))
+
+    print(f"{'mode':<11}{'concurrency':>12}{'images/sec':>12}{'p95 ms':>10}")
+
+    for concurrency in (1, 8, 32):
+        for mode, detector in (("unbatched", onnx_detector), ("batched", batcher)):
+            throughput, p95 = await _run(detector, img_content, concurrency, args.images)
+            print(f"{mode:<11}{concurrency:>12}{throughput:>12.1f}{p95:>10.1f}")
+
+    await batcher.close()
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", required=True, help="YOLO ONNX export, ideally with a dynamic batch axis")
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--images", type=int, default=256)
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    asyncio.run(_compare(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Produce throughput and latency of the Kafka producer gateway against a local stand-in broker.
+
+Compares the old per-request `flush(timeout=15)`, the polling gateway and the group-commit
+gateway at 1, 50 and 500 concurrent producers.
+
+    python -m backend.benchmarks.bench_kafka_producer
+"""
+import time
+import asyncio
+import argparse
+import threading
+
+from backend.infra.messaging import KafkaProducerGateway, KAFKA_PRODUCER_LINGER_MS
+
+class StandInBroker:
+    """
+    Mimics the parts of confluent_kafka.Producer the gateway uses. Every request to the
+    broker costs one round trip; `poll` sends whatever has lingered for `linger_ms`, and
+    `flush` sends everything immediately.
+    """
+
+    def __init__(self, rtt_ms: float = 2.0, linger_ms: float = KAFKA_PRODUCER_LINGER_MS):
+        self.rtt = rtt_ms / 1000
+        self.linger = linger_ms / 1000
+        self.lock = threading.Lock()
+        self.queue = []
+
+    def produce(self, topic, key, value, on_delivery):
+        with self.lock:
+            self.queue.append((time.perf_counter(), on_delivery))
+
+    def _send(self, batch) -> None:
+        if not batch:
+            return
+
+        time.sleep(self.rtt)
+
+        for _, on_delivery in batch:
+            on_delivery(None, _DeliveredMessage)
+
+    def poll(self, timeout):
+        deadline = time.perf_counter() + timeout
+
+        while True:
+            with self.lock:
+                now = time.perf_counter()
+                ready = [m for m in self.queue if now - m[0] >= self.linger]
+                self.queue = [m for m in self.queue if now - m[0] < self.linger]
+
+            if ready or now >= deadline:
+                self._send(ready)
+                return len(ready)
+
+            time.sleep(min(0.001, deadline - now))
+
+    def flush(self, timeout=None):
+        with self.lock:
+            batch, self.queue = self.queue, []
+
+        self._send(batch)
+
+        return 0
+
+class _DeliveredMessage:
+    @staticmethod
+    def topic():
+        return "bench"
+
+    @staticmethod
+    def offset():
+        return 0
+
+def _p99(latencies: list[float]) -> float:
+    ordered = sorted(latencies)
+    return ordered[int(len(ordered) * 0.99) - 1 if len(ordered) > 1 else 0]
+
+async def _run(mode: str, concurrency: int, messages_per_producer: int, rtt_ms: float, linger_ms: float) -> tuple[float, float]:
+    broker = StandInBroker(rtt_ms=rtt_ms, linger_ms=linger_ms)
+    gateway = KafkaProducerGateway(
+        broker,
+        poll_timeout=0.01,
+        group_commit_window_ms=5 if mode == "group-commit" else None,
+    )
+    latencies = []
+
+    async def producer(i: int) -> None:
+        for n in range(messages_per_producer):
+            start = time.perf_counter()
+
+            if mode == "flush-per-call":
+                # The pre-gateway behavior: blocking produce + flush on the event loop
+                broker.produce("bench", str(i).encode(), b"{}", lambda err, msg: None)
+                broker.flush(timeout=15)
+            else:
+                await gateway.send("bench", str(i), { "n": n })
+
+            latencies.append(time.perf_counter() - start)
+
+    if mode != "flush-per-call":
+        gateway.start()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(producer(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    if mode != "flush-per-call":
+        await gateway.stop()
+
+    return len(latencies) / elapsed, _p99(latencies) * 1000
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages-per-producer", type=int, default=10)
+    parser.add_argument("--rtt-ms", type=float, default=2.0)
+    parser.add_argument("--linger-ms", type=float, default=KAFKA_PRODUCER_LINGER_MS)
+    args = parser.parse_args()
+
+    print(f"{'mode':<16}{'producers':>10}{'msgs/sec':>12}{'p99 ms':>10}")
+
+    for mode in ("flush-per-call", "poll", "group-commit"):
+        for concurrency in (1, 50, 500):
+            throughput, p99 = asyncio.run(_run(mode, concurrency, args.messages_per_producer, args.rtt_ms, args.linger_ms))
+            print(f"{mode:<16}{concurrency:>10}{throughput:>12.0f}{p99:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Requests/sec of the `/` session lookup with the sync Redis client (before) and the
+asyncio client (after), against a local stand-in Redis that answers HGETALL after a fixed
+network latency.
+
+Every simulated request runs the lookup `/` does on a session cache miss, at 1, 50 and 200
+concurrent requests on one event loop, which is what a single uvicorn worker sees.
+
+    python -m backend.benchmarks.bench_session_lookup
+"""
+import time
+import asyncio
+import argparse
+import threading
+from unittest.mock import patch
+
+import redis
+import redis.asyncio
+
+from backend.infra.sessions import Redis
+
+SESSION = { "user_id": "1", "thumbnail_img_url": "", "created_at": "2025-01-01T00:00:00" }
+
+def _encode(value) -> bytes:
+    if isinstance(value, dict):
+        items = [part for pair in value.items() for part in pair]
+        return f"*{len(items)}\r\n".encode() + b"".join(_encode(item) for item in items)
+
+    data = str(value).encode()
+
+    return f"${len(data)}\r\n".encode() + data + b"\r\n"
+
+class StandInRedisServer:
+    "Speaks just enough RESP2 for HGETALL, every reply is delayed by `latency_ms`"
+
+    def __init__(self, latency_ms: float):
+        self.latency = latency_ms / 1000
+        self.port = None
+        self._ready = threading.Event()
+
+    async def _read_command(self, reader) -> list[bytes]:
+        header = await reader.readline()
+
+        if not header:
+            raise ConnectionError("client closed")
+
+        parts = []
+
+        for _ in range(int(header[1:])):
+            length = int((await reader.readline())[1:])
+            parts.append((await reader.readexactly(length + 2))[:-2])
+
+        return parts
+
+    async def _serve_client(self, reader, writer) -> None:
+        try:
+            while True:
+                command = await self._read_command(reader)
+
+                if command[0].upper() == b"HGETALL":
+                    await asyncio.sleep(self.latency)
+                    writer.write(_encode(SESSION))
+                else:
+                    writer.write(b"+OK\r\n")
+
+                await writer.drain()
+
+        except (ConnectionError, asyncio.IncompleteReadError):
+            writer.close()
+
+    def _run(self) -> None:
+        async def serve():
+            server = await asyncio.start_server(self._serve_client, "127.0.0.1", 0)
+            self.port = server.sockets[0].getsockname()[1]
+            self._ready.set()
+
+            await server.serve_forever()
+
+        asyncio.run(serve())
+
+    def start(self) -> int:
+        threading.Thread(target=self._run, daemon=True).start()
+        self._ready.wait()
+
+        return self.port
+
+async def _run(mode: str, port: int, concurrency: int, requests: int) -> float:
+    sync_client = redis.Redis(port=port, protocol=2, decode_responses=True)
+    async_client = redis.asyncio.Redis(
+        connection_pool=redis.asyncio.BlockingConnectionPool(port=port, protocol=2, max_connections=100, decode_responses=True),
+    )
+    remaining = requests
+
+    async def worker() -> None:
+        nonlocal remaining
+
+        while remaining > 0:
+            remaining -= 1
+
+            if mode == "sync":
+                # Before: the blocking hgetall called straight from the async handler
+                session = sync_client.hgetall("session:bench")
+            else:
+                session = await Redis.get_session("session:bench")
+
+            assert session["user_id"] == "1"
+
+    with patch("backend.infra.sessions.ASYNC_REDIS_CLIENT", async_client):
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    sync_client.close()
+    await async_client.aclose()
+
+    return requests / elapsed
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency-ms", type=float, default=1.0)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    port = StandInRedisServer(args.latency_ms).start()
+
+    print(f"{'client':<8}{'concurrency':>12}{'req/sec':>10}")
+
+    for mode in ("sync", "async"):
+        for concurrency in (1, 50, 200):
+            throughput = asyncio.run(_run(mode, port, concurrency, args.requests))
+            print(f"{mode:<8}{concurrency:>12}{throughput:>10.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+`/snap/all` for libraries of 10, 1k and 10k snaps, with the sequential positional merge
+(before) and the page-by-page join on s3_key (after), which reads each catalog page's tags
+with an `$in` on its keys.
+
+The catalog and MongoDB are local stand-ins that answer after a fixed round trip plus a
+per-row cost, Mongo one `mongo_read_batch_size` batch per round trip. 1% of the snaps have no
+tags document and Mongo orders by its own created_at, which is what the stores look like after
+failed detections and clock differences. "mismatched" counts snaps returned with another
+snap's tags, "peak KiB" is what tracemalloc saw during one more listing.
+
+    python -m backend.benchmarks.bench_snap_listing
+"""
+import time
+import random
+import tracemalloc
+import asyncio
+import argparse
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from backend.main import app
+from backend.infra.db_tagging import MongoDB
+from backend.routers import snap
+
+ROUND_TRIP = 0.001
+ROW_COST = 0.000002
+
+class StandInCatalog:
+    def __init__(self, snaps: list[dict]):
+        self.snaps = snaps
+        # Stands in for the (user_id, created_at, s3_key) index, `after` is always a listed snap
+        self.positions = { snap["s3_key"]: i for i, snap in enumerate(snaps) }
+
+    async def read_snaps(self, user_id: int, limit=None, after=None) -> list[dict]:
+        start = self.positions[after[1]] + 1 if after else 0
+        snaps = self.snaps[start:start + limit if limit else None]
+        await asyncio.sleep(ROUND_TRIP + ROW_COST * len(snaps))
+
+        return [dict(snap) for snap in snaps]
+
+class StandInMongoCursor:
+    def __init__(self, documents: list[dict], batch_size: int):
+        self.documents = documents
+        self.batch_size = batch_size
+        self.position = 0
+
+    def sort(self, key, direction):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.position == len(self.documents):
+            raise StopAsyncIteration
+
+        if self.position % self.batch_size == 0:
+            await asyncio.sleep(ROUND_TRIP + ROW_COST * self.batch_size)
+
+        self.position += 1
+
+        return dict(self.documents[self.position - 1])
+
+class StandInMongoCollection:
+    def __init__(self, documents: list[dict]):
+        self.documents = documents
+        self.by_s3_key = { document["s3_key"]: document for document in documents }
+
+    def find(self, query, projection, batch_size):
+        documents = self.documents
+
+        if "s3_key" in query:
+            documents = [self.by_s3_key[s3_key] for s3_key in query["s3_key"]["$in"] if s3_key in self.by_s3_key]
+            documents.sort(key=lambda document: document["created_at"], reverse=True)
+
+        return StandInMongoCursor(documents, batch_size)
+
+def _make_library(snap_count: int) -> tuple[list[dict], list[dict]]:
+    rng = random.Random(snap_count)
+    start = datetime(2025, 1, 1)
+    snaps, documents = [], []
+
+    for i in range(snap_count):
+        created_at = start + timedelta(seconds=i * 60)
+        s3_key = f"1/snap/{int(created_at.timestamp())}_{i}.jpg"
+        snaps.append({ "img_url": f"https://bucket/{s3_key}", "created_at": created_at.isoformat(), "file_size": 1024, "s3_key": s3_key })
+
+        if rng.random() < 0.01:
+            continue
+
+        # Tagged a little after the upload, so neighbours can swap places in Mongo's order
+        tagged_at = created_at + timedelta(seconds=rng.uniform(0, 90))
+        documents.append({ "s3_key": s3_key, "tags": [f"tag_{i}"], "caption": "", "created_at": tagged_at })
+
+    snaps.sort(key=lambda snap: (snap["created_at"], snap["s3_key"]), reverse=True)
+    documents.sort(key=lambda document: document["created_at"], reverse=True)
+
+    return snaps, documents
+
+async def _all_snaps_before(session: dict) -> list[dict]:
+    # routers/snap.py:all before the hash join, one store after the other zipped by position
+    user_id = session["user_id"]
+
+    snaps = iter(await app.state.rds.read_snaps(user_id))
+    snaps_with_tags_and_captions = []
+
+    async for tags_and_caption in MongoDB.stream_img_tags_and_captions(user_id):
+        snap = next(snaps, None)
+
+        if snap is None:
+            break
+
+        snaps_with_tags_and_captions.append({
+            "img_url": snap["img_url"],
+            "created_at": snap["created_at"],
+            "file_size": snap["file_size"],
+            "s3_key": snap["s3_key"],
+            "tags": tags_and_caption["tags"],
+            "caption": tags_and_caption["caption"],
+        })
+
+    return snaps_with_tags_and_captions
+
+def _mismatched(listing: list[dict], documents: list[dict]) -> int:
+    tags = { document["s3_key"]: document["tags"] for document in documents }
+    return sum(1 for snap in listing if snap["tags"] != tags.get(snap["s3_key"], []))
+
+async def _run(mode: str, snap_count: int, repeats: int) -> tuple[float, int, int, float]:
+    snaps, documents = _make_library(snap_count)
+    all_snaps = _all_snaps_before if mode == "sequential" else snap._all_snaps
+    elapsed = []
+
+    with patch.object(app.state, "rds", StandInCatalog(snaps), create=True), \
+         patch("backend.infra.db_tagging.ASYNC_MONGO_COLLECTION", StandInMongoCollection(documents)):
+        for _ in range(repeats):
+            start = time.perf_counter()
+            listing = await all_snaps({ "user_id": 1 })
+            elapsed.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        await all_snaps({ "user_id": 1 })
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return sorted(elapsed)[len(elapsed) // 2] * 1000, len(listing), _mismatched(listing, documents), peak / 1024
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'snaps':>7}{'merge':>12}{'median ms':>11}{'returned':>10}{'mismatched':>12}{'peak KiB':>10}")
+
+    for snap_count in (10, 1000, 10000):
+        for mode in ("sequential", "paged-join"):
+            median, returned, mismatched, peak = asyncio.run(_run(mode, snap_count, args.repeats))
+            print(f"{snap_count:>7}{mode:>12}{median:>11.1f}{returned:>10}{mismatched:>12}{peak:>10.0f}")
+
+if __name__ == "__main__":
+    main()
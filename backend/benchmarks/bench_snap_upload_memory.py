@@ -0,0 +1,152 @@
+"""
+Peak worker RSS while 100 snaps of 10 MB are uploaded concurrently, with the old
+`BytesIO(await img_file.read())` + blocking `upload_fileobj` path (before) and the streamed
+`S3.upload_snap` path (after).
+
+Uploads go through a real boto3 client to a local stand-in S3 endpoint that discards the bytes,
+and each mode runs in its own process so the peaks don't mix. The snaps are spooled the way
+Starlette spools multipart uploads, in memory up to 1 MB and on disk after that.
+
+    python -m backend.benchmarks.bench_snap_upload_memory
+"""
+import os
+import time
+import uuid
+import asyncio
+import argparse
+import multiprocessing
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest.mock import patch
+
+import boto3
+from botocore.config import Config
+from starlette.datastructures import UploadFile, Headers
+
+from backend.infra.storage import S3
+
+class StandInS3Handler(BaseHTTPRequestHandler):
+    "Answers PutObject and the multipart upload calls, request bodies are read and dropped"
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _discard_body(self) -> None:
+        remaining = int(self.headers.get("Content-Length", 0))
+
+        while remaining > 0:
+            remaining -= len(self.rfile.read(min(remaining, 1024 * 1024)))
+
+    def _reply(self, body: bytes = b"") -> None:
+        self.send_response(200)
+        self.send_header("ETag", '"bench"')
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_PUT(self):
+        self._discard_body()
+        self._reply()
+
+    def do_POST(self):
+        self._discard_body()
+
+        if "uploads" in self.path:
+            self._reply(f"<InitiateMultipartUploadResult><UploadId>{uuid.uuid4()}</UploadId></InitiateMultipartUploadResult>".encode())
+        else:
+            self._reply(b"<CompleteMultipartUploadResult><ETag>\"bench\"</ETag></CompleteMultipartUploadResult>")
+
+def _serve(port: multiprocessing.Value) -> None:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInS3Handler)
+    port.value = server.server_address[1]
+    server.serve_forever()
+
+def _memory_mb(field: str) -> float:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(field):
+                return int(line.split()[1]) / 1024
+
+def _spooled_snap(size: int) -> UploadFile:
+    spool = SpooledTemporaryFile(max_size=1024 * 1024)
+    chunk = os.urandom(1024 * 1024)
+
+    for _ in range(size // len(chunk)):
+        spool.write(chunk)
+
+    spool.seek(0)
+
+    return UploadFile(spool, size=size, filename="bench.jpg", headers=Headers({ "content-type": "image/jpeg" }))
+
+async def _upload_before(s3_client, img_file: UploadFile) -> None:
+    img_content = BytesIO(await img_file.read())
+
+    s3_client.upload_fileobj(
+        Bucket="bench",
+        Key=f"1/snap/{uuid.uuid4()}.jpg",
+        Fileobj=img_content,
+        ExtraArgs={ "ContentType": img_file.content_type, "ACL": "public-read" },
+    )
+
+def _run(mode: str, port: int, uploads: int, size: int, results) -> None:
+    s3_client = boto3.client(
+        "s3",
+        endpoint_url=f"http://127.0.0.1:{port}",
+        region_name="us-east-1",
+        aws_access_key_id="bench",
+        aws_secret_access_key="bench",
+        config=Config(s3={ "addressing_style": "path" }, max_pool_connections=50),
+    )
+    img_files = [_spooled_snap(size) for _ in range(uploads)]
+
+    # Resets VmHWM so the peak only covers this process from here on
+    with open("/proc/self/clear_refs", "w") as clear_refs:
+        clear_refs.write("5")
+
+    baseline = _memory_mb("VmRSS")
+
+    async def upload_all():
+        if mode == "buffered":
+            await asyncio.gather(*(_upload_before(s3_client, img_file) for img_file in img_files))
+        else:
+            with patch("backend.infra.storage.S3_CLIENT", s3_client), patch("backend.infra.storage.BUCKET_NAME", "bench"):
+                await asyncio.gather(*(S3.upload_snap(1, img_file) for img_file in img_files))
+
+    start = time.perf_counter()
+    asyncio.run(upload_all())
+    elapsed = time.perf_counter() - start
+
+    results.put((baseline, _memory_mb("VmHWM"), elapsed))
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploads", type=int, default=100)
+    parser.add_argument("--size-mb", type=int, default=10)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("fork")
+    port = context.Value("i", 0)
+    server = context.Process(target=_serve, args=(port,), daemon=True)
+    server.start()
+
+    while port.value == 0:
+        time.sleep(0.01)
+
+    print(f"{'path':<10}{'uploads':>9}{'baseline MB':>13}{'peak MB':>10}{'growth MB':>11}{'seconds':>9}")
+
+    for mode in ("buffered", "streamed"):
+        results = context.Queue()
+        worker = context.Process(target=_run, args=(mode, port.value, args.uploads, args.size_mb * 1024 * 1024, results))
+        worker.start()
+        baseline, peak, elapsed = results.get()
+        worker.join()
+
+        print(f"{mode:<10}{args.uploads:>9}{baseline:>13.0f}{peak:>10.0f}{peak - baseline:>11.0f}{elapsed:>9.1f}")
+
+    server.terminate()
+
+if __name__ == "__main__":
+    main()
@@ -7,14 +7,67 @@ load_dotenv()
 env = os.getenv
 
 class Settings(BaseSettings):
-    env = "dev" # "prod" in production
-    app_name = "Firesnaps"
-    cors_origins = ["https://firesnaps.co"] if env == "prod" else ["http://localhost:3000", "https://firesnaps.co"]
-    trusted_hosts = ["api.firesnaps.co"] if env == "prod" else ["localhost", "127.0.0.1", "api.firesnaps.co"]
+    env: str = "dev" # "prod" in production
+    app_name: str = "Firesnaps"
+    cors_origins: list[str] = ["https://firesnaps.co"] if env == "prod" else ["http://localhost:3000", "https://firesnaps.co"]
+    trusted_hosts: list[str] = ["api.firesnaps.co"] if env == "prod" else ["localhost", "127.0.0.1", "api.firesnaps.co"]
     
-    csrf_secret_key = env("APP_CSRF_SECRET_KEY")
-    csrf_cookie_samesite = "lax"
-    csrf_cookie_secure = True if env == "prod" else False
-    csrf_token_location = "header"
+    # The `env` field shadows the module's os.getenv alias inside the class body
+    csrf_secret_key: str = os.getenv("APP_CSRF_SECRET_KEY")
+    csrf_cookie_samesite: str = "lax"
+    csrf_cookie_secure: bool = True if env == "prod" else False
+    csrf_token_location: str = "header"
     
-    rate_slowapi_limiter = "50/minute"
+    rate_slowapi_limiter: str = "50/minute"
+    
+    # Kafka producer: when enabled, messages produced within the window are acknowledged by one flush
+    kafka_producer_group_commit: bool = False
+    kafka_producer_group_commit_window_ms: int = 5
+    
+    # Linger for fire-and-forget sends (the write-through audit events), nothing awaits them
+    # so they can wait longer for fuller lz4 batches
+    kafka_producer_background_linger_ms: int = 500
+    
+    # Disable in web workers when the consumer runs as `python -m backend.infra.consumer_worker`
+    run_in_process_consumer: bool = True
+    
+    # Parallel lanes per consumer process, records with the same message key always share a lane
+    consumer_concurrency: int = 4
+    
+    # Write new sessions and OTPs straight to Redis instead of waiting for the consumer,
+    # their Kafka events are still produced for auditing
+    session_write_through: bool = False
+    
+    # Connections in the request handlers' asyncio Redis pool (REDIS_ASYNC_POOL_SIZE)
+    redis_async_pool_size: int = 100
+    
+    # Per-process session cache, invalidated by the consumer over Redis pub/sub
+    session_cache_max_entries: int = 10000
+    session_cache_ttl_seconds: float = 30
+    
+    # "psycopg2" runs the sync RDS queries on a thread pool, "asyncpg" uses the asyncio engine
+    rds_driver: str = "psycopg2"
+    
+    # Documents fetched per round trip when streaming a user's tags and captions
+    mongo_read_batch_size: int = 100
+    
+    # Hard cap on a single snap upload, enforced while the file is streamed to S3
+    snap_upload_max_bytes: int = 20 * 1024 * 1024
+    
+    # How long a presigned direct-to-S3 snap upload form stays valid
+    snap_presigned_upload_expires_seconds: int = 300
+    
+    # /snap/all page size when only a cursor is given, and the largest `limit` accepted
+    snap_page_size: int = 50
+    snap_page_max_size: int = 200
+    
+    # Object detection: "roboflow" calls the hosted model, "onnx" runs the YOLO export at
+    # YOLO_ONNX_MODEL_PATH on this many local CPU worker processes
+    detector_backend: str = "roboflow"
+    onnx_detector_processes: int = 2
+    
+    # Detection micro-batching: images arriving within the wait of the first pending one are
+    # detected in one call, up to the max batch size
+    detector_batching: bool = False
+    detector_batch_max_size: int = 8
+    detector_batch_max_wait_ms: float = 5
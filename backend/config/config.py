@@ -1,11 +1,17 @@
 import os
+import importlib.util
 
 import boto3
+import httpx
 import redis
+import redis.asyncio
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
 from sqlalchemy.pool import QueuePool
-from pymongo import MongoClient
+from sqlalchemy.ext.asyncio import create_async_engine
+from pymongo import MongoClient, AsyncMongoClient
+
+from backend.config.app_settings_config import Settings
 
 load_dotenv()
 env = os.getenv
@@ -19,11 +25,17 @@ def get_rds_db_url():
     
     return f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{db_name}?sslmode=require"
 
+def get_async_rds_db_url():
+    return get_rds_db_url().replace("postgresql+psycopg2://", "postgresql+asyncpg://").replace("?sslmode=require", "")
+
+RDS_POOL_SIZE = 25
+RDS_MAX_OVERFLOW = 50
+
 RDS_ENGINE = create_engine(
     get_rds_db_url(),
     poolclass=QueuePool,
-    pool_size=25,
-    max_overflow=50,
+    pool_size=RDS_POOL_SIZE,
+    max_overflow=RDS_MAX_OVERFLOW,
     pool_pre_ping=True,
     pool_recycle=3600,
     connect_args={
@@ -32,6 +44,21 @@ RDS_ENGINE = create_engine(
     },
 )
 
+def create_async_rds_engine():
+    # Only built when RDS_DRIVER=asyncpg, so the psycopg2 setup doesn't need asyncpg installed
+    return create_async_engine(
+        get_async_rds_db_url(),
+        pool_size=RDS_POOL_SIZE,
+        max_overflow=RDS_MAX_OVERFLOW,
+        pool_pre_ping=True,
+        pool_recycle=3600,
+        connect_args={
+            "ssl": "require",
+            "timeout": 10,
+            "server_settings": { "application_name": "Snapthril Backend" },
+        },
+    )
+
 REDIS_CLIENT = redis.Redis(
     host=env("REDIS_HOST"),
     port=int(env("REDIS_PORT")),
@@ -49,6 +76,29 @@ REDIS_CLIENT = redis.Redis(
     health_check_interval=30,
 )
 
+# Used by the request handlers, the sync client above is kept for the consumer thread.
+# Requests beyond the pool size wait up to `timeout` seconds for a free connection.
+ASYNC_REDIS_CLIENT = redis.asyncio.Redis(
+    connection_pool=redis.asyncio.BlockingConnectionPool(
+        connection_class=redis.asyncio.SSLConnection,
+        max_connections=Settings().redis_async_pool_size,
+        timeout=5,
+        host=env("REDIS_HOST"),
+        port=int(env("REDIS_PORT")),
+        username="default",
+        password=env("REDIS_USER_PASS"),
+        ssl_cert_reqs=None,
+        ssl_ca_certs=None,
+        ssl_keyfile=None,
+        decode_responses=True,
+        socket_timeout=5,
+        socket_connect_timeout=10,
+        retry_on_timeout=True,
+        socket_keepalive=True,
+        health_check_interval=30,
+    ),
+)
+
 S3_CLIENT = boto3.client(
     "s3",
     aws_access_key_id=env("AWS_S3_ACCESS_KEY_ID"),
@@ -70,3 +120,34 @@ MONGO_CLIENT = MongoClient(
 )
 MONGO_DB = MONGO_CLIENT[env("MONGO_DB_NAME")]
 MONGO_COLLECTION = MONGO_DB.image_tags
+
+# Used by the request handlers, MONGO_COLLECTION above is kept for the consumer thread
+ASYNC_MONGO_CLIENT = AsyncMongoClient(
+    env("MONGO_CONNECTION_STRING"),
+    tls=True,
+    tlsAllowInvalidCertificates=False,
+    socketTimeoutMS=5000,
+    connectTimeoutMS=10000,
+    maxPoolSize=120,
+    retryWrites=True,
+    retryReads=True,
+)
+ASYNC_MONGO_COLLECTION = ASYNC_MONGO_CLIENT[env("MONGO_DB_NAME")].image_tags
+
+# Roboflow inference, shared by every detection call so connections are kept alive between
+# uploads. HTTP/2 needs the optional h2 package, without it the client speaks HTTP/1.1.
+ROBOFLOW_MAX_CONCURRENCY = int(env("ROBOFLOW_MAX_CONCURRENCY", "16"))
+
+ROBOFLOW_HTTP_CLIENT = httpx.AsyncClient(
+    base_url="https://detect.roboflow.com",
+    http2=importlib.util.find_spec("h2") is not None,
+    timeout=httpx.Timeout(
+        float(env("ROBOFLOW_READ_TIMEOUT_SECONDS", "15")),
+        connect=float(env("ROBOFLOW_CONNECT_TIMEOUT_SECONDS", "3")),
+    ),
+    limits=httpx.Limits(
+        max_connections=ROBOFLOW_MAX_CONCURRENCY,
+        max_keepalive_connections=ROBOFLOW_MAX_CONCURRENCY,
+        keepalive_expiry=60,
+    ),
+)
@@ -0,0 +1,139 @@
+"""
+Standalone Kafka consumer worker, so the consumer doesn't run inside the web workers.
+
+Runs N consumer processes in the "msg-queue-for-external-services" consumer group, each one
+owning the partitions the group assigns it. On SIGTERM/SIGINT every process finishes and
+commits the batch it is working on, leaves the group and exits.
+
+    python -m backend.infra.consumer_worker --processes 4
+
+Run it from the repository root, like `uvicorn backend.main:app`, every module is imported as
+backend.*. Set RUN_IN_PROCESS_CONSUMER=false for the API processes when running this.
+
+A consumer that dies is restarted after a capped exponential backoff. One that dies more than
+--max-restarts times within --restart-window seconds is logged as an error and the worker
+stops with a non-zero exit, leaving it to the supervisor.
+"""
+import sys
+import time
+import signal
+import argparse
+import threading
+import multiprocessing
+from collections import deque
+from multiprocessing.connection import wait
+
+class RestartBackoff:
+    "Restart delays for one consumer process, None once it has died too often within the window"
+
+    def __init__(self, max_restarts: int, window_seconds: float, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.max_restarts = max_restarts
+        self.window_seconds = window_seconds
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.restarts = deque()
+
+    def next_delay(self, now: float) -> float | None:
+        while self.restarts and self.restarts[0] <= now - self.window_seconds:
+            self.restarts.popleft()
+            
+        if len(self.restarts) >= self.max_restarts:
+            return None
+        
+        self.restarts.append(now)
+        
+        return min(self.max_delay, self.base_delay * 2 ** (len(self.restarts) - 1))
+
+def _run_consumer_process() -> None:
+    # Imported here so every spawned process builds its own clients and Kafka handles
+    from backend.main import app
+    from backend.config.logging_config import Logging
+    from backend.infra.messaging import run_consumer
+
+    app.state.logger = Logging()
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+
+    run_consumer(stop_event)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the Kafka consumer outside the API processes")
+    parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--drain-timeout", type=float, default=30.0)
+    parser.add_argument("--max-restarts", type=int, default=5)
+    parser.add_argument("--restart-window", type=float, default=300.0)
+    args = parser.parse_args()
+
+    from backend.config.logging_config import Logging
+    logger = Logging()
+
+    context = multiprocessing.get_context("spawn")
+    stopping = threading.Event()
+    processes = {}
+    backoffs = { index: RestartBackoff(args.max_restarts, args.restart_window) for index in range(args.processes) }
+    restart_at = {}
+    exit_code = 0
+
+    def start_process(index: int) -> None:
+        process = context.Process(target=_run_consumer_process, name=f"kafka-consumer-{index}")
+        process.start()
+        processes[index] = process
+
+    def stop(*_) -> None:
+        stopping.set()
+
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate() # SIGTERM, handled as a graceful drain
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for index in range(args.processes):
+        start_process(index)
+
+    # Replace consumers that die unexpectedly until asked to stop
+    while not stopping.is_set():
+        # A dead process's sentinel stays ready, waiting on it would spin through the backoff
+        wait([process.sentinel for process in processes.values() if process.is_alive()], timeout=1.0)
+        now = time.monotonic()
+
+        for index, process in list(processes.items()):
+            if process.is_alive() or stopping.is_set():
+                continue
+            
+            if index in restart_at:
+                if restart_at[index] <= now:
+                    del restart_at[index]
+                    start_process(index)
+                    
+                continue
+            
+            delay = backoffs[index].next_delay(now)
+            
+            if delay is None:
+                logger.log_error(
+                    f"Kafka consumer process {index} exited {args.max_restarts} times within "
+                    f"{args.restart_window}s (last exit code {process.exitcode}), stopping the consumer worker"
+                )
+                exit_code = 1
+                stop()
+                break
+            
+            logger.log_error(f"Kafka consumer process {index} exited with code {process.exitcode}, restarting in {delay}s")
+            restart_at[index] = now + delay
+
+    drain_deadline = time.monotonic() + args.drain_timeout
+
+    for process in processes.values():
+        process.join(timeout=max(0.0, drain_deadline - time.monotonic()))
+
+        if process.is_alive():
+            process.kill()
+            
+    sys.exit(exit_code)
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,18 @@
+import asyncio
+from datetime import datetime
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
 import bcrypt
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Index, select, delete, tuple_
+from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.sql import func
 from typing import Optional
 
 from backend.main import app
-from backend.config.config import RDS_ENGINE
+from backend.config.config import RDS_ENGINE, RDS_POOL_SIZE, RDS_MAX_OVERFLOW, create_async_rds_engine
 
 class RDSOperationError(Exception):
     "Exception for RDS operations"
@@ -39,11 +45,141 @@ class UserPreferences(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     theme = Column(String,nullable=False) # "light", "dark", "gray"
 
-class RDS:
-    def __init__(self):
-        self.SessionLocal = sessionmaker(bind=RDS_ENGINE, autocommit=False, autoflush=False)
-        Base.metadata.create_all(bind=RDS_ENGINE)
-        
+
+class Snap(Base):
+    __tablename__ = "snaps"
+
+    s3_key = Column(String, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    img_url = Column(String, nullable=False)
+    file_size = Column(BigInteger, nullable=False)
+    content_type = Column(String, nullable=False)
+    created_at = Column(DateTime, default=func.now(), nullable=False)
+
+# Serves list (newest first), count and newest for a user without touching S3
+Index("ix_snaps_user_id_created_at_s3_key", Snap.user_id, Snap.created_at.desc(), Snap.s3_key.desc())
+
+def _snap_to_dict(snap: Snap) -> dict[str, str | int]:
+    return {
+        "img_url": snap.img_url,
+        "created_at": snap.created_at.isoformat(),
+        "file_size": snap.file_size,
+        "s3_key": snap.s3_key,
+    }
+
+def _newest_snaps_first(user_id: int, limit: Optional[int] = None, after: Optional[tuple[datetime, str]] = None):
+    query = select(Snap).where(Snap.user_id == user_id)
+
+    # Keyset pagination: resumes right after the (created_at, s3_key) of the previous page's
+    # last snap, walking the index instead of skipping rows like OFFSET would
+    if after:
+        query = query.where(tuple_(Snap.created_at, Snap.s3_key) < tuple_(*after))
+
+    return query.order_by(Snap.created_at.desc(), Snap.s3_key.desc()).limit(limit)
+
+# Statements and row mapping shared by RDS and AsyncRDS, which only differ in how they run them
+def _user_by_id(user_id: int):
+    return select(User).where(User.id == user_id).limit(1)
+
+def _normal_user_lookups(username_or_email: str):
+    "Tried in order: the username first, then the email"
+    return (
+        select(User).where(User.username == username_or_email).limit(1),
+        select(User).where(User.email == username_or_email).limit(1),
+    )
+
+def _oauth_user(oauth_user_id: str):
+    return select(User).where(User.oauth_provider_user_id == oauth_user_id).limit(1)
+
+def _user_preference_by_user_id(user_id: int):
+    return select(UserPreferences).where(UserPreferences.user_id == user_id).limit(1)
+
+def _snap_count(user_id: int):
+    return select(func.count()).select_from(Snap).where(Snap.user_id == user_id)
+
+def _new_user(
+        first_name: str,
+        username: Optional[str],
+        hashed_password: Optional[str],
+        email: Optional[str],
+        oauth_provider: Optional[str],
+        oauth_provider_user_id: Optional[str],
+    ) -> User | None:
+
+    db_user = None
+
+    if username and hashed_password:
+        db_user = User(
+            username=username, 
+            password=hashed_password,
+            email=email, 
+            first_name=first_name,
+        )
+
+    if oauth_provider and oauth_provider_user_id:
+        db_user = User(
+            first_name=first_name,
+            oauth_provider=oauth_provider,
+            oauth_provider_user_id=oauth_provider_user_id,
+        )
+
+    return db_user
+
+def _update_user_fields(
+        db_user: User,
+        username: Optional[str],
+        hashed_password: Optional[str],
+        email: Optional[str],
+        first_name: Optional[str],
+    ) -> None:
+
+    if username:
+        db_user.username = username
+    if hashed_password:
+        db_user.password = hashed_password
+    if email:
+        db_user.email = email
+    if first_name:
+        db_user.first_name = first_name
+
+def _user_to_dict(db_user: User) -> dict[str, str | int]:
+    if db_user.oauth_provider:
+        return {
+            "is_oauth": True,
+            "account_type": f"Linked with {db_user.oauth_provider}",
+            "first_name": db_user.first_name,
+            "user_id": db_user.id,
+            "created_at": str(db_user.created_at),
+            "last_login_at": str(db_user.last_login_at),
+        }
+
+    return {
+        "is_oauth": False,
+        "account_type": "Normal (not linked)",
+        "username": db_user.username,
+        "email": db_user.email,
+        "first_name": db_user.first_name,
+        "user_id": db_user.id,
+        "created_at": str(db_user.created_at),
+        "last_login_at": str(db_user.last_login_at),
+    }
+
+def _login_creds_to_dict(db_user: User) -> dict[str, str]:
+    return {
+        "email": db_user.email,
+        "first_name": db_user.first_name,
+    }
+
+def _new_snap(user_id: int, s3_key: str, img_url: str, file_size: int, content_type: str) -> Snap:
+    return Snap(
+        s3_key=s3_key,
+        user_id=user_id,
+        img_url=img_url,
+        file_size=file_size,
+        content_type=content_type,
+    )
+
+class _RDSErrors:
     def _raise_db_fetch_failure(self, func_name: str) -> None:
         error_message = f"Failed to fetch data from RDS database in {func_name}"
         app.state.logger.log_error(error_message)
@@ -54,6 +190,29 @@ class RDS:
         app.state.logger.log_error(error_message)
         raise RDSOperationError(error_message) from error
 
+class RDS(_RDSErrors):
+    def __init__(self, engine=RDS_ENGINE):
+        self.SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+        Base.metadata.create_all(bind=engine)
+
+    @staticmethod
+    def _hash_password(password: str) -> str:
+        return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+
+    @staticmethod
+    def _check_password(password: str, hashed_password: str) -> bool:
+        return bcrypt.checkpw(password.encode("utf-8"), hashed_password.encode("utf-8"))
+
+    @staticmethod
+    def _find_normal_user(db, username_or_email: str) -> User | None:
+        for query in _normal_user_lookups(username_or_email):
+            db_user = db.scalar(query)
+
+            if db_user:
+                return db_user
+
+        return None
+
     # User table
     def create_user(
             self,
@@ -68,25 +227,8 @@ class RDS:
         db = self.SessionLocal()
 
         try:
-            if password:
-                password = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
-
-            db_user = None
-            
-            if username and password:
-                db_user = User(
-                    username=username, 
-                    password=password,
-                    email=email, 
-                    first_name=first_name,
-                )
-            
-            if oauth_provider and oauth_provider_user_id:
-                db_user = User(
-                    first_name=first_name,
-                    oauth_provider=oauth_provider,
-                    oauth_provider_user_id=oauth_provider_user_id,
-                )
+            hashed_password = self._hash_password(password) if password else None
+            db_user = _new_user(first_name, username, hashed_password, email, oauth_provider, oauth_provider_user_id)
 
             db.add(db_user)
             db.commit()
@@ -105,31 +247,12 @@ class RDS:
         db = self.SessionLocal()
 
         try:
-            db_user = db.query(User).filter(User.id == user_id).first()
+            db_user = db.scalar(_user_by_id(user_id))
 
             if not db_user:
                 self._raise_db_fetch_failure("read_user")
 
-            if db_user.oauth_provider:
-                return {
-                    "is_oauth": True,
-                    "account_type": f"Linked with {db_user.oauth_provider}",
-                    "first_name": db_user.first_name,
-                    "user_id": db_user.id,
-                    "created_at": str(db_user.created_at),
-                    "last_login_at": str(db_user.last_login_at),
-                }
-               
-            return {
-                "is_oauth": False,
-                "account_type": "Normal (not linked)",
-                "username": db_user.username,
-                "email": db_user.email,
-                "first_name": db_user.first_name,
-                "user_id": db_user.id,
-                "created_at": str(db_user.created_at),
-                "last_login_at": str(db_user.last_login_at),
-            }
+            return _user_to_dict(db_user)
             
         except RDSFetchError:
             raise
@@ -152,19 +275,13 @@ class RDS:
         db = self.SessionLocal()
 
         try:
-            db_user = db.query(User).filter(User.id == user_id).first()
+            db_user = db.scalar(_user_by_id(user_id))
 
             if not db_user:
                 self._raise_db_fetch_failure("update_user")
             
-            if username:
-                db_user.username = username
-            if password:
-                db_user.password = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
-            if email:
-                db_user.email = email
-            if first_name:
-                db_user.first_name = first_name
+            hashed_password = self._hash_password(password) if password else None
+            _update_user_fields(db_user, username, hashed_password, email, first_name)
 
             db.commit()
             db.refresh(db_user)
@@ -185,7 +302,7 @@ class RDS:
         db = self.SessionLocal()
 
         try:
-            db_user = db.query(User).filter(User.id == user_id).first()
+            db_user = db.scalar(_user_by_id(user_id))
 
             if not db_user:
                 self._raise_db_fetch_failure("delete_user")
@@ -229,7 +346,7 @@ class RDS:
         db = self.SessionLocal()
 
         try:
-            db_user_preference = db.query(UserPreferences).filter(UserPreferences.user_id == user_id).first()
+            db_user_preference = db.scalar(_user_preference_by_user_id(user_id))
 
             if not db_user_preference:
                 self._raise_db_fetch_failure("read_user_preference")
@@ -254,7 +371,7 @@ class RDS:
         db = self.SessionLocal()
 
         try:
-            db_user_preference = db.query(UserPreferences).filter(UserPreferences.user_id == user_id).first()
+            db_user_preference = db.scalar(_user_preference_by_user_id(user_id))
             
             if not db_user_preference:
                 self._raise_db_fetch_failure("update_user_preference")
@@ -280,7 +397,7 @@ class RDS:
         db = self.SessionLocal()
 
         try:
-            db_user_preference = db.query(UserPreferences).filter(UserPreferences.user_id == user_id).first()
+            db_user_preference = db.scalar(_user_preference_by_user_id(user_id))
 
             if not db_user_preference:
                 self._raise_db_fetch_failure("delete_user_preference")
@@ -300,26 +417,176 @@ class RDS:
         finally:
             db.close()
 
+    # Snaps table
+    def create_snap(self, user_id: int, s3_key: str, img_url: str, file_size: int, content_type: str) -> None:
+        db = self.SessionLocal()
+
+        try:
+            # merge so a repeated upload completion doesn't fail on the primary key
+            db.merge(_new_snap(user_id, s3_key, img_url, file_size, content_type))
+            db.commit()
+
+            return
+
+        except Exception as e:
+            db.rollback()
+            self._raise_db_operation_failure("create_snap", e)
+
+        finally:
+            db.close()
+
+    def read_snaps(
+            self,
+            user_id: int,
+            limit: Optional[int] = None,
+            after: Optional[tuple[datetime, str]] = None,
+        ) -> list[dict[str, str | int]]:
+
+        db = self.SessionLocal()
+
+        try:
+            return [_snap_to_dict(snap) for snap in db.scalars(_newest_snaps_first(user_id, limit, after))]
+
+        except Exception as e:
+            self._raise_db_operation_failure("read_snaps", e)
+
+        finally:
+            db.close()
+
+    def read_newest_snap(self, user_id: int) -> str:
+        db = self.SessionLocal()
+
+        try:
+            snap = db.scalar(_newest_snaps_first(user_id, limit=1))
+
+            return snap.img_url if snap else ""
+
+        except Exception as e:
+            self._raise_db_operation_failure("read_newest_snap", e)
+
+        finally:
+            db.close()
+
+    def get_snap_count(self, user_id: int) -> int:
+        db = self.SessionLocal()
+
+        try:
+            return db.scalar(_snap_count(user_id))
+
+        except Exception as e:
+            self._raise_db_operation_failure("get_snap_count", e)
+
+        finally:
+            db.close()
+
+    def delete_snap(self, s3_key: str) -> None:
+        db = self.SessionLocal()
+
+        try:
+            db.execute(delete(Snap).where(Snap.s3_key == s3_key))
+            db.commit()
+
+            return
+
+        except Exception as e:
+            db.rollback()
+            self._raise_db_operation_failure("delete_snap", e)
+
+        finally:
+            db.close()
+
+    def delete_all_snaps(self, user_id: int) -> None:
+        db = self.SessionLocal()
+
+        try:
+            db.execute(delete(Snap).where(Snap.user_id == user_id))
+            db.commit()
+
+            return
+
+        except Exception as e:
+            db.rollback()
+            self._raise_db_operation_failure("delete_all_snaps", e)
+
+        finally:
+            db.close()
+
+    # Snap catalog reconciliation, only used by backend.infra.snap_catalog_reconciler
+    def read_snap_catalog_user_ids(self) -> set[int]:
+        db = self.SessionLocal()
+
+        try:
+            return set(db.scalars(select(Snap.user_id).distinct()))
+
+        except Exception as e:
+            self._raise_db_operation_failure("read_snap_catalog_user_ids", e)
+
+        finally:
+            db.close()
+
+    def read_snap_catalog_clock(self) -> datetime:
+        "The database's now(), the same clock new catalog rows take their created_at from"
+
+        db = self.SessionLocal()
+
+        try:
+            return db.scalar(select(func.now()))
+
+        except Exception as e:
+            self._raise_db_operation_failure("read_snap_catalog_clock", e)
+
+        finally:
+            db.close()
+
+    def reconcile_user_snaps(
+            self,
+            user_id: int,
+            snaps: list[dict[str, str | int | datetime]],
+            started_at: datetime,
+        ) -> tuple[int, int]:
+        """
+        Makes the user's catalog rows match `snaps` listed from S3, returns (upserted, deleted).
+        Only rows created before `started_at` are deleted, later ones may be uploads the listing missed
+        """
+
+        db = self.SessionLocal()
+
+        try:
+            s3_keys = [snap["s3_key"] for snap in snaps]
+            deleted = db.execute(delete(Snap).where(
+                Snap.user_id == user_id,
+                Snap.created_at < started_at,
+                Snap.s3_key.not_in(s3_keys),
+            )).rowcount
+
+            for snap in snaps:
+                db.merge(Snap(user_id=user_id, **snap))
+
+            db.commit()
+
+            return len(snaps), deleted
+
+        except Exception as e:
+            db.rollback()
+            self._raise_db_operation_failure("reconcile_user_snaps", e)
+
+        finally:
+            db.close()
+
     # Authentication
     def check_normal_login_creds(self, username_or_email: str, password: str) -> bool | dict[str, str]:
         db = self.SessionLocal()
 
         try:
-            db_user = db.query(User).filter(User.username == username_or_email).first()
-
-            if not db_user:
-                db_user = db.query(User).filter(User.email == username_or_email).first()
+            db_user = self._find_normal_user(db, username_or_email)
 
             if not db_user:
                 return False
 
-            if not bcrypt.checkpw(password.encode("utf-8"), db_user.password.encode("utf-8")):
+            if not self._check_password(password, db_user.password):
                 return False
             
-            return {
-                "email": db_user.email,
-                "first_name": db_user.first_name,
-            }
+            return _login_creds_to_dict(db_user)
 
         except Exception as e:
             db.rollback()
@@ -332,15 +599,12 @@ class RDS:
         db = self.SessionLocal()
 
         try:
-            db_user = db.query(User).filter(User.username == username_or_email).first()
-
-            if not db_user:
-                db_user = db.query(User).filter(User.email == username_or_email).first()
+            db_user = self._find_normal_user(db, username_or_email)
 
             if not db_user:
                 self._raise_db_fetch_failure("fetch_normal_user")
 
-            if not bcrypt.checkpw(password.encode("utf-8"), db_user.password.encode("utf-8")):
+            if not self._check_password(password, db_user.password):
                 self._raise_db_fetch_failure("fetch_normal_user")
                 
             db_user.last_login_at = func.now()
@@ -364,7 +628,7 @@ class RDS:
         db = self.SessionLocal()
 
         try:
-            db_user = db.query(User).filter(User.oauth_provider_user_id == oauth_user_id).first()
+            db_user = db.scalar(_oauth_user(oauth_user_id))
 
             if not db_user:
                 return False
@@ -382,3 +646,363 @@ class RDS:
 
         finally:
             db.close()
+
+class ThreadPoolRDS:
+    """
+    Async surface over the psycopg2-backed RDS: every method runs on a worker thread sized to
+    the QueuePool, so a slow query holds a thread instead of the event loop.
+    """
+
+    def __init__(self, rds: RDS | None = None):
+        self.rds = rds or RDS()
+        self.executor = ThreadPoolExecutor(max_workers=RDS_POOL_SIZE + RDS_MAX_OVERFLOW, thread_name_prefix="rds")
+
+    def __getattr__(self, name: str):
+        # Only RDS's public methods, not its SessionLocal or anything RDS doesn't have
+        if name.startswith("_") or not callable(getattr(type(self.rds), name, None)):
+            raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+        
+        method = getattr(self.rds, name)
+
+        async def run_in_executor(*args, **kwargs):
+            return await asyncio.get_running_loop().run_in_executor(self.executor, partial(method, *args, **kwargs))
+
+        return run_in_executor
+
+    async def create_tables(self) -> None:
+        # RDS() already created them
+        return
+
+    async def dispose(self) -> None:
+        self.executor.shutdown(wait=False)
+
+class AsyncRDS(_RDSErrors):
+    "Same methods as RDS, awaited, on SQLAlchemy's asyncio extension with the asyncpg driver"
+
+    def __init__(self, engine=None):
+        self.engine = engine or create_async_rds_engine()
+        self.SessionLocal = async_sessionmaker(bind=self.engine, autoflush=False, expire_on_commit=False)
+
+    async def create_tables(self) -> None:
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    async def dispose(self) -> None:
+        await self.engine.dispose()
+
+    @staticmethod
+    async def _hash_password(password: str) -> str:
+        # bcrypt takes a few hundred ms of CPU, keep it off the event loop
+        hashed_password = await asyncio.to_thread(bcrypt.hashpw, password.encode("utf-8"), bcrypt.gensalt())
+        return hashed_password.decode("utf-8")
+
+    @staticmethod
+    async def _check_password(password: str, hashed_password: str) -> bool:
+        return await asyncio.to_thread(bcrypt.checkpw, password.encode("utf-8"), hashed_password.encode("utf-8"))
+
+    @staticmethod
+    async def _find_normal_user(db, username_or_email: str) -> User | None:
+        for query in _normal_user_lookups(username_or_email):
+            db_user = await db.scalar(query)
+
+            if db_user:
+                return db_user
+
+        return None
+
+    # User table
+    async def create_user(
+            self,
+            first_name: str,
+            username: Optional[str] = None, 
+            password: Optional[str] = None, 
+            email: Optional[str] = None,
+            oauth_provider: Optional[str] = None,
+            oauth_provider_user_id: Optional[str] = None,
+        ) -> int:
+
+        async with self.SessionLocal() as db:
+            try:
+                hashed_password = await self._hash_password(password) if password else None
+                db_user = _new_user(first_name, username, hashed_password, email, oauth_provider, oauth_provider_user_id)
+
+                db.add(db_user)
+                await db.commit()
+                await db.refresh(db_user)
+
+                return db_user.id
+
+            except Exception as e:
+                await db.rollback()
+                self._raise_db_operation_failure("create_user", e)
+
+    async def read_user(self, user_id: int) -> dict[str, str | int]:
+        async with self.SessionLocal() as db:
+            try:
+                db_user = await db.scalar(_user_by_id(user_id))
+
+                if not db_user:
+                    self._raise_db_fetch_failure("read_user")
+
+                return _user_to_dict(db_user)
+                
+            except RDSFetchError:
+                raise
+
+            except Exception as e:
+                self._raise_db_operation_failure("read_user", e)
+
+    async def update_user(
+            self, 
+            user_id: int, 
+            username: Optional[str] = None, 
+            password: Optional[str] = None, 
+            email: Optional[str] = None, 
+            first_name: Optional[str] = None,
+        ) -> None:
+
+        async with self.SessionLocal() as db:
+            try:
+                db_user = await db.scalar(_user_by_id(user_id))
+
+                if not db_user:
+                    self._raise_db_fetch_failure("update_user")
+                
+                hashed_password = await self._hash_password(password) if password else None
+                _update_user_fields(db_user, username, hashed_password, email, first_name)
+
+                await db.commit()
+                
+                return
+            
+            except RDSFetchError:
+                raise
+
+            except Exception as e:
+                await db.rollback()
+                self._raise_db_operation_failure("update_user", e)
+
+    async def delete_user(self, user_id: int) -> None:
+        async with self.SessionLocal() as db:
+            try:
+                db_user = await db.scalar(_user_by_id(user_id))
+
+                if not db_user:
+                    self._raise_db_fetch_failure("delete_user")
+
+                await db.delete(db_user)
+                await db.commit()
+
+                return
+
+            except RDSFetchError:
+                raise
+
+            except Exception as e:
+                await db.rollback()
+                self._raise_db_operation_failure("delete_user", e)
+
+    # UserPreferences table
+    async def create_user_preference(self, user_id: int, theme: str) -> None:
+        async with self.SessionLocal() as db:
+            try:
+                db.add(UserPreferences(user_id=user_id, theme=theme))
+                await db.commit()
+
+                return
+            
+            except Exception as e:
+                await db.rollback()
+                self._raise_db_operation_failure("create_user_preference", e)
+
+    async def read_user_preference(self, user_id: int) -> dict[str, str]:
+        async with self.SessionLocal() as db:
+            try:
+                db_user_preference = await db.scalar(_user_preference_by_user_id(user_id))
+
+                if not db_user_preference:
+                    self._raise_db_fetch_failure("read_user_preference")
+
+                return { "theme": db_user_preference.theme }
+            
+            except RDSFetchError:
+                raise
+
+            except Exception as e:
+                self._raise_db_operation_failure("read_user_preference", e)
+
+    async def update_user_preference(
+            self, 
+            user_id: int, 
+            theme: str, 
+        ) -> None:
+
+        async with self.SessionLocal() as db:
+            try:
+                db_user_preference = await db.scalar(_user_preference_by_user_id(user_id))
+                
+                if not db_user_preference:
+                    self._raise_db_fetch_failure("update_user_preference")
+
+                db_user_preference.theme = theme
+                
+                await db.commit()
+
+                return
+            
+            except RDSFetchError:
+                raise
+
+            except Exception as e:
+                await db.rollback()
+                self._raise_db_operation_failure("update_user_preference", e)
+
+    async def delete_user_preference(self, user_id: int) -> None:
+        async with self.SessionLocal() as db:
+            try:
+                db_user_preference = await db.scalar(_user_preference_by_user_id(user_id))
+
+                if not db_user_preference:
+                    self._raise_db_fetch_failure("delete_user_preference")
+
+                await db.delete(db_user_preference)
+                await db.commit()
+
+                return
+
+            except RDSFetchError:
+                raise
+
+            except Exception as e:
+                await db.rollback()
+                self._raise_db_operation_failure("delete_user_preference", e)
+
+    # Snaps table
+    async def create_snap(self, user_id: int, s3_key: str, img_url: str, file_size: int, content_type: str) -> None:
+        async with self.SessionLocal() as db:
+            try:
+                # merge so a repeated upload completion doesn't fail on the primary key
+                await db.merge(_new_snap(user_id, s3_key, img_url, file_size, content_type))
+                await db.commit()
+
+                return
+
+            except Exception as e:
+                await db.rollback()
+                self._raise_db_operation_failure("create_snap", e)
+
+    async def read_snaps(
+            self,
+            user_id: int,
+            limit: Optional[int] = None,
+            after: Optional[tuple[datetime, str]] = None,
+        ) -> list[dict[str, str | int]]:
+
+        async with self.SessionLocal() as db:
+            try:
+                return [_snap_to_dict(snap) for snap in await db.scalars(_newest_snaps_first(user_id, limit, after))]
+
+            except Exception as e:
+                self._raise_db_operation_failure("read_snaps", e)
+
+    async def read_newest_snap(self, user_id: int) -> str:
+        async with self.SessionLocal() as db:
+            try:
+                snap = await db.scalar(_newest_snaps_first(user_id, limit=1))
+
+                return snap.img_url if snap else ""
+
+            except Exception as e:
+                self._raise_db_operation_failure("read_newest_snap", e)
+
+    async def get_snap_count(self, user_id: int) -> int:
+        async with self.SessionLocal() as db:
+            try:
+                return await db.scalar(_snap_count(user_id))
+
+            except Exception as e:
+                self._raise_db_operation_failure("get_snap_count", e)
+
+    async def delete_snap(self, s3_key: str) -> None:
+        async with self.SessionLocal() as db:
+            try:
+                await db.execute(delete(Snap).where(Snap.s3_key == s3_key))
+                await db.commit()
+
+                return
+
+            except Exception as e:
+                await db.rollback()
+                self._raise_db_operation_failure("delete_snap", e)
+
+    async def delete_all_snaps(self, user_id: int) -> None:
+        async with self.SessionLocal() as db:
+            try:
+                await db.execute(delete(Snap).where(Snap.user_id == user_id))
+                await db.commit()
+
+                return
+
+            except Exception as e:
+                await db.rollback()
+                self._raise_db_operation_failure("delete_all_snaps", e)
+
+    # Authentication
+    async def check_normal_login_creds(self, username_or_email: str, password: str) -> bool | dict[str, str]:
+        async with self.SessionLocal() as db:
+            try:
+                db_user = await self._find_normal_user(db, username_or_email)
+
+                if not db_user:
+                    return False
+
+                if not await self._check_password(password, db_user.password):
+                    return False
+                
+                return _login_creds_to_dict(db_user)
+
+            except Exception as e:
+                await db.rollback()
+                self._raise_db_operation_failure("check_normal_login_creds", e)
+    
+    async def fetch_normal_user(self, username_or_email: str, password: str) -> int:
+        async with self.SessionLocal() as db:
+            try:
+                db_user = await self._find_normal_user(db, username_or_email)
+
+                if not db_user:
+                    self._raise_db_fetch_failure("fetch_normal_user")
+
+                if not await self._check_password(password, db_user.password):
+                    self._raise_db_fetch_failure("fetch_normal_user")
+                    
+                db_user.last_login_at = func.now()
+
+                await db.commit()
+                
+                return db_user.id
+            
+            except RDSFetchError:
+                raise
+            
+            except Exception as e:
+                await db.rollback()
+                self._raise_db_operation_failure("fetch_normal_user", e)
+    
+    async def check_and_fetch_oauth_login_creds(self, oauth_user_id: str) -> bool | int:
+        async with self.SessionLocal() as db:
+            try:
+                db_user = await db.scalar(_oauth_user(oauth_user_id))
+
+                if not db_user:
+                    return False
+                
+                db_user.last_login_at = func.now()
+
+                await db.commit()
+
+                return db_user.id
+
+            except Exception as e:
+                await db.rollback()
+                self._raise_db_operation_failure("check_and_fetch_oauth_login_creds", e)
@@ -1,14 +1,20 @@
-import json
-from datetime import datetime
+from datetime import datetime, timezone
+from typing import AsyncIterator
 
-from messaging import kafka_producer
-from backend.main import app
-from backend.config.config import MONGO_COLLECTION
+from pymongo import IndexModel, ASCENDING, DESCENDING
+
+from backend.infra.messaging import send_kafka_message
+from backend.main import app, settings
+from backend.config.config import ASYNC_MONGO_CLIENT, ASYNC_MONGO_COLLECTION
 
 class MongoDBError(Exception):
     "Exception for MongoDB operations"
     pass
 
+class MongoDBIndexError(MongoDBError):
+    "Exception for missing or mismatched MongoDB indexes"
+    pass
+
 class KafkaProduceDeliveryError(MongoDBError):
     "Exception for Kafka producer message delivery"
     pass
@@ -17,139 +23,128 @@ class KafkaProduceOperationError(MongoDBError):
     "Exception for Kafka producer operations"
     pass
 
-class MongoDB:
-    @staticmethod
-    def _raise_kafka_message_delivery_failure(func_name: str, remaining_messages: int) -> None:
-        error_message = f"Failed to deliver message to Kafka in {func_name}: {remaining_messages} messages (within 15 seconds)"
-        app.state.logger.log_error(error_message)
-        raise KafkaProduceDeliveryError(error_message)
+KAFKA_PRODUCE_ERRORS = (KafkaProduceDeliveryError, KafkaProduceOperationError)
+
+# Every query on image_tags goes through one of these: listing by user_id newest first (and
+# deleting by user_id, which uses the prefix), and updating or deleting by s3_key
+IMAGE_TAGS_INDEXES = [
+    IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="user_id_1_created_at_-1"),
+    IndexModel([("s3_key", ASCENDING)], name="s3_key_1", unique=True),
+]
+
+def find_index_problems(index_information: dict) -> list[str]:
+    "Compares `index_information()` of the collection against IMAGE_TAGS_INDEXES"
     
-    @staticmethod
-    def _raise_kafka_message_produce_failure(func_name: str, error: Exception) -> None:
-        error_message = f"Failed to produce message to Kafka in {func_name}: {error}"
-        app.state.logger.log_error(error_message)
-        raise KafkaProduceOperationError(error_message) from error
+    problems = []
     
-    @classmethod
-    def add_img_tags(cls, user_id: int, s3_key: str, tags: list[str]) -> None:
-        try:
-            message = {
-                "operation": "add_img_tags",
-                "user_id": user_id,
-                "s3_key": s3_key,
-                "tags": tags,
-                "caption": "",
-                "created_at": datetime.now().isoformat(),
-            }
-            
-            kafka_producer.produce(
-                topic="mongodb.add_img_tags",
-                key=str(user_id).encode("utf-8"),
-                value=json.dumps(message).encode("utf-8"),
-            )
-            
-            remaining_messages = kafka_producer.flush(timeout=15)
+    for index in IMAGE_TAGS_INDEXES:
+        declared = index.document
+        existing = index_information.get(declared["name"])
+        
+        if existing is None:
+            problems.append(f"{declared["name"]} is missing")
             
-            if remaining_messages > 0:
-                cls._raise_kafka_message_delivery_failure("add_img_tags", remaining_messages)
+        elif [tuple(key) for key in existing["key"]] != list(declared["key"].items()) \
+                or existing.get("unique", False) != declared.get("unique", False):
+            problems.append(f"{declared["name"]} doesn't match its declaration")
             
-            return
-        
-        except KafkaProduceDeliveryError:
-            raise
-        
-        except Exception as e:
-            cls._raise_kafka_message_produce_failure("add_img_tags", e)
+    return problems
 
+class MongoDB:
     @classmethod
-    def write_img_caption(cls, s3_key: str, caption: str) -> None:
-        try:
-            message = {
-                "operation": "write_img_caption",
-                "s3_key": s3_key,
-                "caption": caption,
-            }
-            
-            kafka_producer.produce(
-                topic="mongodb.write_img_caption",
-                key=str(s3_key).encode("utf-8"),
-                value=json.dumps(message).encode("utf-8"),
-            )
-            
-            remaining_messages = kafka_producer.flush(timeout=15)
-            
-            if remaining_messages > 0:
-                cls._raise_kafka_message_delivery_failure("write_img_caption", remaining_messages)
-            
-            return
+    async def add_img_tags(cls, user_id: int, s3_key: str, tags: list[str]) -> None:
+        message = {
+            "operation": "add_img_tags",
+            "user_id": user_id,
+            "s3_key": s3_key,
+            "tags": tags,
+            "caption": "",
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
         
-        except KafkaProduceDeliveryError:
-            raise
+        await send_kafka_message("add_img_tags", "mongodb.add_img_tags", s3_key, message, KAFKA_PRODUCE_ERRORS)
+
+    @classmethod
+    async def write_img_caption(cls, s3_key: str, caption: str) -> None:
+        message = {
+            "operation": "write_img_caption",
+            "s3_key": s3_key,
+            "caption": caption,
+        }
         
-        except Exception as e:
-            cls._raise_kafka_message_produce_failure("write_img_caption", e)
+        await send_kafka_message("write_img_caption", "mongodb.write_img_caption", s3_key, message, KAFKA_PRODUCE_ERRORS)
 
     @staticmethod
-    def read_img_tags_and_captions(user_id: int) -> list[dict[str, str | datetime]]:
+    async def stream_img_tags_and_captions(user_id: int, s3_keys: list[str] | None = None) -> AsyncIterator[dict[str, str | datetime]]:
+        """
+        Yields the user's documents newest first, fetched from MongoDB `mongo_read_batch_size` at a
+        time, only the ones for `s3_keys` when given
+        """
+        
+        query = { "user_id": user_id }
+        
+        if s3_keys is not None:
+            query["s3_key"] = { "$in": s3_keys }
+        
         try:
-            img_tags_and_captions = list(MONGO_COLLECTION.find({ "user_id": user_id }).sort("created_at", -1))
-            return img_tags_and_captions
+            cursor = ASYNC_MONGO_COLLECTION.find(
+                query,
+                projection={ "_id": 0, "s3_key": 1, "tags": 1, "caption": 1, "created_at": 1 },
+                batch_size=settings.mongo_read_batch_size,
+            ).sort("created_at", -1)
+            
+            async with cursor:
+                async for img_tags_and_caption in cursor:
+                    yield img_tags_and_caption
         
         except Exception as e:
-            error_message = f"Failed to read img tags and captions from MongoDB in read_img_tags_and_captions: {e}"
+            error_message = f"Failed to read img tags and captions from MongoDB in stream_img_tags_and_captions: {e}"
             app.state.logger.log_error(error_message)
             raise MongoDBError(error_message) from e
         
     @classmethod
-    def delete_img_tags_and_captions(cls, s3_key: str) -> None:
-        try:
-            message = {
-                "operation": "delete_img_tags_and_captions",
-                "s3_key": s3_key,
-            }
-            
-            kafka_producer.produce(
-                topic="mongodb.delete_img_tags_and_captions",
-                key=str(s3_key).encode("utf-8"),
-                value=json.dumps(message).encode("utf-8"),
-            )
-            
-            remaining_messages = kafka_producer.flush(timeout=15)
-            
-            if remaining_messages > 0:
-                cls._raise_kafka_message_delivery_failure("delete_img_tags_and_captions", remaining_messages)
-            
-            return
+    async def delete_img_tags_and_captions(cls, s3_key: str) -> None:
+        message = {
+            "operation": "delete_img_tags_and_captions",
+            "s3_key": s3_key,
+        }
         
-        except KafkaProduceDeliveryError:
-            raise
-        
-        except Exception as e:
-            cls._raise_kafka_message_produce_failure("delete_img_tags_and_captions", e)
+        await send_kafka_message("delete_img_tags_and_captions", "mongodb.delete_img_tags_and_captions", s3_key, message, KAFKA_PRODUCE_ERRORS)
     
     @classmethod
-    def delete_all_user_img_tags_and_captions(cls, user_id: int) -> None:
+    async def delete_all_user_img_tags_and_captions(cls, user_id: int) -> None:
+        message = {
+            "operation": "delete_all_user_img_tags_and_captions",
+            "user_id": user_id,
+        }
+        
+        await send_kafka_message(
+            "delete_all_user_img_tags_and_captions",
+            "mongodb.delete_all_user_img_tags_and_captions",
+            user_id,
+            message,
+            KAFKA_PRODUCE_ERRORS,
+        )
+        
+    @staticmethod
+    async def ensure_indexes() -> None:
+        "Creates any missing IMAGE_TAGS_INDEXES and verifies the ones already there"
+        
         try:
-            message = {
-                "operation": "delete_all_user_img_tags_and_captions",
-                "user_id": user_id,
-            }
-            
-            kafka_producer.produce(
-                topic="mongodb.delete_all_user_img_tags_and_captions",
-                key=str(user_id).encode("utf-8"),
-                value=json.dumps(message).encode("utf-8"),
-            )
-            
-            remaining_messages = kafka_producer.flush(timeout=15)
+            await ASYNC_MONGO_COLLECTION.create_indexes(IMAGE_TAGS_INDEXES)
+            problems = find_index_problems(await ASYNC_MONGO_COLLECTION.index_information())
             
-            if remaining_messages > 0:
-                cls._raise_kafka_message_delivery_failure("delete_all_user_img_tags_and_captions", remaining_messages)
+        except Exception as e:
+            problems = [str(e)]
             
-            return
-        
-        except KafkaProduceDeliveryError:
-            raise
+        if problems:
+            error_message = (
+                f"MongoDB indexes are not in place in ensure_indexes: {"; ".join(problems)}, "
+                "run `python -m backend.infra.mongo_index_migration`"
+            )
+            app.state.logger.log_error(error_message)
+            raise MongoDBIndexError(error_message)
         
-        except Exception as e:
-            cls._raise_kafka_message_produce_failure("delete_all_user_img_tags_and_captions", e)
+    @staticmethod
+    async def close() -> None:
+        await ASYNC_MONGO_CLIENT.close()
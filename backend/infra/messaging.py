@@ -1,75 +1,334 @@
 import os
 import json
 import time
+import zlib
+import uuid
+import asyncio
+import threading
+from datetime import datetime
+from collections import deque, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
-from confluent_kafka import Producer, Consumer
+from confluent_kafka import Producer, Consumer, TopicPartition
 from dotenv import load_dotenv
+from botocore.exceptions import ClientError
+from pymongo import UpdateOne, DeleteOne, DeleteMany
+from pymongo.errors import BulkWriteError, AutoReconnect, ExecutionTimeout
+from redis.exceptions import TimeoutError as RedisTimeoutError, BusyLoadingError
 
-from backend.main import app
+from backend.main import app, settings
 from backend.config.config import S3_CLIENT, BUCKET_NAME, REDIS_CLIENT, MONGO_COLLECTION
 
-class KafkaConsumeError(Exception):
-    "Exception for Kafka consume operations"
-    pass
 class KafkaMessageError(Exception):
     "Exception for Kafka operations"
     pass
 
-class KafkaMessageProcessError(KafkaMessageError):
-    "Exception for Kafka message processing operations"
-    pass
-
 class KafkaMessageOperationError(KafkaMessageError):
     "Exception for Kafka message operations"
     pass
 
+class KafkaMessageHeldBackError(KafkaMessageError):
+    "Exception for records held back behind a failed record with the same message key"
+    pass
+
+class KafkaMessageMissingTagsError(KafkaMessageError):
+    "Exception for captions whose image tags document doesn't exist yet"
+    pass
+
+class S3DeleteObjectsError(Exception):
+    "Exception for keys S3 failed to delete in a delete_objects call"
+    pass
+
+class KafkaProduceError(Exception):
+    "Exception for Kafka produce operations"
+    pass
+
+class KafkaDeliveryError(KafkaProduceError):
+    "Exception for failed Kafka message delivery reports"
+    pass
 
-def _raise_kafka_consume_error(error: Exception) -> None:
-    error_message = f"Failed to consume messages to Kafka: {error}"
+def _describe_record(record) -> str:
+    return f"{record.topic()}[{record.partition()}]@{record.offset()}"
+
+def _log_kafka_consume_error(error: Exception) -> None:
+    error_message = f"Failed to consume messages from Kafka: {error}"
     app.state.logger.log_error(error_message)
-    raise KafkaConsumeError(error_message) from error
 
-def _raise_kafka_message_error(error: Exception) -> None:
+def _log_kafka_message_error(error) -> None:
     error_message = f"Error in consumed Kafka message: {error}"
     app.state.logger.log_error(error_message)
-    raise KafkaMessageError(error_message) from error
 
-def _raise_kafka_message_process_error(error: Exception) -> None:
-    error_message = f"Failed to process Kafka message logic: {error}"
+def _log_dedupe_store_error(error: Exception) -> None:
+    error_message = f"Failed to reach the processed-message dedupe store: {error}"
     app.state.logger.log_error(error_message)
-    raise KafkaMessageProcessError(error_message) from error
 
-def _raise_kafka_message_operation_error(operation: str) -> None:
-    error_message = f"Invalid Kafka message operation: {operation}"
+def _log_kafka_message_dead_lettered(error: Exception, record) -> None:
+    error_message = f"Failed to process Kafka message logic ({_describe_record(record)}), sent to {DEAD_LETTER_TOPIC}: {error}"
+    app.state.logger.log_error(error_message)
+
+def _log_kafka_message_dead_letter_failure(error, record) -> None:
+    error_message = f"Failed to dead-letter Kafka message ({_describe_record(record)}), it will be redelivered: {error}"
     app.state.logger.log_error(error_message)
-    raise KafkaMessageOperationError(error_message)
 
 load_dotenv()
 env = os.getenv
 
-kafka_producer = Producer({
-    "bootstrap.servers": env("KAFKA_BOOTSTRAP_SERVERS"),
-    "queue.buffering.max.messages": 100000,
-    "queue.buffering.max.ms": 500,
-    "compression.type": "lz4",
-    "security.protocol": "SASL_SSL",
-    "sasl.mechanisms": "PLAIN",
-    "sasl.username": env("KAFKA_API_KEY"),
-    "sasl.password": env("KAFKA_API_SECRET")
-})
-
-kafka_consumer = Consumer({
-    "bootstrap.servers": env("KAFKA_BOOTSTRAP_SERVERS"),
-    "group.id": "msg-queue-for-external-services",
-    "auto.offset.reset": "earliest",
-    "enable.auto.commit": False,
-    "security.protocol": "SASL_SSL",
-    "sasl.mechanisms": "PLAIN",
-    "sasl.username": env("KAFKA_API_KEY"),
-    "sasl.password": env("KAFKA_API_SECRET")
-})
-
-kafka_consumer.subscribe([
+# Handlers await delivery, so every ms of linger is added to their response time. Batching
+# across concurrent requests comes from the group-commit window instead.
+KAFKA_PRODUCER_LINGER_MS = 5
+
+# librdkafka's own default is 5 minutes, a handler should give up on a down broker much sooner
+KAFKA_DELIVERY_TIMEOUT_SECONDS = 15
+
+def _new_kafka_producer(linger_ms: float) -> Producer:
+    return Producer({
+        "bootstrap.servers": env("KAFKA_BOOTSTRAP_SERVERS"),
+        "queue.buffering.max.messages": 100000,
+        "queue.buffering.max.ms": linger_ms,
+        "message.timeout.ms": KAFKA_DELIVERY_TIMEOUT_SECONDS * 1000,
+        "compression.type": "lz4",
+        "security.protocol": "SASL_SSL",
+        "sasl.mechanisms": "PLAIN",
+        "sasl.username": env("KAFKA_API_KEY"),
+        "sasl.password": env("KAFKA_API_SECRET")
+    })
+
+kafka_producer = _new_kafka_producer(KAFKA_PRODUCER_LINGER_MS)
+
+# Nothing awaits fire-and-forget sends, so they get their own producer that can linger long
+# enough to fill lz4 batches. Only the write-through audit events use them, the consumer doesn't
+# apply those, so their order relative to the same key's other events doesn't matter.
+background_kafka_producer = _new_kafka_producer(settings.kafka_producer_background_linger_ms)
+
+class KafkaProducerGateway:
+    """
+    Shared entry point for producing Kafka messages from async handlers.
+
+    `produce` hands the message to librdkafka and returns an asyncio future that is
+    resolved by the delivery report callback, so handlers can await delivery (or not)
+    without ever calling the blocking `flush`. Delivery reports are served by a
+    background task that polls the producer off the event loop. Every message gets a
+    `message_id` the consumer uses to skip redelivered messages it already applied.
+
+    With `group_commit_window_ms` set, the background task instead waits for the window
+    after the first pending message and acknowledges everything produced in it with a
+    single flush, so concurrent requests share one broker round trip.
+    """
+
+    def __init__(
+            self,
+            producer: Producer,
+            poll_timeout: float = 0.1,
+            group_commit_window_ms: float | None = None,
+            flush_timeout: float = KAFKA_DELIVERY_TIMEOUT_SECONDS,
+        ):
+        self.producer = producer
+        self.poll_timeout = poll_timeout
+        self.group_commit_window_ms = group_commit_window_ms
+        self.flush_timeout = flush_timeout
+        self._poll_task: asyncio.Task | None = None
+        self._stopping = False
+        self._pending = asyncio.Event()
+
+    @staticmethod
+    def _resolve_delivery(delivery: asyncio.Future, error, msg) -> None:
+        if delivery.done():
+            return
+
+        if error:
+            delivery.set_exception(KafkaDeliveryError(f"{msg.topic()}: {error}"))
+            return
+
+        delivery.set_result(msg.offset())
+
+    @staticmethod
+    def _log_failed_delivery(delivery: asyncio.Future) -> None:
+        if delivery.cancelled() or not delivery.exception():
+            return
+
+        app.state.logger.log_error(f"Failed to deliver fire-and-forget message to Kafka: {delivery.exception()}")
+
+    def produce(self, topic: str, key: str, message: dict) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        delivery = loop.create_future()
+
+        def on_delivery(error, msg):
+            # Called from whichever thread is polling the producer
+            loop.call_soon_threadsafe(self._resolve_delivery, delivery, error, msg)
+
+        produce_kwargs = {
+            "topic": topic,
+            "key": str(key).encode("utf-8"),
+            "value": json.dumps({ "message_id": str(uuid.uuid4()), **message }).encode("utf-8"),
+            "on_delivery": on_delivery,
+        }
+
+        try:
+            self.producer.produce(**produce_kwargs)
+
+        except BufferError:
+            # Local queue is full, serve pending delivery reports to make room and retry once
+            self.producer.poll(0)
+            self.producer.produce(**produce_kwargs)
+
+        self._pending.set()
+
+        return delivery
+
+    async def send(self, topic: str, key: str, message: dict, wait: bool = True) -> None:
+        try:
+            delivery = self.produce(topic, key, message)
+
+        except Exception as e:
+            raise KafkaProduceError(f"{topic}: {e}") from e
+
+        if not wait:
+            delivery.add_done_callback(self._log_failed_delivery)
+            return
+
+        try:
+            # Also bounds futures a partial group-commit flush left pending
+            await asyncio.wait_for(delivery, self.flush_timeout)
+
+        except asyncio.TimeoutError as e:
+            raise KafkaDeliveryError(f"{topic}: no delivery report within {self.flush_timeout}s") from e
+
+    async def _poll_delivery_reports(self) -> None:
+        while not self._stopping:
+            await asyncio.to_thread(self.producer.poll, self.poll_timeout)
+
+    async def _group_commit_delivery_reports(self) -> None:
+        while not self._stopping:
+            await self._pending.wait()
+            
+            if self._stopping:
+                break
+            
+            await asyncio.sleep(self.group_commit_window_ms / 1000)
+            
+            self._pending.clear()
+            remaining_messages = await asyncio.to_thread(self.producer.flush, self.flush_timeout)
+            
+            if remaining_messages > 0:
+                # Undelivered messages keep their futures pending, pick them up next cycle
+                self._pending.set()
+
+    def start(self) -> None:
+        self._stopping = False
+        
+        if self.group_commit_window_ms:
+            self._poll_task = asyncio.create_task(self._group_commit_delivery_reports())
+        else:
+            self._poll_task = asyncio.create_task(self._poll_delivery_reports())
+
+    async def stop(self, timeout: float = 15) -> int:
+        self._stopping = True
+        self._pending.set()
+
+        if self._poll_task:
+            await self._poll_task
+            self._poll_task = None
+
+        return await asyncio.to_thread(self.producer.flush, timeout)
+
+producer_gateway = KafkaProducerGateway(
+    kafka_producer,
+    group_commit_window_ms=settings.kafka_producer_group_commit_window_ms if settings.kafka_producer_group_commit else None,
+)
+background_producer_gateway = KafkaProducerGateway(background_kafka_producer)
+
+async def send_kafka_message(
+        func_name: str,
+        topic: str,
+        key: str,
+        message: dict,
+        errors: tuple[type[Exception], type[Exception]],
+        wait: bool = True,
+    ) -> None:
+    """
+    Sends through the shared producer gateway for the infra classes, or the background one
+    when `wait` is False. `errors` is the caller's (delivery error, produce error) pair: a
+    failed delivery report raises the first, anything else the second, both logged with
+    `func_name`. A fire-and-forget send's failure is only logged.
+    """
+    
+    delivery_error, produce_error = errors
+    gateway = producer_gateway if wait else background_producer_gateway
+    
+    try:
+        await gateway.send(topic, key, message, wait=wait)
+        
+    except KafkaDeliveryError as e:
+        error_message = f"Failed to deliver message to Kafka in {func_name}: {e}"
+        app.state.logger.log_error(error_message)
+        raise delivery_error(error_message) from e
+    
+    except Exception as e:
+        error_message = f"Failed to produce message to Kafka in {func_name}: {e}"
+        app.state.logger.log_error(error_message)
+        
+        # The caller has already done the work the event records (a written-through session
+        # or OTP), failing it now would only make the client retry work that succeeded
+        if wait:
+            raise produce_error(error_message) from e
+
+class AdaptiveTokenBucket:
+    """
+    Thread-safe token bucket whose refill rate adapts AIMD-style to one downstream backend:
+    the rate grows by `increase_step` ops/s after every call that finishes within its budget
+    and is multiplied by `decrease_factor` after a slow or throttled call. A call's budget is
+    `target_latency` plus `target_latency_per_token` for every token it took, so a 1000-key
+    batch isn't judged against the latency of a single key. Callers that take more tokens than
+    are available go into debt and sleep it off, so a large batch is paced instead of rejected.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            initial_rate: float,
+            min_rate: float,
+            max_rate: float,
+            target_latency: float,
+            increase_step: float,
+            decrease_factor: float = 0.5,
+            target_latency_per_token: float = 0.0,
+        ):
+        self.name = name
+        self.rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.target_latency = target_latency
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.target_latency_per_token = target_latency_per_token
+        self.tokens = initial_rate
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens: int = 1) -> None:
+        with self.lock:
+            now = time.monotonic()
+            
+            # Burst capacity is one second's worth of the current rate
+            self.tokens = min(self.rate, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= tokens
+            
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            
+        if wait:
+            time.sleep(wait)
+
+    def record(self, latency: float, throttled: bool = False, tokens: int = 1) -> None:
+        budget = self.target_latency + self.target_latency_per_token * tokens
+        
+        with self.lock:
+            if throttled or latency > budget:
+                self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            else:
+                self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+CONSUMED_TOPICS = [
     "s3.delete_snap",
     "s3.delete_all_snaps",
     "redis.add_new_session",
@@ -80,148 +339,776 @@ kafka_consumer.subscribe([
     "mongodb.write_img_caption",
     "mongodb.delete_img_tags_and_captions",
     "mongodb.delete_all_user_img_tags_and_captions",
-])
+]
+
+def _create_kafka_consumer() -> Consumer:
+    # Created per consumer thread/process, librdkafka handles must not be shared across a fork
+    kafka_consumer = Consumer({
+        "bootstrap.servers": env("KAFKA_BOOTSTRAP_SERVERS"),
+        "group.id": "msg-queue-for-external-services",
+        "auto.offset.reset": "earliest",
+        "enable.auto.commit": False,
+        "security.protocol": "SASL_SSL",
+        "sasl.mechanisms": "PLAIN",
+        "sasl.username": env("KAFKA_API_KEY"),
+        "sasl.password": env("KAFKA_API_SECRET")
+    })
+    
+    kafka_consumer.subscribe(CONSUMED_TOPICS)
+    
+    return kafka_consumer
 
 BATCH_SIZE = 150
-REQ_PER_SECOND = 250
-SECONDS_PER_BATCH = BATCH_SIZE / REQ_PER_SECOND
+MESSAGE_PROCESS_ATTEMPTS = 3
+RETRY_BACKOFF_SECONDS = 0.5
+DEAD_LETTER_TOPIC = "dead_letter.external_services"
+
+# Budgets are a round trip plus a per-key/command/write cost, e.g. 2.5 s for a 1000-key
+# delete_objects and 0.55 s for a 150-write bulk_write
+S3_BUCKET = AdaptiveTokenBucket(
+    "s3", initial_rate=250, min_rate=25, max_rate=3500,
+    target_latency=0.5, target_latency_per_token=0.002, increase_step=25,
+)
+REDIS_BUCKET = AdaptiveTokenBucket(
+    "redis", initial_rate=2000, min_rate=100, max_rate=50000,
+    target_latency=0.05, target_latency_per_token=0.0002, increase_step=200,
+)
+MONGODB_BUCKET = AdaptiveTokenBucket(
+    "mongodb", initial_rate=1000, min_rate=50, max_rate=20000,
+    target_latency=0.25, target_latency_per_token=0.002, increase_step=100,
+)
+
+S3_THROTTLING_ERROR_CODES = { "SlowDown", "Throttling", "ThrottlingException", "RequestLimitExceeded", "503" }
+
+REDIS_OPERATIONS = {
+    "add_new_session",
+    "place_thumbnail_img_url",
+    "delete_session",
+    "add_otp",
+}
+
+MONGODB_OPERATIONS = {
+    "add_img_tags",
+    "write_img_caption",
+    "delete_img_tags_and_captions",
+    "delete_all_user_img_tags_and_captions",
+}
+
+S3_DELETE_OBJECTS_MAX_KEYS = 1000
+S3_DELETE_ATTEMPTS = 3
+S3_DELETE_ALL_SNAPS_PARALLELISM = 4
+DELETE_ALL_SNAPS_CHECKPOINT_TTL_SECONDS = 60 * 60 * 24 * 7
+
+PROCESSED_MESSAGE_TTL_SECONDS = 60 * 60 * 24 * 7
+
+SESSION_TTL_SECONDS = 60 * 60 * 24 * 7 * 4 * 6
+OTP_TTL_SECONDS = 900
+SESSION_INVALIDATION_CHANNEL = "session_invalidation"
 
 stop_event = None
 
-def process_batch(messages: list):
-    success_messages = []
+def _is_throttling_error(error: Exception) -> bool:
+    if isinstance(error, ClientError):
+        return error.response.get("Error", {}).get("Code") in S3_THROTTLING_ERROR_CODES
     
-    for record in messages:
-        if record.error():
-            _raise_kafka_message_error(record.error())
+    return isinstance(error, (RedisTimeoutError, BusyLoadingError, AutoReconnect, ExecutionTimeout))
+
+def _call_with_backpressure(bucket: AdaptiveTokenBucket, tokens: int, func, *args, **kwargs):
+    "Paces the call through the backend's token bucket and feeds its latency back into the rate"
+    
+    bucket.acquire(tokens)
+    start_time = time.monotonic()
+    
+    try:
+        result = func(*args, **kwargs)
         
-        try:
-            record_msg = json.loads(record.value().decode("utf-8"))
-            operation = record_msg.get("operation")
+    except Exception as e:
+        bucket.record(time.monotonic() - start_time, throttled=_is_throttling_error(e), tokens=tokens)
+        raise
+    
+    bucket.record(time.monotonic() - start_time, tokens=tokens)
+    
+    return result
+
+def _delete_s3_keys(s3_keys: list[str]) -> dict[str, str]:
+    "Deletes the keys with delete_objects calls of up to 1000 keys and returns the keys that failed"
+    
+    failed_keys = {}
+    
+    for i in range(0, len(s3_keys), S3_DELETE_OBJECTS_MAX_KEYS):
+        chunk = s3_keys[i:i + S3_DELETE_OBJECTS_MAX_KEYS]
         
-            match operation:
-                case "delete_snap":
-                    s3_key = record_msg["s3_key"]
-                    
-                    S3_CLIENT.delete_object(
-                        Bucket=BUCKET_NAME,
-                        Key=s3_key
-                    )
-                    
-                case "delete_all_snaps":
-                    user_id = record_msg["user_id"]
-                    
-                    objects_to_delete = []
-                    
-                    response = S3_CLIENT.list_objects_v2(Bucket=BUCKET_NAME, Prefix=str(user_id))
-                    
-                    for object in response["Contents"]:
-                        objects_to_delete.append({ "Key": object["Key"] })
-                    
-                    S3_CLIENT.delete_objects(
-                        Bucket=BUCKET_NAME,
-                        Delete={ "Objects": objects_to_delete }
-                    )
-                
-                case "add_new_session":
-                    session_key = record_msg["session_key"]
-                    user_id = record_msg["user_id"]
-                    thumbnail_img_url = record_msg["thumbnail_img_url"]
-                    created_at = record_msg["created_at"]
-                    
-                    REDIS_CLIENT.hset(session_key, mapping={
-                        "user_id": user_id,
-                        "thumbnail_img_url": thumbnail_img_url,
-                        "created_at": created_at,
-                    })
-                    
-                    REDIS_CLIENT.expire(session_key, 60 * 60 * 24 * 7 * 4 * 6)
-                    
-                case "place_thumbnail_img_url":
-                    session_key = record_msg["session_key"]
-                    thumbnail_img_url = record_msg["thumbnail_img_url"]
-                    
-                    REDIS_CLIENT.hset(session_key, "thumbnail_img_url", thumbnail_img_url)
-                    
-                case "delete_session":
-                    session_key = record_msg["session_key"]
-                    REDIS_CLIENT.delete(session_key)
-                    
-                case "add_otp":
-                    otp = record_msg["otp"]
-                    email = record_msg["email"]
-                    
-                    REDIS_CLIENT.setex(key=email, time=900, value=otp)
-                    
-                case "add_img_tags":
-                    user_id = record_msg["user_id"]
-                    s3_key = record_msg["s3_key"]
-                    tags = record_msg["tags"]
-                    caption = record_msg["caption"]
-                    created_at = record_msg["created_at"]
-                    
-                    MONGO_COLLECTION.insert_one({
-                        "user_id": user_id,
-                        "s3_key": s3_key,
-                        "tags": tags,
-                        "caption": caption,
-                        "created_at": created_at,
-                    })
-                    
-                case "write_img_caption":
-                    s3_key = record_msg["s3_key"]
-                    caption = record_msg["caption"]
-                    
-                    MONGO_COLLECTION.update_one(
-                        { "s3_key": s3_key },
-                        { "$set": { "caption": caption } },
-                    )
-                    
-                case "delete_img_tags_and_captions":
-                    s3_key = record_msg["s3_key"]
-                    MONGO_COLLECTION.delete_one({ "s3_key": s3_key })
-                    
-                case "delete_all_user_img_tags_and_captions":
-                    user_id = record_msg["user_id"]
-                    MONGO_COLLECTION.delete_many({ "user_id": user_id })
-                    
-                case _:
-                    _raise_kafka_message_operation_error(operation)
+        response = _call_with_backpressure(
+            S3_BUCKET,
+            len(chunk),
+            S3_CLIENT.delete_objects,
+            Bucket=BUCKET_NAME,
+            Delete={
+                "Objects": [{ "Key": s3_key } for s3_key in chunk],
+                "Quiet": True,
+            },
+        )
+        
+        errors = response.get("Errors", [])
+        
+        for error in errors:
+            failed_keys[error["Key"]] = f"{error['Code']}: {error['Message']}"
+            
+        if any(error["Code"] in S3_THROTTLING_ERROR_CODES for error in errors):
+            S3_BUCKET.record(0.0, throttled=True)
+            
+    return failed_keys
+
+def _delete_s3_keys_with_retries(s3_keys: list[str]) -> dict[str, str]:
+    "Retries only the keys S3 reports as failed and returns the ones that never succeeded"
+    
+    pending_keys = list(dict.fromkeys(s3_keys))
+    failed_keys = {}
+    
+    for attempt in range(S3_DELETE_ATTEMPTS):
+        if attempt:
+            time.sleep(0.2 * 2 ** (attempt - 1))
+            
+        failed_keys = _delete_s3_keys(pending_keys)
+        pending_keys = list(failed_keys)
+        
+        if not pending_keys:
+            break
+        
+    return failed_keys
+
+def _execute_s3_delete_batch(s3_delete_records: list, s3_keys: list[str]) -> tuple[list, list]:
+    "Coalesces the batch's single-key deletes into delete_objects calls"
+    
+    if not s3_delete_records:
+        return [], []
+    
+    failed_keys = _delete_s3_keys_with_retries(s3_keys)
+    succeeded_records = []
+    failed_records = []
+    
+    for record, s3_key in zip(s3_delete_records, s3_keys):
+        if s3_key in failed_keys:
+            failed_records.append((record, S3DeleteObjectsError(f"{s3_key}: {failed_keys[s3_key]}")))
+        else:
+            succeeded_records.append(record)
+            
+    return succeeded_records, failed_records
+
+def _delete_all_user_snaps(user_id: int) -> None:
+    """
+    Streams the user's "{user_id}/snap/" listing page by page and deletes each page with a
+    1000-key delete_objects call, keeping up to S3_DELETE_ALL_SNAPS_PARALLELISM calls in flight.
+    The last key of every contiguously completed page is checkpointed in Redis, so a restarted
+    consumer resumes the listing after it instead of starting over.
+    """
+    
+    checkpoint_key = f"checkpoint:delete_all_snaps:{user_id}"
+    list_kwargs = {
+        "Bucket": BUCKET_NAME,
+        "Prefix": f"{user_id}/snap/",
+        "PaginationConfig": { "PageSize": S3_DELETE_OBJECTS_MAX_KEYS },
+    }
+    
+    checkpoint = REDIS_CLIENT.get(checkpoint_key)
+    
+    if checkpoint:
+        list_kwargs["StartAfter"] = checkpoint
+        
+    paginator = S3_CLIENT.get_paginator("list_objects_v2")
+    in_flight = deque()
+    
+    def complete_oldest_page() -> None:
+        last_key, deletion = in_flight.popleft()
+        failed_keys = deletion.result()
+        
+        if failed_keys:
+            s3_key, error = next(iter(failed_keys.items()))
+            raise S3DeleteObjectsError(f"{len(failed_keys)} keys failed, first {s3_key}: {error}")
+        
+        REDIS_CLIENT.set(checkpoint_key, last_key, ex=DELETE_ALL_SNAPS_CHECKPOINT_TTL_SECONDS)
+    
+    with ThreadPoolExecutor(max_workers=S3_DELETE_ALL_SNAPS_PARALLELISM) as executor:
+        for page in paginator.paginate(**list_kwargs):
+            s3_keys = [obj["Key"] for obj in page.get("Contents", [])]
+            
+            if not s3_keys:
+                continue
+            
+            in_flight.append((s3_keys[-1], executor.submit(_delete_s3_keys_with_retries, s3_keys)))
+            
+            # Pages complete in listing order so the checkpoint never skips an unfinished page
+            if len(in_flight) >= S3_DELETE_ALL_SNAPS_PARALLELISM:
+                complete_oldest_page()
+                
+        while in_flight:
+            complete_oldest_page()
+            
+    REDIS_CLIENT.delete(checkpoint_key)
+
+def _queue_redis_commands(pipeline, operation: str, record_msg: dict) -> int:
+    "Queues the record's commands on the pipeline and returns how many were queued"
+    
+    match operation:
+        case "add_new_session":
+            session_key = record_msg["session_key"]
+            session = {
+                "user_id": record_msg["user_id"],
+                "thumbnail_img_url": record_msg["thumbnail_img_url"],
+                "created_at": record_msg["created_at"],
+            }
+            
+            pipeline.hset(session_key, mapping=session)
+            pipeline.expire(session_key, SESSION_TTL_SECONDS)
+            
+            return 2
+            
+        case "place_thumbnail_img_url":
+            session_key = record_msg["session_key"]
+            thumbnail_img_url = record_msg["thumbnail_img_url"]
+            
+            pipeline.hset(session_key, "thumbnail_img_url", thumbnail_img_url)
+            # Drops the stale session from every API process's session cache
+            pipeline.publish(SESSION_INVALIDATION_CHANNEL, session_key)
+            
+            return 2
+            
+        case "delete_session":
+            pipeline.delete(record_msg["session_key"])
+            pipeline.publish(SESSION_INVALIDATION_CHANNEL, record_msg["session_key"])
+            
+            return 2
+            
+        case "add_otp":
+            otp = record_msg["otp"]
+            email = record_msg["email"]
+            
+            pipeline.setex(name=email, time=OTP_TTL_SECONDS, value=otp)
+            
+            return 1
+
+def _execute_redis_batch(pipeline, redis_records: list, command_counts: list[int]) -> tuple[list, list]:
+    "Runs the pipeline in one round trip and splits the records into succeeded and (record, error) failed"
+    
+    if not redis_records:
+        return [], []
+    
+    results = iter(_call_with_backpressure(REDIS_BUCKET, sum(command_counts), pipeline.execute, raise_on_error=False))
+    succeeded_records = []
+    failed_records = []
+    
+    for record, command_count in zip(redis_records, command_counts):
+        record_results = [next(results) for _ in range(command_count)]
+        errors = [result for result in record_results if isinstance(result, Exception)]
+        
+        if errors:
+            failed_records.append((record, errors[0]))
+        else:
+            succeeded_records.append(record)
+            
+    return succeeded_records, failed_records
+
+def _to_mongodb_write(operation: str, record_msg: dict) -> UpdateOne | DeleteOne | DeleteMany:
+    match operation:
+        case "add_img_tags":
+            # Upsert so a replayed message can't create a second document for the snap,
+            # and doesn't overwrite a caption written after the tags
+            return UpdateOne(
+                { "s3_key": record_msg["s3_key"] },
+                {
+                    "$set": {
+                        "user_id": record_msg["user_id"],
+                        "tags": record_msg["tags"],
+                        # Stored as a BSON date so the (user_id, created_at) index sorts by time
+                        "created_at": datetime.fromisoformat(record_msg["created_at"]),
+                    },
+                    "$setOnInsert": { "caption": record_msg["caption"] },
+                },
+                upsert=True,
+            )
+            
+        case "write_img_caption":
+            # Never upserted, the document would have no user_id or created_at, or bring back a
+            # deleted snap's. _split_off_captions_without_tags retries captions consumed ahead of
+            # their tags instead.
+            return UpdateOne(
+                { "s3_key": record_msg["s3_key"] },
+                { "$set": { "caption": record_msg["caption"] } },
+            )
+            
+        case "delete_img_tags_and_captions":
+            return DeleteOne({ "s3_key": record_msg["s3_key"] })
+            
+        case "delete_all_user_img_tags_and_captions":
+            return DeleteMany({ "user_id": record_msg["user_id"] })
+
+def _find_existing_tags_s3_keys(s3_keys: list[str]) -> set[str]:
+    cursor = MONGO_COLLECTION.find({ "s3_key": { "$in": s3_keys } }, { "s3_key": 1, "_id": 0 })
+    
+    return { document["s3_key"] for document in cursor }
 
-            success_messages.append(record)
+def _split_off_captions_without_tags(mongodb_records: list, mongodb_writes: list, mongodb_messages: list) -> tuple[list, list, list]:
+    """
+    Fails every caption whose tags document neither exists nor is written earlier in the batch,
+    so it's retried after the tags, and returns the remaining records and writes with the
+    failed (record, error) pairs.
+    """
+    
+    caption_s3_keys = list({
+        record_msg["s3_key"] for record_msg in mongodb_messages
+        if record_msg["operation"] == "write_img_caption"
+    })
+    
+    if not caption_s3_keys:
+        return mongodb_records, mongodb_writes, []
+    
+    try:
+        existing_s3_keys = _call_with_backpressure(MONGODB_BUCKET, 1, _find_existing_tags_s3_keys, caption_s3_keys)
+        
+    except Exception as e:
+        existing_s3_keys = set()
+        lookup_error = e
         
-        except KafkaMessageOperationError:
-            raise
+    else:
+        lookup_error = None
+    
+    records = []
+    writes = []
+    failed_records = []
+    
+    for record, write, record_msg in zip(mongodb_records, mongodb_writes, mongodb_messages):
+        match record_msg["operation"]:
+            case "add_img_tags":
+                existing_s3_keys.add(record_msg["s3_key"])
+                
+            case "delete_img_tags_and_captions":
+                existing_s3_keys.discard(record_msg["s3_key"])
+                
+            case "write_img_caption" if record_msg["s3_key"] not in existing_s3_keys:
+                error = lookup_error or KafkaMessageMissingTagsError(f"No image tags for {record_msg['s3_key']} yet")
+                failed_records.append((record, error))
+                continue
+            
+        records.append(record)
+        writes.append(write)
+        
+    return records, writes, failed_records
 
+def _execute_mongodb_batch(mongodb_records: list, mongodb_writes: list) -> tuple[list, list]:
+    """
+    Sends the writes as ordered bulk_writes so writes touching the same s3_key or user_id apply
+    in consumption order. An ordered bulk_write stops at the first failing write, so the failing
+    record is split off, the later writes with its message key are held back to be retried
+    after it, and the rest are sent again in a new bulk_write.
+    """
+    
+    succeeded_records = []
+    failed_records = []
+    failed_keys = set()
+    pending = list(zip(mongodb_records, mongodb_writes))
+    
+    while pending:
+        try:
+            _call_with_backpressure(
+                MONGODB_BUCKET,
+                len(pending),
+                MONGO_COLLECTION.bulk_write,
+                [write for _, write in pending],
+                ordered=True,
+            )
+            
+            succeeded_records.extend(record for record, _ in pending)
+            break
+            
+        except BulkWriteError as e:
+            failed_index = e.details["writeErrors"][0]["index"]
+            failed_record = pending[failed_index][0]
+            
+            succeeded_records.extend(record for record, _ in pending[:failed_index])
+            failed_records.append((failed_record, e))
+            
+            if failed_record.key():
+                failed_keys.add(failed_record.key())
+            
+            pending = pending[failed_index + 1:]
+            held_back = [(record, write) for record, write in pending if record.key() in failed_keys]
+            pending = [(record, write) for record, write in pending if record.key() not in failed_keys]
+            
+            failed_records.extend(
+                (record, KafkaMessageHeldBackError(f"Held back behind failed {_describe_record(failed_record)}"))
+                for record, _ in held_back
+            )
+            
         except Exception as e:
-            _raise_kafka_message_process_error(e)
+            failed_records.extend((record, e) for record, _ in pending)
+            break
+        
+    return succeeded_records, failed_records
+
+def _hold_back_after_failed_keys(records: list, succeeded_records: list, failed_records: list) -> tuple[list, list]:
+    """
+    Moves every succeeded record consumed after a failed record with the same message key to the
+    failed ones. Every operation is safe to apply twice, so retrying them after the failed record
+    restores consumption order for the key, e.g. a session delete is applied again after the
+    retried session write instead of being overtaken by it.
+    """
+    
+    failed_by_id = { id(record): record for record, _ in failed_records }
+    failed_keys = {}
+    held_back_ids = set()
+    
+    for record in records:
+        if not record.key():
+            continue
+        
+        if id(record) in failed_by_id:
+            failed_keys.setdefault(record.key(), record)
+            
+        elif record.key() in failed_keys:
+            held_back_ids.add(id(record))
             
-    return True if success_messages else False
+    if not held_back_ids:
+        return succeeded_records, failed_records
+    
+    for record in succeeded_records:
+        if id(record) in held_back_ids:
+            failed_record = failed_keys[record.key()]
+            failed_records.append((record, KafkaMessageHeldBackError(f"Held back behind failed {_describe_record(failed_record)}")))
+            
+    return [record for record in succeeded_records if id(record) not in held_back_ids], failed_records
 
-def run_consumer(event):
-    global stop_event
-    stop_event = event
+def _processed_message_key(message_id: str) -> str:
+    return f"processed_message:{message_id}"
+
+def _find_processed_message_ids(message_ids: list[str]) -> set[str]:
+    "Returns the ids the dedupe store has already seen, or none if the store can't be reached"
+    
+    if not message_ids:
+        return set()
+    
+    try:
+        results = _call_with_backpressure(
+            REDIS_BUCKET,
+            len(message_ids),
+            REDIS_CLIENT.mget,
+            [_processed_message_key(message_id) for message_id in message_ids],
+        )
+        
+    except Exception as e:
+        # Every operation is safe to apply twice, so processing goes on without the store
+        _log_dedupe_store_error(e)
+        return set()
+    
+    return { message_id for message_id, result in zip(message_ids, results) if result is not None }
+
+def _mark_messages_processed(message_ids: list[str]) -> None:
+    if not message_ids:
+        return
+    
+    pipeline = REDIS_CLIENT.pipeline(transaction=False)
+    
+    for message_id in message_ids:
+        pipeline.set(_processed_message_key(message_id), 1, ex=PROCESSED_MESSAGE_TTL_SECONDS)
+        
+    try:
+        _call_with_backpressure(REDIS_BUCKET, len(message_ids), pipeline.execute)
+        
+    except Exception as e:
+        _log_dedupe_store_error(e)
+
+def process_batch(messages: list) -> tuple[list, list]:
+    "Applies the records and returns them split into succeeded and (record, error) failed"
     
-    while not stop_event.is_set():
+    succeeded_records = []
+    failed_records = []
+    s3_delete_records = []
+    s3_delete_keys = []
+    redis_pipeline = REDIS_CLIENT.pipeline(transaction=False)
+    redis_records = []
+    redis_command_counts = []
+    mongodb_records = []
+    mongodb_writes = []
+    mongodb_messages = []
+    decoded_records = []
+    message_ids = {}
+    
+    for record in messages:
         try:
-            start_time = time.time()
-            messages_batch = kafka_consumer.consume(BATCH_SIZE, timeout=1.0)
+            record_msg = json.loads(record.value().decode("utf-8"))
             
-            if not messages_batch:
-                time.sleep(0.5)
-                continue
+            # Messages produced before message ids were added have none and are always applied
+            if record_msg.get("message_id"):
+                message_ids[id(record)] = record_msg["message_id"]
+                
+            decoded_records.append((record, record_msg))
+            
+        except Exception as e:
+            failed_records.append((record, e))
+            
+    processed_message_ids = _find_processed_message_ids(list(message_ids.values()))
+    
+    for record, record_msg in decoded_records:
+        try:
+            operation = record_msg.get("operation")
+            
+            if message_ids.get(id(record)) in processed_message_ids:
+                # Redelivered after it was applied, e.g. before a crash could commit its offset
+                succeeded_records.append(record)
+                
+            elif record_msg.get("written_through"):
+                # Already written to Redis by the API, the event is only kept for auditing
+                succeeded_records.append(record)
+            
+            elif operation == "delete_snap":
+                s3_delete_keys.append(record_msg["s3_key"])
+                s3_delete_records.append(record)
+                
+            elif operation == "delete_all_snaps":
+                _delete_all_user_snaps(record_msg["user_id"])
+                succeeded_records.append(record)
             
-            processed_batch = process_batch(messages_batch)
+            elif operation in REDIS_OPERATIONS:
+                redis_command_counts.append(_queue_redis_commands(redis_pipeline, operation, record_msg))
+                redis_records.append(record)
+            
+            elif operation in MONGODB_OPERATIONS:
+                mongodb_writes.append(_to_mongodb_write(operation, record_msg))
+                mongodb_records.append(record)
+                mongodb_messages.append(record_msg)
+                
+            else:
+                failed_records.append((record, KafkaMessageOperationError(f"Invalid Kafka message operation: {operation}")))
+
+        except Exception as e:
+            failed_records.append((record, e))
+    
+    try:
+        s3_succeeded, s3_failed = _execute_s3_delete_batch(s3_delete_records, s3_delete_keys)
+        
+        succeeded_records.extend(s3_succeeded)
+        failed_records.extend(s3_failed)
+        
+    except Exception as e:
+        failed_records.extend((record, e) for record in s3_delete_records)
+    
+    try:
+        redis_succeeded, redis_failed = _execute_redis_batch(redis_pipeline, redis_records, redis_command_counts)
+        
+        succeeded_records.extend(redis_succeeded)
+        failed_records.extend(redis_failed)
+        
+    except Exception as e:
+        failed_records.extend((record, e) for record in redis_records)
+    
+    # The key's later records are held back behind a failed caption below
+    mongodb_records, mongodb_writes, captions_failed = _split_off_captions_without_tags(
+        mongodb_records,
+        mongodb_writes,
+        mongodb_messages,
+    )
+    mongodb_succeeded, mongodb_failed = _execute_mongodb_batch(mongodb_records, mongodb_writes)
+    
+    failed_records.extend(captions_failed)
+    succeeded_records.extend(mongodb_succeeded)
+    failed_records.extend(mongodb_failed)
+    
+    succeeded_records, failed_records = _hold_back_after_failed_keys(messages, succeeded_records, failed_records)
+    
+    _mark_messages_processed([
+        message_ids[id(record)]
+        for record in succeeded_records
+        if id(record) in message_ids and message_ids[id(record)] not in processed_message_ids
+    ])
             
-            if processed_batch:
-                kafka_consumer.commit(asynchronous=False)
+    return succeeded_records, failed_records
+
+class PartitionOffsetTracker:
+    """
+    Tracks which consumed offsets are finished (applied or dead-lettered) so each partition
+    is committed up to its last contiguous finished record, and rewound to its first
+    unfinished one so that record is redelivered.
+    """
+    
+    def __init__(self, records: list):
+        self.offsets = defaultdict(list)
+        self.finished = set()
+        
+        for record in records:
+            self.offsets[(record.topic(), record.partition())].append(record.offset())
             
-            elapsed_time = time.time() - start_time
-            time.sleep(max(0.0, SECONDS_PER_BATCH - elapsed_time))
+    def mark_finished(self, records: list) -> None:
+        for record in records:
+            self.finished.add((record.topic(), record.partition(), record.offset()))
             
-        except KafkaMessageError:
-            raise
+    def positions(self) -> tuple[list[TopicPartition], list[TopicPartition]]:
+        "Returns the offsets to commit and the positions to seek back to"
+        
+        commits = []
+        rewinds = []
         
+        for (topic, partition), offsets in self.offsets.items():
+            committable_offset = None
+            
+            for offset in sorted(offsets):
+                if (topic, partition, offset) not in self.finished:
+                    rewinds.append(TopicPartition(topic, partition, offset))
+                    break
+                
+                committable_offset = offset
+                
+            if committable_offset is not None:
+                commits.append(TopicPartition(topic, partition, committable_offset + 1))
+                
+        return commits, rewinds
+
+def _send_to_dead_letter_topic(failed_records: list) -> list:
+    "Produces the failed records to the dead-letter topic and returns the ones that were delivered"
+    
+    # Keyed by record, None once the broker acknowledged it. A record without a report wasn't
+    # delivered, whatever else is still queued on the shared producer.
+    delivery_reports = {}
+    
+    for record, error in failed_records:
+        def on_delivery(delivery_error, msg, record=record):
+            delivery_reports[id(record)] = delivery_error
+                
+        try:
+            kafka_producer.produce(
+                topic=DEAD_LETTER_TOPIC,
+                key=record.key(),
+                value=record.value(),
+                headers={
+                    "source_topic": record.topic(),
+                    "source_partition": str(record.partition()),
+                    "source_offset": str(record.offset()),
+                    "error": str(error)[:1000],
+                },
+                on_delivery=on_delivery,
+            )
+            
         except Exception as e:
-            _raise_kafka_consume_error(e)
+            delivery_reports[id(record)] = e
+            
+    # The consumer runs in its own thread, so blocking until the dead letters are durable is fine here
+    kafka_producer.flush(timeout=KAFKA_DELIVERY_TIMEOUT_SECONDS)
+    delivered_records = []
+    
+    for record, error in failed_records:
+        if id(record) not in delivery_reports:
+            _log_kafka_message_dead_letter_failure(f"no delivery report within {KAFKA_DELIVERY_TIMEOUT_SECONDS}s", record)
+            continue
+        
+        delivery_error = delivery_reports[id(record)]
+        
+        if delivery_error:
+            _log_kafka_message_dead_letter_failure(delivery_error, record)
+            continue
+        
+        _log_kafka_message_dead_lettered(error, record)
+        delivered_records.append(record)
+        
+    return delivered_records
+
+def _split_into_key_lanes(records: list, lanes: int) -> list[list]:
+    "Splits the records into lanes by message key, keeping each key's records in consumption order"
+    
+    lane_records = [[] for _ in range(lanes)]
+    
+    for record in records:
+        lane_records[zlib.crc32(record.key() or b"") % lanes].append(record)
+        
+    return [records for records in lane_records if records]
+
+def process_batch_concurrently(records: list, executor: ThreadPoolExecutor | None = None, lanes: int = 1) -> tuple[list, list]:
+    """
+    Processes records with different message keys (session_key, s3_key, user_id) in parallel
+    lanes, so a slow S3 delete doesn't hold up unrelated session writes. Each lane still
+    batches its own S3, Redis and MongoDB work.
+    """
+    
+    if not executor or lanes <= 1:
+        return process_batch(records)
+    
+    succeeded_records = []
+    failed_records = []
+    
+    for lane_succeeded, lane_failed in executor.map(process_batch, _split_into_key_lanes(records, lanes)):
+        succeeded_records.extend(lane_succeeded)
+        failed_records.extend(lane_failed)
+        
+    return succeeded_records, failed_records
+
+def process_with_retries(
+        records: list,
+        tracker: PartitionOffsetTracker,
+        executor: ThreadPoolExecutor | None = None,
+        lanes: int = 1,
+    ) -> None:
+    "Retries failing records with backoff and dead-letters the ones that keep failing"
+    
+    pending_records = records
+    failed_records = []
+    
+    for attempt in range(MESSAGE_PROCESS_ATTEMPTS):
+        if attempt:
+            time.sleep(RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+            
+        succeeded_records, failed_records = process_batch_concurrently(pending_records, executor, lanes)
+        tracker.mark_finished(succeeded_records)
+        
+        if not failed_records:
+            return
+        
+        # Retried in consumption order, so a key's held-back records follow its failed one
+        failed_ids = { id(record) for record, _ in failed_records }
+        pending_records = [record for record in pending_records if id(record) in failed_ids]
+        
+    tracker.mark_finished(_send_to_dead_letter_topic(failed_records))
 
+def run_consumer(event):
+    global stop_event
+    stop_event = event
+    
+    kafka_consumer = _create_kafka_consumer()
+    executor = ThreadPoolExecutor(max_workers=settings.consumer_concurrency, thread_name_prefix="kafka-consumer-lane")
+    
+    # Pacing happens per backend in the token buckets, so the loop drains the backlog as
+    # fast as S3, Redis and MongoDB allow instead of sleeping a fixed amount per batch.
+    # Once stop_event is set the batch in hand is finished and committed before leaving.
+    try:
+        while not stop_event.is_set():
+            try:
+                messages_batch = kafka_consumer.consume(BATCH_SIZE, timeout=1.0)
+                
+                if not messages_batch:
+                    continue
+                
+                records = []
+                
+                for record in messages_batch:
+                    if record.error():
+                        _log_kafka_message_error(record.error())
+                    else:
+                        records.append(record)
+                        
+                tracker = PartitionOffsetTracker(records)
+                process_with_retries(records, tracker, executor, settings.consumer_concurrency)
+                
+                commits, rewinds = tracker.positions()
+                
+                if commits:
+                    kafka_consumer.commit(offsets=commits, asynchronous=False)
+                    
+                for position in rewinds:
+                    kafka_consumer.seek(position)
+                
+            except Exception as e:
+                # Never let one failure stop the consumer, back off and poll again
+                _log_kafka_consume_error(e)
+                time.sleep(RETRY_BACKOFF_SECONDS)
+                
+    finally:
+        # Leaves the consumer group right away so the partitions rebalance to the other consumers
+        kafka_consumer.close()
+        kafka_producer.flush(timeout=15)
+        executor.shutdown()
@@ -0,0 +1,105 @@
+"""
+Brings the image_tags collection in line with IMAGE_TAGS_INDEXES.
+
+1. Converts created_at values still stored as isoformat() strings into BSON dates, so the
+   (user_id, created_at) index orders documents by time instead of by string
+2. Removes duplicate documents per s3_key left by the old insert-based add_img_tags, keeping the
+   most recently tagged one and any caption, since the unique s3_key index refuses duplicates
+3. Creates the declared indexes and verifies them
+
+Every step only touches documents that still need it, so the migration is safe to rerun.
+
+    python -m backend.infra.mongo_index_migration
+"""
+import sys
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+
+from backend.config.config import MONGO_COLLECTION
+from backend.infra.db_tagging import IMAGE_TAGS_INDEXES, find_index_problems
+
+MIGRATION_BATCH_SIZE = 1000
+
+def _parse_created_at(created_at: str) -> datetime | None:
+    try:
+        parsed = datetime.fromisoformat(created_at)
+
+    except ValueError:
+        return None
+
+    # The API servers run in UTC, naive values were written with datetime.now()
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def convert_string_created_at(collection) -> tuple[int, int]:
+    "Returns (converted, unparseable)"
+
+    converted, unparseable = 0, 0
+    writes = []
+
+    for document in collection.find({ "created_at": { "$type": "string" } }, projection={ "created_at": 1 }, batch_size=MIGRATION_BATCH_SIZE):
+        created_at = _parse_created_at(document["created_at"])
+
+        if created_at is None:
+            unparseable += 1
+            continue
+
+        # Matching on the old value too leaves documents rewritten since the read alone
+        writes.append(UpdateOne({ "_id": document["_id"], "created_at": document["created_at"] }, { "$set": { "created_at": created_at } }))
+
+        if len(writes) == MIGRATION_BATCH_SIZE:
+            converted += collection.bulk_write(writes, ordered=False).modified_count
+            writes = []
+
+    if writes:
+        converted += collection.bulk_write(writes, ordered=False).modified_count
+
+    return converted, unparseable
+
+def remove_duplicate_s3_keys(collection) -> int:
+    "Returns how many duplicate documents were removed"
+
+    removed = 0
+    duplicates = collection.aggregate([
+        { "$sort": { "created_at": -1, "_id": -1 } },
+        { "$group": {
+            "_id": "$s3_key",
+            "document_ids": { "$push": "$_id" },
+            "captions": { "$push": "$caption" },
+        } },
+        { "$match": { "document_ids.1": { "$exists": True } } },
+    ], allowDiskUse=True)
+
+    for duplicate in duplicates:
+        kept_id, *duplicate_ids = duplicate["document_ids"]
+        caption = next((caption for caption in duplicate["captions"] if caption), "")
+
+        collection.update_one({ "_id": kept_id }, { "$set": { "caption": caption } })
+        removed += collection.delete_many({ "_id": { "$in": duplicate_ids } }).deleted_count
+
+    return removed
+
+def create_indexes(collection) -> list[str]:
+    "Returns what is still wrong with the indexes afterwards, empty when they match"
+
+    collection.create_indexes(IMAGE_TAGS_INDEXES)
+
+    return find_index_problems(collection.index_information())
+
+def main() -> None:
+    converted, unparseable = convert_string_created_at(MONGO_COLLECTION)
+    print(f"created_at: {converted} converted to dates, {unparseable} unparseable left as strings")
+
+    removed = remove_duplicate_s3_keys(MONGO_COLLECTION)
+    print(f"s3_key: {removed} duplicate documents removed")
+
+    problems = create_indexes(MONGO_COLLECTION)
+
+    if problems:
+        print(f"indexes: {"; ".join(problems)}")
+        sys.exit(1)
+
+    print(f"indexes: {", ".join(index.document["name"] for index in IMAGE_TAGS_INDEXES)} in place")
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,17 @@
-import json
+import time
 import uuid
+import threading
 from datetime import datetime
+from collections import OrderedDict
 
-from messaging import kafka_producer
-from backend.main import app
-from backend.config.config import REDIS_CLIENT
+from backend.infra.messaging import (
+    send_kafka_message,
+    SESSION_TTL_SECONDS,
+    OTP_TTL_SECONDS,
+    SESSION_INVALIDATION_CHANNEL,
+)
+from backend.main import app, settings
+from backend.config.config import REDIS_CLIENT, ASYNC_REDIS_CLIENT
 
 class RedisError(Exception):
     "Exception for Redis operations"
@@ -18,6 +25,107 @@ class KafkaProduceOperationError(RedisError):
     "Exception for Kafka producer operations"
     pass
 
+KAFKA_PRODUCE_ERRORS = (KafkaProduceDeliveryError, KafkaProduceOperationError)
+
+def _log_session_invalidation_error(error: Exception) -> None:
+    error_message = f"Lost the session invalidation channel, clearing the session cache: {error}"
+    app.state.logger.log_error(error_message)
+
+class SessionCache:
+    """
+    Per-process LRU cache of session hashes. Entries expire after `ttl_seconds`, which bounds
+    how long a missed invalidation can serve a stale session, and every invalidation moves
+    `generation` on so a Redis read that raced with one is not cached.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def get(self, session_key: str) -> dict | None:
+        with self.lock:
+            entry = self.entries.get(session_key)
+            
+            if entry is None:
+                return None
+            
+            session, expires_at = entry
+            
+            if expires_at <= time.monotonic():
+                del self.entries[session_key]
+                return None
+            
+            self.entries.move_to_end(session_key)
+            
+            return session
+
+    def put(self, session_key: str, session: dict, generation: int) -> None:
+        with self.lock:
+            if generation != self.generation:
+                return
+            
+            self.entries[session_key] = (session, time.monotonic() + self.ttl_seconds)
+            self.entries.move_to_end(session_key)
+            
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, session_key: str) -> None:
+        with self.lock:
+            self.generation += 1
+            self.entries.pop(session_key, None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+class SessionInvalidationListener:
+    "Background thread that drops sessions from the cache when the consumer publishes a change to them"
+
+    def __init__(self, cache: SessionCache):
+        self.cache = cache
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _listen(self) -> None:
+        while not self._stop_event.is_set():
+            pubsub = REDIS_CLIENT.pubsub(ignore_subscribe_messages=True)
+            
+            try:
+                pubsub.subscribe(SESSION_INVALIDATION_CHANNEL)
+                # Whatever was published before this subscription was missed
+                self.cache.clear()
+                
+                while not self._stop_event.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    
+                    if message:
+                        self.cache.invalidate(message["data"])
+                        
+            except Exception as e:
+                _log_session_invalidation_error(e)
+                self.cache.clear()
+                self._stop_event.wait(1.0)
+                
+            finally:
+                pubsub.close()
+
+    def start(self) -> None:
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._listen, name="session-invalidation", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5) -> None:
+        self._stop_event.set()
+        
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
 class Redis:
     @staticmethod
     def _raise_redis_operation_failure(func_name: str, error: Exception) -> None:
@@ -25,146 +133,115 @@ class Redis:
         app.state.logger.log_error(error_message)
         raise RedisError(error_message) from error
     
-    @staticmethod
-    def _raise_kafka_message_delivery_failure(func_name: str, remaining_messages: int) -> None:
-        error_message = f"Failed to deliver message to Kafka in {func_name}: {remaining_messages} messages (within 15 seconds)"
-        app.state.logger.log_error(error_message)
-        raise KafkaProduceDeliveryError(error_message)
-    
-    @staticmethod
-    def _raise_kafka_message_produce_failure(func_name: str, error: Exception) -> None:
-        error_message = f"Failed to produce message to Kafka in {func_name}: {error}"
-        app.state.logger.log_error(error_message)
-        raise KafkaProduceOperationError(error_message) from error
-    
     @classmethod
-    def add_new_session(cls, user_id: int) -> str:
-        try: 
-            session_id = str(uuid.uuid4())
-            session_key = f"session:{session_id}"
-            
-            message = {
-                "operation": "add_new_session",
-                "session_key": session_key,
-                "user_id": user_id,
-                "thumbnail_img_url": "",
-                "created_at": datetime.now(),
-            }
-
-            kafka_producer.produce(
-                topic="redis.add_new_session",
-                key=str(session_key).encode("utf-8"),
-                value=json.dumps(message).encode("utf-8"),
-            )
-
-            remaining_messages = kafka_producer.flush(timeout=15)
-
-            if remaining_messages > 0:
-                cls._raise_kafka_message_delivery_failure("add_new_session", remaining_messages)
-
-            return session_key
+    async def add_new_session(cls, user_id: int) -> str:
+        session_id = str(uuid.uuid4())
+        session_key = f"session:{session_id}"
+        
+        session = {
+            "user_id": user_id,
+            "thumbnail_img_url": "",
+            "created_at": datetime.now().isoformat(),
+        }
+        message = {
+            "operation": "add_new_session",
+            "session_key": session_key,
+            **session,
+        }
+        
+        if settings.session_write_through:
+            # Written here so the session can be read right after login, the Kafka event is only
+            # kept for auditing and the consumer doesn't apply it again
+            try:
+                async with ASYNC_REDIS_CLIENT.pipeline(transaction=False) as pipeline:
+                    pipeline.hset(session_key, mapping=session)
+                    pipeline.expire(session_key, SESSION_TTL_SECONDS)
+                    await pipeline.execute()
+                
+            except Exception as e:
+                cls._raise_redis_operation_failure("add_new_session", e)
+                
+            message["written_through"] = True
 
-        except KafkaProduceDeliveryError:
-            raise
+        await send_kafka_message(
+            "add_new_session",
+            "redis.add_new_session",
+            session_key,
+            message,
+            KAFKA_PRODUCE_ERRORS,
+            wait=not settings.session_write_through,
+        )
 
-        except Exception as e:
-            cls._raise_kafka_message_produce_failure("add_new_session", e)
+        return session_key
 
     @classmethod
-    def get_session(cls, session_key: str) -> dict | list:
+    async def get_session(cls, session_key: str) -> dict | list:
         try:
-            return REDIS_CLIENT.hgetall(session_key)
+            return await ASYNC_REDIS_CLIENT.hgetall(session_key)
         
         except Exception as e:
             cls._raise_redis_operation_failure("get_session", e)
-        
+            
     @classmethod
-    def place_thumbnail_img_url(cls, session_key: str, thumbnail_img_url: str) -> None:
-        try:
-            message = {
-                "operation": "place_thumbnail_img_url",
-                "session_key": session_key,
-                "thumbnail_img_url": thumbnail_img_url,
-            }
-
-            kafka_producer.produce(
-                topic="redis.place_thumbnail_img_url",
-                key=str(session_key).encode("utf-8"),
-                value=json.dumps(message).encode("utf-8"),
-            )
-
-            remaining_messages = kafka_producer.flush(timeout=15)
-
-            if remaining_messages > 0:
-                cls._raise_kafka_message_delivery_failure("place_thumbnail_img_url", remaining_messages)
-
-            return
+    async def get_cached_session(cls, session_key: str) -> dict | list:
+        session = session_cache.get(session_key)
         
-        except KafkaProduceDeliveryError:
-            raise
+        if session is not None:
+            return session
         
-        except Exception as e:
-            cls._raise_kafka_message_produce_failure("place_thumbnail_img_url", e)
-
-    @classmethod
-    def delete_session(cls, session_key: str) -> None:
-        try:
-            message = {
-                "operation": "delete_session",
-                "session_key": session_key,
-            }
-
-            kafka_producer.produce(
-                topic="redis.delete_session",
-                key=str(session_key).encode("utf-8"),
-                value=json.dumps(message).encode("utf-8"),
-            )
-
-            remaining_messages = kafka_producer.flush(timeout=15)
-
-            if remaining_messages > 0:
-                cls._raise_kafka_message_delivery_failure("delete_session", remaining_messages)
-
-            return
-
-        except KafkaProduceDeliveryError:
-            raise
+        generation = session_cache.generation
+        session = await cls.get_session(session_key)
         
-        except Exception as e:
-            cls._raise_kafka_message_produce_failure("delete_session", e)
+        # Misses aren't cached, a session the consumer is about to write has to show up right away
+        if session:
+            session_cache.put(session_key, session, generation)
+            
+        return session
         
     @classmethod
-    def add_otp(cls, otp: int, email: str) -> None:
-        try:
-            message = {
-                "operation": "add_otp",
-                "otp": otp,
-                "email": email,
-            }
-
-            kafka_producer.produce(
-                topic="redis.add_otp",
-                key=str(email).encode("utf-8"),
-                value=json.dumps(message).encode("utf-8"),
-            )
+    async def place_thumbnail_img_url(cls, session_key: str, thumbnail_img_url: str) -> None:
+        message = {
+            "operation": "place_thumbnail_img_url",
+            "session_key": session_key,
+            "thumbnail_img_url": thumbnail_img_url,
+        }
 
-            remaining_messages = kafka_producer.flush(timeout=15)
+        await send_kafka_message("place_thumbnail_img_url", "redis.place_thumbnail_img_url", session_key, message, KAFKA_PRODUCE_ERRORS)
 
-            if remaining_messages > 0:
-                cls._raise_kafka_message_delivery_failure("add_otp", remaining_messages)
+    @classmethod
+    async def delete_session(cls, session_key: str) -> None:
+        message = {
+            "operation": "delete_session",
+            "session_key": session_key,
+        }
+        
+        session_cache.invalidate(session_key)
 
-            return
+        await send_kafka_message("delete_session", "redis.delete_session", session_key, message, KAFKA_PRODUCE_ERRORS)
         
-        except KafkaProduceDeliveryError:
-            raise
+    @classmethod
+    async def add_otp(cls, otp: int, email: str) -> None:
+        message = {
+            "operation": "add_otp",
+            "otp": otp,
+            "email": email,
+        }
         
-        except Exception as e:
-            cls._raise_kafka_message_produce_failure("add_otp", e)
+        if settings.session_write_through:
+            try:
+                await ASYNC_REDIS_CLIENT.setex(name=email, time=OTP_TTL_SECONDS, value=otp)
+                
+            except Exception as e:
+                cls._raise_redis_operation_failure("add_otp", e)
+                
+            message["written_through"] = True
+
+        await send_kafka_message("add_otp", "redis.add_otp", email, message, KAFKA_PRODUCE_ERRORS, wait=not settings.session_write_through)
         
     @classmethod
-    def verify_otp(cls, user_otp: int, email: str) -> bool:
+    async def verify_otp(cls, user_otp: int, email: str) -> bool:
         try:
-            otp = REDIS_CLIENT.get(email)
+            otp = await ASYNC_REDIS_CLIENT.get(email)
             
             if not otp or int(otp) != user_otp:
                 return False
@@ -172,4 +249,11 @@ class Redis:
             return True
             
         except Exception as e:
-            cls._raise_redis_operation_failure("verify_otp", e)
\ No newline at end of file
+            cls._raise_redis_operation_failure("verify_otp", e)
+            
+    @staticmethod
+    async def close() -> None:
+        await ASYNC_REDIS_CLIENT.aclose()
+
+session_cache = SessionCache(settings.session_cache_max_entries, settings.session_cache_ttl_seconds)
+session_invalidation_listener = SessionInvalidationListener(session_cache)
@@ -0,0 +1,103 @@
+"""
+Rebuilds the RDS snap catalog from S3.
+
+Lists the bucket page by page. Keys are "{user_id}/snap/...", so each user's snaps come back
+contiguously and are reconciled as soon as the listing moves past them: rows for new objects are
+upserted and rows whose object is gone are deleted. Users left in the catalog without a single
+object in S3 are emptied at the end. Rows created after the run started are never deleted, since
+their objects may have been uploaded after the listing passed them.
+
+    python -m backend.infra.snap_catalog_reconciler
+    python -m backend.infra.snap_catalog_reconciler --user-id 42
+"""
+import argparse
+from datetime import timezone
+from typing import Iterator
+
+from backend.config.config import S3_CLIENT, BUCKET_NAME
+from backend.infra.storage import S3
+
+S3_LIST_PAGE_SIZE = 1000
+
+def _snap_owner(s3_key: str) -> int | None:
+    user_id, _, rest = s3_key.partition("/")
+
+    if not user_id.isdigit() or not rest.startswith("snap/"):
+        return None
+
+    return int(user_id)
+
+def _catalog_row(obj: dict) -> dict:
+    return {
+        "s3_key": obj["Key"],
+        "img_url": S3.get_snap_url(obj["Key"]),
+        "file_size": obj["Size"],
+        "content_type": S3.get_snap_content_type(obj["Key"]),
+        "created_at": obj["LastModified"].astimezone(timezone.utc).replace(tzinfo=None),
+    }
+
+def iter_user_snaps(prefix: str = "") -> Iterator[tuple[int, list[dict]]]:
+    "Yields (user_id, catalog rows) for every user with snaps under `prefix`"
+
+    paginator = S3_CLIENT.get_paginator("list_objects_v2")
+    current_user_id, snaps = None, []
+
+    for page in paginator.paginate(Bucket=BUCKET_NAME, Prefix=prefix, PaginationConfig={ "PageSize": S3_LIST_PAGE_SIZE }):
+        for obj in page.get("Contents", []):
+            user_id = _snap_owner(obj["Key"])
+
+            if user_id is None:
+                continue
+
+            if user_id != current_user_id:
+                if current_user_id is not None:
+                    yield current_user_id, snaps
+
+                current_user_id, snaps = user_id, []
+
+            snaps.append(_catalog_row(obj))
+
+    if current_user_id is not None:
+        yield current_user_id, snaps
+
+def reconcile(rds, user_id: int | None = None) -> dict[str, int]:
+    "Reconciles every user, or just `user_id`, with the sync RDS and returns the totals"
+
+    # Read first so anything uploaded while the bucket is listed is newer than it
+    started_at = rds.read_snap_catalog_clock()
+    prefix = f"{user_id}/snap/" if user_id is not None else ""
+    unlisted_user_ids = { user_id } if user_id is not None else rds.read_snap_catalog_user_ids()
+    totals = { "users": 0, "upserted": 0, "deleted": 0 }
+
+    for listed_user_id, snaps in iter_user_snaps(prefix):
+        upserted, deleted = rds.reconcile_user_snaps(listed_user_id, snaps, started_at)
+        unlisted_user_ids.discard(listed_user_id)
+
+        totals["users"] += 1
+        totals["upserted"] += upserted
+        totals["deleted"] += deleted
+
+    for unlisted_user_id in unlisted_user_ids:
+        _, deleted = rds.reconcile_user_snaps(unlisted_user_id, [], started_at)
+
+        totals["users"] += 1
+        totals["deleted"] += deleted
+
+    return totals
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild the snap catalog from S3")
+    parser.add_argument("--user-id", type=int, default=None, help="only reconcile this user")
+    args = parser.parse_args()
+
+    from backend.main import app
+    from backend.config.logging_config import Logging
+    from backend.infra.db import RDS
+
+    app.state.logger = Logging()
+
+    totals = reconcile(RDS(), args.user_id)
+    print(f"Reconciled {totals["users"]} users: {totals["upserted"]} snaps upserted, {totals["deleted"]} stale rows deleted")
+
+if __name__ == "__main__":
+    main()
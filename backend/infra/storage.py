@@ -1,15 +1,15 @@
 import os
 import uuid
-import json
-from io import BytesIO
+import asyncio
 from datetime import datetime
 
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 from dotenv import load_dotenv
 from fastapi import UploadFile
 
-from messaging import kafka_producer
-from backend.main import app
+from backend.infra.messaging import send_kafka_message
+from backend.main import app, settings
 from backend.config.config import S3_CLIENT, BUCKET_NAME
 
 class S3Error(Exception):
@@ -20,6 +20,14 @@ class S3FileExtensionError(S3Error):
     "Exception for invalid S3 file extensions"
     pass
 
+class S3FileSizeError(S3Error):
+    "Exception for S3 uploads over the size cap"
+    pass
+
+class S3SnapKeyError(S3Error):
+    "Exception for S3 keys outside the user's snap prefix"
+    pass
+
 class KafkaProduceDeliveryError(S3Error):
     "Exception for Kafka producer message delivery"
     pass
@@ -28,9 +36,56 @@ class KafkaProduceOperationError(S3Error):
     "Exception for Kafka producer operations"
     pass
 
+KAFKA_PRODUCE_ERRORS = (KafkaProduceDeliveryError, KafkaProduceOperationError)
+
 load_dotenv()
 env = os.getenv
 
+SNAP_CONTENT_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+}
+
+# Snaps under the threshold go up as one streamed PutObject, larger ones as multipart uploads
+# holding at most `max_concurrency` parts in memory
+UPLOAD_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=16 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=2,
+)
+
+class SizeCappedReader:
+    "Read-only view of an upload spool that fails as soon as more than `max_bytes` are read"
+
+    def __init__(self, fileobj, max_bytes: int):
+        self.fileobj = fileobj
+        self.max_bytes = max_bytes
+
+    def _check_position(self, position: int) -> None:
+        if position > self.max_bytes:
+            raise S3FileSizeError(f"File exceeds the {self.max_bytes} byte upload limit")
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.fileobj.read(size)
+        self._check_position(self.fileobj.tell())
+
+        return chunk
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        position = self.fileobj.seek(offset, whence)
+        self._check_position(position)
+
+        return position
+
+    def tell(self) -> int:
+        return self.fileobj.tell()
+
+    def close(self) -> None:
+        # s3transfer closes the body after PutObject, the spool is left for Starlette to close
+        pass
+
 class S3:
     @staticmethod
     def _raise_client_operation_error(func_name: str, error: Exception) -> None:
@@ -39,17 +94,25 @@ class S3:
         raise S3Error(error_message) from error
     
     @staticmethod
-    def _raise_kafka_message_delivery_failure(func_name: str, remaining_messages: int) -> None:
-        error_message = f"Failed to deliver message to Kafka in {func_name}: {remaining_messages} messages (within 15 seconds)"
-        app.state.logger.log_error(error_message)
-        raise KafkaProduceDeliveryError(error_message)
-    
+    def _check_file_extension(filename: str) -> str:
+        file_extension = os.path.splitext(filename)[1].lower()
+        
+        if file_extension not in SNAP_CONTENT_TYPES:
+            error_message = f"Invalid file extension: {file_extension}"
+            
+            app.state.logger.log_error(error_message)
+            raise S3FileExtensionError(error_message)
+        
+        return file_extension
+
     @staticmethod
-    def _raise_kafka_message_produce_failure(func_name: str, error: Exception) -> None:
-        error_message = f"Failed to produce message to Kafka in {func_name}: {error}"
-        app.state.logger.log_error(error_message)
-        raise KafkaProduceOperationError(error_message) from error
-    
+    def get_snap_url(s3_key: str) -> str:
+        return f"https://{BUCKET_NAME}.s3.{env("AWS_S3_REGION")}.amazonaws.com/{s3_key}"
+
+    @staticmethod
+    def get_snap_content_type(s3_key: str) -> str:
+        return SNAP_CONTENT_TYPES.get(os.path.splitext(s3_key)[1].lower(), "application/octet-stream")
+
     @staticmethod
     def _generate_s3_key(user_id: int, filename: str) -> str:
         file_extension = os.path.splitext(filename)[1].lower()
@@ -59,129 +122,114 @@ class S3:
         return f"{user_id}/snap/{timestamp}_{unique_id}{file_extension}"
 
     @classmethod
-    async def upload_snap(cls, user_id: int, img_file: UploadFile) -> tuple[str, str]:
+    async def upload_snap(cls, user_id: int, img_file: UploadFile) -> tuple[str, str, int]:
         try:
-            file_extension = os.path.splitext(img_file.filename)[1].lower()
-            
-            if file_extension not in [".jpg", ".jpeg", ".png", ".gif"]:
-                error_message = f"Invalid file extension: {file_extension}"
+            cls._check_file_extension(img_file.filename)
                 
-                app.state.logger.log_error(error_message)
-                raise S3FileExtensionError(error_message)
+            if img_file.size is not None and img_file.size > settings.snap_upload_max_bytes:
+                raise S3FileSizeError(f"File exceeds the {settings.snap_upload_max_bytes} byte upload limit")
                 
             s3_key = cls._generate_s3_key(user_id, img_file.filename)
-            img_content = BytesIO(await img_file.read())
             
-            S3_CLIENT.upload_fileobj(
+            # Streams straight from the spooled upload on a worker thread, the cap is also
+            # enforced while reading in case the declared size was missing or wrong
+            await img_file.seek(0)
+            reader = SizeCappedReader(img_file.file, settings.snap_upload_max_bytes)
+            await asyncio.to_thread(
+                S3_CLIENT.upload_fileobj,
                 Bucket=BUCKET_NAME,
                 Key=s3_key,
-                Fileobj=img_content,
+                Fileobj=reader,
                 ExtraArgs={
                     "ContentType": img_file.content_type,
                     "ACL": "public-read",
                 },
+                Config=UPLOAD_TRANSFER_CONFIG,
             )
             
-            return f"https://{BUCKET_NAME}.s3.{env("AWS_S3_REGION")}.amazonaws.com/{s3_key}", s3_key
+            # The declared size can be missing, the bytes actually streamed can't
+            file_size = reader.tell()
+            
+            # Rewound so object detection can read the same spool
+            await img_file.seek(0)
+            
+            return cls.get_snap_url(s3_key), s3_key, file_size
+        
+        except S3FileSizeError as e:
+            app.state.logger.log_error(str(e))
+            raise
         
         except ClientError as e:
             cls._raise_client_operation_error("upload_snap", e)
         
     @classmethod
-    def read_snaps(cls, user_id: int) -> list[dict[str, str | datetime]]:
+    def create_presigned_snap_upload(cls, user_id: int, filename: str) -> dict[str, str | dict[str, str]]:
         try:
-            response = S3_CLIENT.list_objects_v2(Bucket=BUCKET_NAME, Prefix=f"{user_id}/snap/")
-            
-            if response["KeyCount"] == 0:
-                return []
+            content_type = SNAP_CONTENT_TYPES[cls._check_file_extension(filename)]
+            s3_key = cls._generate_s3_key(user_id, filename)
             
-            snaps = [
-                {
-                    "img_url": f"https://{BUCKET_NAME}.s3.{env("AWS_S3_REGION")}.amazonaws.com/{obj["Key"]}",
-                    "created_at": obj["LastModified"],
-                    "file_size": obj["Size"],
-                    "s3_key": obj["Key"],
-                }
-                for obj in response["Contents"]
-            ]
+            # The browser posts the file straight to S3, the policy pins the key, content type,
+            # ACL and size so the form can't be reused for anything else
+            presigned_post = S3_CLIENT.generate_presigned_post(
+                Bucket=BUCKET_NAME,
+                Key=s3_key,
+                Fields={
+                    "Content-Type": content_type,
+                    "acl": "public-read",
+                },
+                Conditions=[
+                    { "Content-Type": content_type },
+                    { "acl": "public-read" },
+                    ["content-length-range", 1, settings.snap_upload_max_bytes],
+                ],
+                ExpiresIn=settings.snap_presigned_upload_expires_seconds,
+            )
             
-            return sorted(snaps, key=lambda x: x["created_at"], reverse=True)
+            return {
+                "url": presigned_post["url"],
+                "fields": presigned_post["fields"],
+                "s3_key": s3_key,
+            }
         
         except ClientError as e:
-            cls._raise_client_operation_error("read_snaps", e)
+            cls._raise_client_operation_error("create_presigned_snap_upload", e)
         
     @classmethod
-    def read_newest_snap(cls, user_id: int) -> str:
+    async def read_uploaded_snap(cls, user_id: int, s3_key: str) -> tuple[str, bytes]:
         try:
-            response = S3_CLIENT.list_objects_v2(Bucket=BUCKET_NAME, Prefix=f"{user_id}/snap/")
+            if not s3_key.startswith(f"{user_id}/snap/"):
+                raise S3SnapKeyError(f"S3 key {s3_key} is not a snap of user {user_id}")
             
-            if response["KeyCount"] == 0:
-                return ""
+            response = await asyncio.to_thread(S3_CLIENT.get_object, Bucket=BUCKET_NAME, Key=s3_key)
             
-            return f"https://{BUCKET_NAME}.s3.{env("AWS_S3_REGION")}.amazonaws.com/{response["Contents"][0]["Key"]}"
-        
-        except ClientError as e:
-            cls._raise_client_operation_error("read_newest_snap", e)
+            if response["ContentLength"] > settings.snap_upload_max_bytes:
+                raise S3FileSizeError(f"File exceeds the {settings.snap_upload_max_bytes} byte upload limit")
+            
+            img_content = await asyncio.to_thread(response["Body"].read)
+            
+            return cls.get_snap_url(s3_key), img_content
         
-    @classmethod
-    def get_snap_count(cls, user_id: int) -> int:
-        try:
-            response = S3_CLIENT.list_objects_v2(Bucket=BUCKET_NAME, Prefix=f"{user_id}/snap/")
-            return response["KeyCount"]
+        except (S3SnapKeyError, S3FileSizeError) as e:
+            app.state.logger.log_error(str(e))
+            raise
         
         except ClientError as e:
-            cls._raise_client_operation_error("get_snap_count", e)
-
+            cls._raise_client_operation_error("read_uploaded_snap", e)
+        
     @classmethod
-    def delete_snap(cls, s3_key: str) -> None:
-        try:
-            message = {
-                "operation": "delete_snap",
-                "s3_key": s3_key,
-            }
+    async def delete_snap(cls, s3_key: str) -> None:
+        message = {
+            "operation": "delete_snap",
+            "s3_key": s3_key,
+        }
 
-            kafka_producer.produce(
-                topic="s3.delete_snap",
-                key=str(s3_key).encode("utf-8"),
-                value=json.dumps(message).encode("utf-8"),
-            )
-            
-            remaining_messages = kafka_producer.flush(timeout=15)
-            
-            if remaining_messages > 0:
-                cls._raise_kafka_message_delivery_failure("delete_snap", remaining_messages)
-            
-            return
-
-        except KafkaProduceDeliveryError:
-            raise
-
-        except Exception as e:
-            cls._raise_kafka_message_produce_failure("delete_snap", e)
+        await send_kafka_message("delete_snap", "s3.delete_snap", s3_key, message, KAFKA_PRODUCE_ERRORS)
         
     @classmethod
-    def delete_all_snaps(cls, user_id: int) -> None:
-        try:
-            message = {
-                "operation": "delete_all_snaps",
-                "user_id": user_id,
-            }
-
-            kafka_producer.produce(
-                topic="s3.delete_all_snaps",
-                key=str(user_id).encode("utf-8"),
-                value=json.dumps(message).encode("utf-8"),
-            )
-            
-            remaining_messages = kafka_producer.flush(timeout=15)
-            
-            if remaining_messages > 0:
-                cls._raise_kafka_message_delivery_failure("delete_all_snaps", remaining_messages)
-            
-            return
-
-        except KafkaProduceDeliveryError:
-            raise
+    async def delete_all_snaps(cls, user_id: int) -> None:
+        message = {
+            "operation": "delete_all_snaps",
+            "user_id": user_id,
+        }
 
-        except Exception as e:
-            cls._raise_kafka_message_produce_failure("delete_all_snaps", e)
+        await send_kafka_message("delete_all_snaps", "s3.delete_all_snaps", user_id, message, KAFKA_PRODUCE_ERRORS)
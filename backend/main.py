@@ -12,12 +12,8 @@ from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
 from fastapi_csrf_protect import CsrfProtect
 
-from routers import auth, snap, user
-from config.app_settings_config import Settings
-from config.logging_config import Logging
-from infra.db import RDS
-from infra.sessions import Redis
-from infra.messaging import run_consumer
+from backend.config.app_settings_config import Settings
+from backend.config.logging_config import Logging
 
 settings = Settings()
 
@@ -48,7 +44,7 @@ class CsrfSettings(BaseModel):
 def get_csrf_config() -> CsrfSettings:
     return CsrfSettings()
 class CsrfTokenOut(BaseModel):
-    csrf_token = Field(..., description="Send this in a 'X-CSRF-Token' header")
+    csrf_token: str = Field(..., description="Send this in a 'X-CSRF-Token' header")
     
 # Error handling
 class RootError(Exception):
@@ -58,23 +54,46 @@ class RootError(Exception):
 # Server configs and root logic
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    rds = RDS()
+    rds = AsyncRDS() if settings.rds_driver == "asyncpg" else ThreadPoolRDS()
+    await rds.create_tables()
     logging = Logging()
     
     app.state.rds = rds
     app.state.logging = logging
+    app.state.logger = logging
     
-    stop_event = threading.Event()
-    thread = threading.Thread(target=run_consumer, args=(stop_event,), daemon=True)
-    thread.start()
+    try:
+        await MongoDB.ensure_indexes()
+        
+    except MongoDBIndexError:
+        # Already logged, listings still work without the indexes, only slower
+        pass
     
-    app.state.kafka_thread = thread
-    app.state.kafka_stop_event = stop_event
+    if settings.run_in_process_consumer:
+        stop_event = threading.Event()
+        thread = threading.Thread(target=run_consumer, args=(stop_event,), daemon=True)
+        thread.start()
+        
+        app.state.kafka_thread = thread
+        app.state.kafka_stop_event = stop_event
+    
+    producer_gateway.start()
+    background_producer_gateway.start()
+    session_invalidation_listener.start()
     
     yield
     
-    app.state.kafka_stop_event.set()
-    app.state.kafka_thread.join(timeout=5)
+    session_invalidation_listener.stop()
+    await producer_gateway.stop()
+    await background_producer_gateway.stop()
+    await Redis.close()
+    await MongoDB.close()
+    await close_detector()
+    await rds.dispose()
+    
+    if settings.run_in_process_consumer:
+        app.state.kafka_stop_event.set()
+        app.state.kafka_thread.join(timeout=5)
 
 app = FastAPI(
     title=settings.app_name,
@@ -82,12 +101,23 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# The routers and infra modules import app, limiter and settings from this module, so they're
+# imported once those exist
+from backend.routers import auth, snap, user
+from backend.infra.db import AsyncRDS, ThreadPoolRDS
+from backend.infra.db_tagging import MongoDB, MongoDBIndexError
+from backend.infra.sessions import Redis, session_invalidation_listener
+from backend.infra.messaging import run_consumer, producer_gateway, background_producer_gateway
+from backend.services.computer_vision import close_detector
+from backend.utils.dependencies import current_session
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.cors_origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 app.add_middleware(TrustedHostMiddleware, allowed_hosts=settings.trusted_hosts)
 app.add_middleware(GZipMiddleware, minimum_size=1024)
@@ -113,21 +143,19 @@ app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
 @app.get("/", response_model=RootResponse)
 @limiter.limit("40/minute")
-async def root(request: Request, csrf_protect: CsrfProtect = Depends()):
+async def root(
+    request: Request,
+    csrf_protect: CsrfProtect = Depends(),
+    session: dict = Depends(current_session),
+):
     await csrf_protect.validate_csrf(request)
     
     try:
-        session_key = request.cookies.get("session_key")
-        
-        if not session_key:
-            return RedirectResponse(url="http://localhost:3000/login", status_code=302)
-        
-        session = Redis.get_session(session_key)
-        
         if not session:
             return RedirectResponse(url="http://localhost:3000/login", status_code=302)
         
-        first_name = app.state.rds.read_user(session["user_id"])["first_name"].title()
+        user = await app.state.rds.read_user(session["user_id"])
+        first_name = user["first_name"].title()
         thumbnail_img_url = session["thumbnail_img_url"]
         created_at = session["created_at"]
 
@@ -150,7 +178,7 @@ async def root(request: Request, csrf_protect: CsrfProtect = Depends()):
     
 @app.get("/csrf", response_model=CsrfTokenOut)
 @limiter.limit("20/minute")
-async def issue_csrf(csrf_protect: CsrfProtect = Depends()):
+async def issue_csrf(request: Request, csrf_protect: CsrfProtect = Depends()):
     csrf_token, signed_token = csrf_protect.generate_csrf_tokens()
     
     res = JSONResponse(content={ "csrf_token": csrf_token })
@@ -160,7 +188,7 @@ async def issue_csrf(csrf_protect: CsrfProtect = Depends()):
 
 @app.get("/health")
 @limiter.limit("60/minute")
-async def health_check():
+async def health_check(request: Request):
     return { "status": "alive" }
 
 # Make mypy happy
@@ -178,8 +206,9 @@ def random_greeting() -> str:
     
 if __name__ == "__main__":
     import uvicorn
+    # An import string, reload needs one and the app has to load as backend.main like its imports
     uvicorn.run(
-        app,
+        "backend.main:app",
         host="0.0.0.0",
         port=8000,
         reload=True,
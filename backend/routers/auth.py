@@ -71,7 +71,7 @@ class VerifyOtpCreds(BaseModel):
     user_otp: int = Field(..., ge=100000, le=999999)
 
 class ValidateAndLoginCreds(BaseModel):
-    username_or_email: str = Field(..., min_length=4, max_length=50, strip_whitespace=True) | EmailStr
+    username_or_email: str = Field(..., min_length=4, max_length=50, strip_whitespace=True)
     password: str = Field(..., min_length=8, max_length=50)
     
 class ValidateResponse(BaseModel):
@@ -106,7 +106,7 @@ async def google_auth(request: Request):
         oauth_user_id = user.get("sub")
         first_name = user.get("given_name")
 
-        session_key = signup_or_login_oauth(first_name, "google", oauth_user_id)
+        session_key = await signup_or_login_oauth(first_name, "google", oauth_user_id)
         
         return redirect_and_set_cookie(session_key)
     
@@ -132,7 +132,7 @@ async def facebook_auth(request: Request):
         oauth_user_id = user.get("id")
         first_name = user.get("first_name")
         
-        session_key = signup_or_login_oauth(first_name, "facebook", oauth_user_id)
+        session_key = await signup_or_login_oauth(first_name, "facebook", oauth_user_id)
         
         return redirect_and_set_cookie(session_key)
     
@@ -159,7 +159,7 @@ async def apple_auth(request: Request):
         oauth_user_id = id_token.get("sub") if id_token else None
         first_name = json.loads(user_data).get("name", {}).get("firstName") if user_data else None
         
-        session_key = signup_or_login_oauth(first_name, "apple", oauth_user_id)
+        session_key = await signup_or_login_oauth(first_name, "apple", oauth_user_id)
         
         return redirect_and_set_cookie(session_key)
     
@@ -217,7 +217,7 @@ async def request_otp(
             server.login(env("EMAIL"), env("SMTP_EMAIL_APP_PASS"))
             server.sendmail(env("EMAIL"), email, msg.as_string())
             
-        Redis.add_otp(int(otp), email)
+        await Redis.add_otp(int(otp), email)
             
         return Response(status_code=200)
 
@@ -237,7 +237,7 @@ async def verify_otp(
         email = creds.email
         user_otp = creds.user_otp
         
-        res = Redis.verify_otp(int(user_otp), email)
+        res = await Redis.verify_otp(int(user_otp), email)
     
         if not res:
             return Response(status_code=401, content="Your code is incorrect! Please try again!")
@@ -262,9 +262,9 @@ async def signup(
         password = creds.password
         email = creds.email
         
-        user_id = app.state.rds.create_user(first_name, username, password, email)
-        app.state.rds.create_user_preference(user_id, "light")
-        session_key = Redis.add_new_session(user_id)
+        user_id = await app.state.rds.create_user(first_name, username, password, email)
+        await app.state.rds.create_user_preference(user_id, "light")
+        session_key = await Redis.add_new_session(user_id)
 
         return redirect_and_set_cookie(session_key)
     
@@ -284,7 +284,7 @@ async def validate(
         username_or_email = creds.username_or_email
         password = creds.password
         
-        res = app.state.rds.check_normal_login_creds(username_or_email, password)
+        res = await app.state.rds.check_normal_login_creds(username_or_email, password)
             
         if not res:
             return Response(status_code=401, content="Incorrect username or password")
@@ -307,9 +307,9 @@ async def login(
         username_or_email = creds.username_or_email
         password = creds.password
         
-        user_id = app.state.rds.fetch_normal_user(username_or_email, password)
-        session_key = Redis.add_new_session(user_id)
-        update_thumbnail(user_id, session_key)
+        user_id = await app.state.rds.fetch_normal_user(username_or_email, password)
+        session_key = await Redis.add_new_session(user_id)
+        await update_thumbnail(user_id, session_key)
             
         return redirect_and_set_cookie(session_key)
 
@@ -328,7 +328,7 @@ async def logout(
     try:
         session_key = request.cookies.get("session_key")
         
-        Redis.delete_session(session_key)
+        await Redis.delete_session(session_key)
         response.delete_cookie("session_key")
         res = JSONResponse(content={ "detail": "success" })
         csrf_protect.unset_csrf_cookie(res)
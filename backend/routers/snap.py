@@ -1,14 +1,19 @@
 import re
+import asyncio
+from datetime import datetime
+from typing import Optional
 
-from fastapi import APIRouter, Request, Response, Depends, UploadFile
+from fastapi import APIRouter, Request, Response, Depends, Query, UploadFile
 from pydantic import BaseModel, Field, validator
 from fastapi_csrf_protect import CsrfProtect
 
-from backend.main import app, limiter
+from backend.main import app, limiter, settings
 from backend.infra.db_tagging import MongoDB
 from backend.infra.storage import S3
 from backend.infra.sessions import Redis
-from backend.services.computer_vision import yolov11_detect_img_objects
+from backend.utils.dependencies import current_session
+from backend.utils.pagination import encode_snap_cursor, decode_snap_cursor, InvalidCursorError
+from backend.services.computer_vision import yolov11_detect_img_objects, yolov11_detect_img_bytes
 
 router = APIRouter(
     prefix="/snap",
@@ -36,6 +41,17 @@ class KeyAndCaption(BaseModel):
         
         return v.strip()
 
+class PresignedUploadRequest(BaseModel):
+    filename: str = Field(..., min_length=1, max_length=255)
+
+class PresignedUploadResponse(BaseModel):
+    url: str
+    fields: dict[str, str]
+    s3_key: str
+
+class UploadComplete(BaseModel):
+    s3_key: str
+
 # Error handling
 class SnapError(Exception):
     "Exception for snap operations"
@@ -48,31 +64,101 @@ def _raise_snap_operation_error(func_name: str, error: Exception) -> None:
 
 @router.get("/all", response_model=list[AllSnapsResponse])
 @limiter.limit("30/minute")
-async def all(request: Request, csrf_protect: CsrfProtect = Depends()):
+async def all(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    csrf_protect: CsrfProtect = Depends(),
+    session: dict = Depends(current_session),
+):
     await csrf_protect.validate_csrf(request)
     
+    if limit is None and cursor is None:
+        # Whole library in one response, as before pagination existed
+        return await _all_snaps(session)
+    
     try:
-        session_key = request.cookies.get("session_key")
+        after = decode_snap_cursor(cursor) if cursor else None
         
-        session = Redis.get_session(session_key)
+    except InvalidCursorError:
+        return Response(status_code=400, content="Invalid cursor")
+    
+    return await _snap_page(session, response, min(limit or settings.snap_page_size, settings.snap_page_max_size), after)
+
+# Snaps without a tags document yet (detection failed or hasn't landed) are listed untagged
+UNTAGGED = { "tags": [], "caption": "" }
+
+async def _read_tags_and_captions_by_s3_key(user_id: int, s3_keys: list[str]) -> dict[str, dict]:
+    return {
+        tags_and_caption["s3_key"]: tags_and_caption
+        async for tags_and_caption in MongoDB.stream_img_tags_and_captions(user_id, s3_keys)
+    }
+
+def _join_tags_and_captions(snaps: list[dict], tags_and_captions: dict[str, dict]) -> list[dict]:
+    "Hash join on s3_key, keeping the catalog's order"
+    
+    joined = []
+    
+    for snap in snaps:
+        tags_and_caption = tags_and_captions.get(snap["s3_key"], UNTAGGED)
+        
+        joined.append({
+            "img_url": snap["img_url"],
+            "created_at": snap["created_at"],
+            "file_size": snap["file_size"],
+            "s3_key": snap["s3_key"],
+            "tags": tags_and_caption.get("tags", UNTAGGED["tags"]),
+            "caption": tags_and_caption.get("caption", UNTAGGED["caption"]),
+        })
+    
+    return joined
+
+async def _no_snaps() -> list[dict]:
+    return []
+
+async def _all_snaps(session: dict) -> list[dict]:
+    try:
+        user_id = session["user_id"]
+        page_size = settings.mongo_read_batch_size
+        joined = []
+        
+        # Joined one catalog page at a time, so only a page of tags is ever held for the join,
+        # and the next page is read from the catalog while this page's tags are read from MongoDB
+        snaps = await app.state.rds.read_snaps(user_id, limit=page_size)
+        
+        while snaps:
+            after = (datetime.fromisoformat(snaps[-1]["created_at"]), snaps[-1]["s3_key"])
+            
+            tags_and_captions, next_snaps = await asyncio.gather(
+                _read_tags_and_captions_by_s3_key(user_id, [snap["s3_key"] for snap in snaps]),
+                app.state.rds.read_snaps(user_id, limit=page_size, after=after) if len(snaps) == page_size else _no_snaps(),
+            )
+            
+            joined.extend(_join_tags_and_captions(snaps, tags_and_captions))
+            snaps = next_snaps
+        
+        return joined
+    
+    except Exception as e:
+        _raise_snap_operation_error("all", e)
+
+async def _snap_page(session: dict, response: Response, limit: int, after: Optional[tuple[datetime, str]]) -> list[dict]:
+    try:
         user_id = session["user_id"]
         
-        snaps = S3.read_snaps(user_id)
-        img_tags_and_captions = MongoDB.read_img_tags_and_captions(user_id)
+        # One extra row tells whether another page follows without a count query
+        snaps = await app.state.rds.read_snaps(user_id, limit=limit + 1, after=after)
+        has_next_page = len(snaps) > limit
+        snaps = snaps[:limit]
         
-        snaps_with_tags_and_captions = []
+        # Needs the page's keys first, so this read can't overlap the catalog's
+        tags_and_captions = await _read_tags_and_captions_by_s3_key(user_id, [snap["s3_key"] for snap in snaps])
         
-        for snap, tags_and_caption in zip(snaps, img_tags_and_captions):
-            snaps_with_tags_and_captions.append({
-                "img_url": snap["img_url"],
-                "created_at": snap["created_at"],
-                "file_size": snap["file_size"],
-                "s3_key": snap["s3_key"],
-                "tags": tags_and_caption["tags"],
-                "caption": tags_and_caption["caption"],
-            })
+        if has_next_page:
+            response.headers["X-Next-Cursor"] = encode_snap_cursor(snaps[-1])
         
-        return snaps_with_tags_and_captions
+        return _join_tags_and_captions(snaps, tags_and_captions)
     
     except Exception as e:
         _raise_snap_operation_error("all", e)
@@ -83,25 +169,69 @@ async def upload(
     request: Request,
     img_file: UploadFile,
     csrf_protect: CsrfProtect = Depends(),
+    session: dict = Depends(current_session),
 ):
     await csrf_protect.validate_csrf(request)
     
     try:
         session_key = request.cookies.get("session_key")
-        
-        session = Redis.get_session(session_key)
         user_id = session["user_id"]
         
-        img_url, s3_key = await S3.upload_snap(user_id, img_file)
-        Redis.place_thumbnail_img_url(session_key, img_url)
+        img_url, s3_key, file_size = await S3.upload_snap(user_id, img_file)
+        await app.state.rds.create_snap(user_id, s3_key, img_url, file_size, img_file.content_type)
+        await Redis.place_thumbnail_img_url(session_key, img_url)
         tags = await yolov11_detect_img_objects(img_file)
-        MongoDB.add_img_tags(user_id, s3_key, tags)
+        await MongoDB.add_img_tags(user_id, s3_key, tags)
         
         return Response(status_code=200)
         
     except Exception as e:
         _raise_snap_operation_error("upload", e)
 
+@router.post("/upload/presigned", response_model=PresignedUploadResponse)
+@limiter.limit("325/minute")
+async def upload_presigned(
+    request: Request,
+    presigned_upload_request: PresignedUploadRequest,
+    csrf_protect: CsrfProtect = Depends(),
+    session: dict = Depends(current_session),
+):
+    await csrf_protect.validate_csrf(request)
+    
+    try:
+        user_id = session["user_id"]
+        
+        return S3.create_presigned_snap_upload(user_id, presigned_upload_request.filename)
+        
+    except Exception as e:
+        _raise_snap_operation_error("upload_presigned", e)
+
+@router.post("/upload/complete")
+@limiter.limit("325/minute")
+async def upload_complete(
+    request: Request,
+    upload_complete: UploadComplete,
+    csrf_protect: CsrfProtect = Depends(),
+    session: dict = Depends(current_session),
+):
+    await csrf_protect.validate_csrf(request)
+    
+    try:
+        session_key = request.cookies.get("session_key")
+        user_id = session["user_id"]
+        s3_key = upload_complete.s3_key
+        
+        img_url, img_content = await S3.read_uploaded_snap(user_id, s3_key)
+        await app.state.rds.create_snap(user_id, s3_key, img_url, len(img_content), S3.get_snap_content_type(s3_key))
+        await Redis.place_thumbnail_img_url(session_key, img_url)
+        tags = await yolov11_detect_img_bytes(img_content)
+        await MongoDB.add_img_tags(user_id, s3_key, tags)
+        
+        return Response(status_code=200)
+        
+    except Exception as e:
+        _raise_snap_operation_error("upload_complete", e)
+
 @router.post("/caption")
 @router.put("/caption")
 @limiter.limit("50/minute")
@@ -116,7 +246,7 @@ async def caption(
         s3_key = key_and_caption.s3_key
         caption = key_and_caption.caption
         
-        MongoDB.write_img_caption(s3_key, caption)
+        await MongoDB.write_img_caption(s3_key, caption)
         
         return Response(status_code=200)
         
@@ -132,8 +262,9 @@ async def delete_single(
     await csrf_protect.validate_csrf(request)
     
     try:
-        S3.delete_snap(s3_key)
-        MongoDB.delete_img_tags_and_captions(s3_key)
+        await app.state.rds.delete_snap(s3_key)
+        await S3.delete_snap(s3_key)
+        await MongoDB.delete_img_tags_and_captions(s3_key)
         
         return Response(status_code=200)
     
@@ -8,6 +8,7 @@ from backend.main import app, limiter
 from backend.infra.db_tagging import MongoDB
 from backend.infra.storage import S3
 from backend.infra.sessions import Redis
+from backend.utils.dependencies import current_session
 
 router = APIRouter(
     prefix="/user",
@@ -50,20 +51,21 @@ def _raise_user_operation_error(func_name: str, error: Exception) -> None:
 
 @router.get("/details", response_model=DetailsResponse)
 @limiter.limit("30/minute")
-async def details(request: Request, csrf_protect: CsrfProtect = Depends()):
+async def details(
+    request: Request,
+    csrf_protect: CsrfProtect = Depends(),
+    session: dict = Depends(current_session),
+):
     await csrf_protect.validate_csrf(request)
     
     try:
-        session_key = request.cookies.get("session_key")
-        
-        session = Redis.get_session(session_key)
         user_id = session["user_id"]
         
-        user_details = app.state.rds.read_user(user_id)
-        user_preferences_details = app.state.rds.read_user_preference(user_id)
+        user_details = await app.state.rds.read_user(user_id)
+        user_preferences_details = await app.state.rds.read_user_preference(user_id)
     
         details = user_details | user_preferences_details
-        details["snap_count"] = S3.get_snap_count(user_id)
+        details["snap_count"] = await app.state.rds.get_snap_count(user_id)
         
         if details["is_oauth"]:
             return OAuthDetailsResponse(**details)
@@ -83,19 +85,17 @@ async def update(
     email: Optional[str] = None,
     theme: Optional[str] = None,
     csrf_protect: CsrfProtect = Depends(),
+    session: dict = Depends(current_session),
 ):
     await csrf_protect.validate_csrf(request)
     
     try:
-        session_key = request.cookies.get("session_key")
-
-        session = Redis.get_session(session_key)
         user_id = session["user_id"]
         
-        app.state.rds.update_user(user_id, first_name, username, password, email)
+        await app.state.rds.update_user(user_id, first_name, username, password, email)
         
         if theme:
-            app.state.rds.update_user_preference(user_id, theme)
+            await app.state.rds.update_user_preference(user_id, theme)
         
         return Response(status_code=200, content="Updated successfully")
     
@@ -107,21 +107,21 @@ async def delete(
     request: Request,
     response: Response,
     csrf_protect: CsrfProtect = Depends(),
+    session: dict = Depends(current_session),
 ):
     await csrf_protect.validate_csrf(request)
     
     try:
         session_key = request.cookies.get("session_key")
-        
-        session = Redis.get_session(session_key)
         user_id = session["user_id"]
         
-        app.state.rds.delete_user_preference(user_id)
-        app.state.rds.delete_user(user_id)
-        Redis.delete_session(session_key)
+        await app.state.rds.delete_user_preference(user_id)
+        await app.state.rds.delete_all_snaps(user_id)
+        await app.state.rds.delete_user(user_id)
+        await Redis.delete_session(session_key)
         response.delete_cookie("session_key")
-        S3.delete_all_snaps(user_id)
-        MongoDB.delete_all_user_img_tags_and_captions(user_id)
+        await S3.delete_all_snaps(user_id)
+        await MongoDB.delete_all_user_img_tags_and_captions(user_id)
         
         return Response(status_code=200, content="Account deleted successfully")
     
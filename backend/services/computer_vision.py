@@ -1,11 +1,14 @@
 import os
 import base64
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
-import requests as req
 from dotenv import load_dotenv
 from fastapi import UploadFile
 
-from backend.main import app
+from backend.main import app, settings
+from backend.config.config import ROBOFLOW_HTTP_CLIENT, ROBOFLOW_MAX_CONCURRENCY
 
 class YOLOv11Error(Exception):
     "Exception for YOLOv11 operations"
@@ -25,26 +28,35 @@ def yolov11_error_handler(error: Exception = None) -> None:
 load_dotenv()
 env = os.getenv
 
-async def yolov11_detect_img_objects(img_file: UploadFile) -> list[str]:
-    try:
-        img_content = await img_file.read()
+# Same thresholds for both backends, so switching doesn't change which tags a snap gets
+DETECTION_CONFIDENCE = 0.35
+DETECTION_OVERLAP = 0.5
+
+# Caps in-flight inference calls per worker, HTTP/2 would otherwise multiplex them without limit
+roboflow_semaphore = asyncio.Semaphore(ROBOFLOW_MAX_CONCURRENCY)
+
+class RoboflowDetector:
+    "YOLOv11 hosted on Roboflow, called over the shared pooled HTTP client"
+
+    async def detect(self, img_content: bytes) -> list[str]:
         img_base64 = str(base64.b64encode(img_content).decode("utf-8"))
         
-        res = req.post(
-            f"https://detect.roboflow.com/{env("ROBOFLOW_MODEL_PATH")}",
-            headers={
-                "User-Agent": f"FiveSnaps/0.1.0 (https://fivesnaps.com; {env("EMAIL")})",
-                "Accept": "application/json",
-                "Content-Type": "application/x-www-form-urlencoded",
-                "Accept-Language": "en-US",
-            },
-            params={
-                "overlap": 0.5,
-                "confidence": 0.35,
-                "api-key": env("ROBOFLOW_API_KEY"),
-            },
-            data=img_base64,
-        )
+        async with roboflow_semaphore:
+            res = await ROBOFLOW_HTTP_CLIENT.post(
+                f"/{env("ROBOFLOW_MODEL_PATH")}",
+                headers={
+                    "User-Agent": f"FiveSnaps/0.1.0 (https://fivesnaps.com; {env("EMAIL")})",
+                    "Accept": "application/json",
+                    "Content-Type": "application/x-www-form-urlencoded",
+                    "Accept-Language": "en-US",
+                },
+                params={
+                    "overlap": DETECTION_OVERLAP,
+                    "confidence": DETECTION_CONFIDENCE,
+                    "api-key": env("ROBOFLOW_API_KEY"),
+                },
+                content=img_base64,
+            )
         
         if res.status_code != 200:
             yolov11_error_handler()
@@ -58,8 +70,124 @@ async def yolov11_detect_img_objects(img_file: UploadFile) -> list[str]:
         
         return tags
     
+    async def detect_batch(self, images: list[bytes]) -> list[list[str] | Exception]:
+        # The hosted model takes one image per request, so a batch is concurrent calls on the pool
+        return await asyncio.gather(*(self.detect(img_content) for img_content in images), return_exceptions=True)
+    
+    async def close(self) -> None:
+        await ROBOFLOW_HTTP_CLIENT.aclose()
+
+class OnnxDetector:
+    """
+    YOLO ONNX export run locally with ONNX Runtime on `onnx_detector_processes` CPU worker
+    processes, each loading the model once, so inference never holds the event loop or the GIL
+    """
+
+    def __init__(self, model_path: str | None = None, processes: int | None = None):
+        # Imported here so the Roboflow backend doesn't need numpy, Pillow or onnxruntime installed
+        from backend.services import onnx_yolo
+        
+        self.onnx_yolo = onnx_yolo
+        self.executor = ProcessPoolExecutor(
+            max_workers=processes or settings.onnx_detector_processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=onnx_yolo.load_model,
+            initargs=(model_path or env("YOLO_ONNX_MODEL_PATH"), DETECTION_CONFIDENCE, DETECTION_OVERLAP),
+        )
+    
+    async def detect(self, img_content: bytes) -> list[str]:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.onnx_yolo.detect, img_content)
+    
+    async def detect_batch(self, images: list[bytes]) -> list[list[str] | Exception]:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.onnx_yolo.detect_batch, images)
+    
+    async def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+class DetectionBatcher:
+    """
+    Wraps a detector so images arriving within `max_wait_ms` of the first pending one are
+    detected together, up to `max_batch_size` per `detect_batch` call, and each waiting request
+    gets its own image's tags (or exception) back
+    """
+
+    def __init__(self, detector: RoboflowDetector | OnnxDetector, max_batch_size: int, max_wait_ms: float):
+        self.detector = detector
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._pending: list[tuple[bytes, asyncio.Future]] = []
+        self._flush_timer: asyncio.TimerHandle | None = None
+        self._batches: set[asyncio.Task] = set()
+    
+    async def detect(self, img_content: bytes) -> list[str]:
+        loop = asyncio.get_running_loop()
+        tags = loop.create_future()
+        self._pending.append((img_content, tags))
+        
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        
+        elif self._flush_timer is None:
+            self._flush_timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+        
+        return await tags
+    
+    def _flush(self) -> None:
+        if self._flush_timer:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        
+        batch, self._pending = self._pending, []
+        
+        # Keep a reference until it finishes, the loop only holds weak ones
+        task = asyncio.create_task(self._detect_batch(batch))
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+    
+    async def _detect_batch(self, batch: list[tuple[bytes, asyncio.Future]]) -> None:
+        try:
+            results = await self.detector.detect_batch([img_content for img_content, _ in batch])
+        
+        except Exception as e:
+            results = [e] * len(batch)
+        
+        for (_, tags), result in zip(batch, results):
+            if tags.done():
+                # The request went away while its image was being detected
+                continue
+            
+            if isinstance(result, BaseException):
+                tags.set_exception(result)
+            else:
+                tags.set_result(result)
+    
+    async def close(self) -> None:
+        "Detects whatever is still pending and waits for every batch in flight before closing the detector"
+        
+        if self._pending:
+            self._flush()
+        
+        await asyncio.gather(*self._batches, return_exceptions=True)
+        await self.detector.close()
+
+# "roboflow" calls the hosted model, "onnx" runs the local export
+detector = OnnxDetector() if settings.detector_backend == "onnx" else RoboflowDetector()
+
+if settings.detector_batching:
+    detector = DetectionBatcher(detector, settings.detector_batch_max_size, settings.detector_batch_max_wait_ms)
+
+async def yolov11_detect_img_objects(img_file: UploadFile) -> list[str]:
+    return await yolov11_detect_img_bytes(await img_file.read())
+
+async def yolov11_detect_img_bytes(img_content: bytes) -> list[str]:
+    try:
+        return await detector.detect(img_content)
+    
     except YOLOv11Error:
         raise
     
     except Exception as e:
         yolov11_error_handler(e)
+
+async def close_detector() -> None:
+    await detector.close()
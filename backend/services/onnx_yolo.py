@@ -0,0 +1,146 @@
+"""
+YOLO object detection on CPU with ONNX Runtime, for an Ultralytics YOLO export
+(`yolo export model=yolo11n.pt format=onnx`).
+
+Runs inside the detector's worker processes: `load_model` is the process initializer and keeps
+one InferenceSession per process, `detect` and `detect_batch` turn image bytes into the
+detected class names. Nothing here imports the app, so spawned workers stay light.
+"""
+import io
+import ast
+
+import numpy as np
+import onnxruntime as ort
+from PIL import Image
+
+_session: ort.InferenceSession | None = None
+_class_names: dict[int, str] = {}
+_confidence = 0.35
+_overlap = 0.5
+
+def load_model(model_path: str, confidence: float, overlap: float) -> None:
+    global _session, _class_names, _confidence, _overlap
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    # Parallelism comes from the worker processes, one thread each keeps them from fighting over cores
+    options.intra_op_num_threads = 1
+    options.inter_op_num_threads = 1
+
+    _session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+    # Ultralytics stores the labels as the repr of a dict, e.g. "{0: 'person', 1: 'bicycle'}"
+    _class_names = ast.literal_eval(_session.get_modelmeta().custom_metadata_map.get("names", "{}"))
+    _confidence = confidence
+    _overlap = overlap
+
+def _input_size() -> int:
+    height = _session.get_inputs()[0].shape[2]
+    # Exports with dynamic axes report a symbolic name instead of a number
+    return height if isinstance(height, int) else 640
+
+def preprocess(img_content: bytes, size: int) -> np.ndarray:
+    "Letterboxes the image to size x size and returns it as a 1x3xHxW float32 tensor in [0, 1]"
+
+    img = Image.open(io.BytesIO(img_content)).convert("RGB")
+    scale = min(size / img.width, size / img.height)
+    resized = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.BILINEAR)
+
+    canvas = Image.new("RGB", (size, size), (114, 114, 114))
+    canvas.paste(resized, ((size - resized.width) // 2, (size - resized.height) // 2))
+
+    return (np.asarray(canvas, dtype=np.float32) / 255.0).transpose(2, 0, 1)[np.newaxis]
+
+def _non_max_suppression(boxes: np.ndarray, scores: np.ndarray, overlap: float) -> list[int]:
+    "Greedy NMS over xyxy boxes, returns the kept indices highest score first"
+
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    order = scores.argsort()[::-1]
+    keep = []
+
+    while order.size:
+        best, rest = order[0], order[1:]
+        keep.append(int(best))
+
+        width = np.clip(np.minimum(boxes[best, 2], boxes[rest, 2]) - np.maximum(boxes[best, 0], boxes[rest, 0]), 0, None)
+        height = np.clip(np.minimum(boxes[best, 3], boxes[rest, 3]) - np.maximum(boxes[best, 1], boxes[rest, 1]), 0, None)
+        intersection = width * height
+        iou = intersection / (areas[best] + areas[rest] - intersection + 1e-9)
+
+        order = rest[iou <= overlap]
+
+    return keep
+
+def postprocess(output: np.ndarray, class_names: dict[int, str], confidence: float, overlap: float) -> list[str]:
+    """
+    Class names of the detections in one image's raw YOLO output, shaped (4 + classes, candidates)
+    with cx, cy, w, h rows first, after the confidence cut and per-class NMS
+    """
+
+    candidates = output.T
+    class_ids = candidates[:, 4:].argmax(axis=1)
+    scores = candidates[np.arange(len(candidates)), 4 + class_ids]
+
+    mask = scores > confidence
+    candidates, class_ids, scores = candidates[mask], class_ids[mask], scores[mask]
+
+    if not len(candidates):
+        return []
+
+    cx, cy, w, h = candidates[:, 0], candidates[:, 1], candidates[:, 2], candidates[:, 3]
+    boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+
+    # Shifting every class into its own region makes one NMS pass behave per class
+    offsets = class_ids[:, np.newaxis] * (boxes.max() + 1)
+    keep = _non_max_suppression(boxes + offsets, scores, overlap)
+
+    return [class_names.get(int(class_ids[i]), str(class_ids[i])) for i in keep]
+
+def _run(tensors: list[np.ndarray]) -> list[np.ndarray]:
+    "Raw outputs for the 1x3xHxW tensors, in as few session runs as the export's batch axis allows"
+
+    model_input = _session.get_inputs()[0]
+    # Dynamic batch exports (`dynamic=True`) take any batch at once, fixed ones exactly that many
+    batch_size = model_input.shape[0] if isinstance(model_input.shape[0], int) else len(tensors)
+    outputs = []
+
+    for start in range(0, len(tensors), batch_size):
+        chunk = tensors[start:start + batch_size]
+        padding = [np.zeros_like(chunk[0])] * (batch_size - len(chunk))
+        output = _session.run(None, { model_input.name: np.concatenate(chunk + padding) })[0]
+        outputs.extend(output[:len(chunk)])
+
+    return outputs
+
+def detect_batch(images: list[bytes]) -> list[list[str] | Exception]:
+    """
+    Class names for every image, detected together; an image that can't be decoded gets its
+    exception in its place instead of failing the others
+    """
+
+    if _session is None:
+        raise RuntimeError("load_model() has not run in this process")
+
+    results: list[list[str] | Exception | None] = [None] * len(images)
+    tensors, positions = [], []
+
+    for position, img_content in enumerate(images):
+        try:
+            tensors.append(preprocess(img_content, _input_size()))
+            positions.append(position)
+
+        except Exception as e:
+            results[position] = e
+
+    if tensors:
+        for position, output in zip(positions, _run(tensors)):
+            results[position] = postprocess(output, _class_names, _confidence, _overlap)
+
+    return results
+
+def detect(img_content: bytes) -> list[str]:
+    tags = detect_batch([img_content])[0]
+
+    if isinstance(tags, Exception):
+        raise tags
+
+    return tags
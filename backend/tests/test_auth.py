@@ -1,15 +1,16 @@
-from unittest.mock import Mock, patch
+from unittest.mock import Mock, AsyncMock, patch
 
 import pytest
 from fastapi.testclient import TestClient
+from fastapi_csrf_protect import CsrfProtect
 
-from backend.main import app
+from backend.main import app, settings
 
-client = TestClient(app)
+client = TestClient(app, base_url="http://localhost")
 
 @pytest.fixture(autouse=True)
 def setup_app_state():
-    app.state.rds = Mock()
+    app.state.rds = AsyncMock()
     app.state.logger = Mock()
     app.state.logger.log_error = Mock()
 
@@ -109,7 +110,7 @@ class TestSignupLogin:
     @patch("backend.infra.sessions.Redis")
     @patch("backend.utils.login.redirect_and_set_cookie")
     def test_signup_success(self, mock_redirect, mock_redis, valid_signup_data, mock_csrf):
-        app.state.rds = Mock()
+        app.state.rds = AsyncMock()
 
         app.state.rds.create_user.return_value = "user_id"
         app.state.rds.create_user_preference.return_value = None
@@ -123,7 +124,7 @@ class TestSignupLogin:
 
     @patch("backend.infra.sessions.Redis")
     def test_validate_credentials_success(self, mock_redis, valid_login_data, mock_csrf):
-        app.state.rds = Mock()
+        app.state.rds = AsyncMock()
         
         app.state.rds.check_or_fetch_normal_login_creds.return_value = {
             "email": "john@example.com",
@@ -140,7 +141,7 @@ class TestSignupLogin:
 
     @patch("backend.infra.sessions.Redis")
     def test_validate_credentials_invalid(self, mock_redis, mock_csrf):
-        app.state.rds = Mock()
+        app.state.rds = AsyncMock()
         app.state.rds.check_or_fetch_normal_login_creds.return_value = None
         
         response = client.post("/api/v1/auth/validate", json={
@@ -154,7 +155,7 @@ class TestSignupLogin:
     @patch("backend.utils.login.update_thumbnail")
     @patch("backend.utils.login.redirect_and_set_cookie")
     def test_login_success(self, mock_redirect, mock_thumbnail, mock_redis, valid_login_data, mock_csrf):
-        app.state.rds = Mock()
+        app.state.rds = AsyncMock()
         
         app.state.rds.check_or_fetch_normal_login_creds.return_value = "user_id"
         mock_redis.add_new_session.return_value = "session_key"
@@ -224,3 +225,97 @@ class TestErrorHandling:
         response = client.get("/api/v1/auth/login/google")
         
         assert response.status_code == 500
+
+class FakeRedisServer:
+    "In-memory stand-in for the async Redis client, pipelined commands apply immediately"
+
+    def __init__(self):
+        self.data = {}
+
+    def pipeline(self, transaction):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def execute(self):
+        return []
+
+    def hset(self, name, key=None, value=None, mapping=None):
+        self.data.setdefault(name, {}).update(mapping or { key: value })
+
+    def expire(self, name, time):
+        pass
+
+    async def hgetall(self, name):
+        return { k: str(v) for k, v in self.data.get(name, {}).items() }
+
+    async def setex(self, name, time, value):
+        self.data[name] = str(value)
+
+    async def get(self, name):
+        return self.data.get(name)
+
+class TestSessionWriteThrough:
+    @pytest.fixture(autouse=True)
+    def consumer_backlog(self):
+        # Kafka accepts the events but the consumer never gets to them
+        redis_server = FakeRedisServer()
+        csrf = Mock()
+        csrf.validate_csrf = AsyncMock()
+        app.dependency_overrides[CsrfProtect] = lambda: csrf
+
+        with patch("backend.infra.sessions.ASYNC_REDIS_CLIENT", redis_server), \
+             patch("backend.infra.messaging.background_producer_gateway") as mock_gateway, \
+             patch.object(settings, "session_write_through", True):
+            mock_gateway.send = AsyncMock()
+            self.mock_gateway = mock_gateway
+
+            yield redis_server
+
+        app.dependency_overrides.pop(CsrfProtect, None)
+
+    @patch("backend.routers.auth.update_thumbnail", new_callable=AsyncMock)
+    def test_root_reads_session_right_after_login(self, mock_thumbnail, valid_login_data):
+        app.state.rds.fetch_normal_user.return_value = 1
+        app.state.rds.read_user.return_value = { "first_name": "john" }
+
+        login_response = client.post("/api/v1/auth/login", json=valid_login_data, follow_redirects=False)
+        session_key = login_response.cookies.get("session_key")
+
+        client.cookies.set("session_key", session_key)
+        root_response = client.get("/", follow_redirects=False)
+
+        assert root_response.status_code == 200
+        assert root_response.json()["greeting_message"].endswith("John!")
+        # The event is still produced for auditing, marked so the consumer doesn't apply it again
+        message = self.mock_gateway.send.call_args[0][2]
+        assert message["written_through"] is True
+        assert self.mock_gateway.send.call_args[1]["wait"] is False
+
+    @patch("backend.routers.auth.smtplib.SMTP")
+    @patch("backend.routers.auth.pyotp.TOTP")
+    def test_otp_verifies_right_after_request(self, mock_totp, mock_smtp, valid_signup_data):
+        mock_totp.return_value.now.return_value = "123456"
+
+        client.post("/api/v1/auth/request-otp", json=valid_signup_data)
+        response = client.post("/api/v1/auth/verify-otp", json={
+            "email": "john@example.com",
+            "user_otp": 123456
+        })
+
+        assert response.status_code == 200
+
+    @patch("backend.routers.auth.update_thumbnail", new_callable=AsyncMock)
+    def test_login_survives_a_failed_audit_event(self, mock_thumbnail, valid_login_data, consumer_backlog):
+        app.state.rds.fetch_normal_user.return_value = 1
+        self.mock_gateway.send.side_effect = BufferError("Local: Queue full")
+
+        response = client.post("/api/v1/auth/login", json=valid_login_data, follow_redirects=False)
+
+        assert response.status_code == 302
+        assert response.cookies.get("session_key") in consumer_backlog.data
+        app.state.logger.log_error.assert_called_once()
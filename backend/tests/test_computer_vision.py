@@ -0,0 +1,219 @@
+import json
+import time
+import asyncio
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest.mock import Mock, patch
+
+import httpx
+import pytest
+
+from backend.main import app
+from backend.services.computer_vision import yolov11_detect_img_bytes, DetectionBatcher, YOLOv11Error
+
+@pytest.fixture(autouse=True)
+def setup_app_state():
+    app.state.logger = Mock()
+    app.state.logger.log_error = Mock()
+
+class FakeInferenceServer:
+    "Answers every POST with one 'dog' prediction after `delay` seconds and records connections"
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.client_ports = set()
+        self.lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+
+                with server.lock:
+                    server.client_ports.add(self.client_address[1])
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+
+                time.sleep(server.delay)
+
+                with server.lock:
+                    server.in_flight -= 1
+
+                body = json.dumps({ "predictions": [{ "class": "dog" }] }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+
+                try:
+                    self.wfile.write(body)
+
+                except BrokenPipeError:
+                    # The client already gave up waiting
+                    pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def detect_against(server: FakeInferenceServer, scenario, read_timeout: float = 5.0, max_concurrency: int = 16):
+    async def run():
+        client = httpx.AsyncClient(base_url=server.url, timeout=httpx.Timeout(read_timeout, connect=1.0))
+
+        with patch("backend.services.computer_vision.ROBOFLOW_HTTP_CLIENT", client), \
+             patch("backend.services.computer_vision.roboflow_semaphore", asyncio.Semaphore(max_concurrency)):
+            try:
+                return await scenario()
+
+            finally:
+                await client.aclose()
+
+    return asyncio.run(run())
+
+class TestRoboflowClient:
+    def test_other_requests_are_served_while_detection_is_in_flight(self):
+        async def scenario():
+            detection = asyncio.create_task(yolov11_detect_img_bytes(b"fake image content"))
+            served = 0
+
+            # Stand-in for other requests on the same worker, each needing the loop for 10ms
+            while not detection.done():
+                await asyncio.sleep(0.01)
+                served += 1
+
+            return await detection, served
+
+        with FakeInferenceServer(delay=0.3) as server:
+            tags, served = detect_against(server, scenario)
+
+        assert tags == ["dog"]
+        assert served >= 10
+
+    def test_connection_is_kept_alive_between_detections(self):
+        async def scenario():
+            return [await yolov11_detect_img_bytes(b"fake image content") for _ in range(5)]
+
+        with FakeInferenceServer(delay=0) as server:
+            results = detect_against(server, scenario)
+
+        assert results == [["dog"]] * 5
+        assert len(server.client_ports) == 1
+
+    def test_in_flight_detections_are_bounded(self):
+        async def scenario():
+            return await asyncio.gather(*(yolov11_detect_img_bytes(b"fake image content") for _ in range(6)))
+
+        with FakeInferenceServer(delay=0.05) as server:
+            results = detect_against(server, scenario, max_concurrency=2)
+
+        assert results == [["dog"]] * 6
+        assert server.max_in_flight == 2
+
+    def test_slow_inference_times_out(self):
+        async def scenario():
+            return await yolov11_detect_img_bytes(b"fake image content")
+
+        with FakeInferenceServer(delay=0.5) as server:
+            with pytest.raises(YOLOv11Error):
+                detect_against(server, scenario, read_timeout=0.1)
+
+        app.state.logger.log_error.assert_called_once()
+
+class FakeBatchDetector:
+    "Records every detect_batch call, tags each image with its own content"
+
+    def __init__(self, error: Exception | None = None):
+        self.batches = []
+        self.error = error
+        self.closed_with_batches = None
+
+    async def detect_batch(self, images):
+        self.batches.append(images)
+        await asyncio.sleep(0.01)
+
+        if self.error:
+            raise self.error
+
+        return [ValueError("broken image") if img == b"broken" else [img.decode()] for img in images]
+
+    async def close(self):
+        self.closed_with_batches = len(self.batches)
+
+def detect_through_batcher(batcher: DetectionBatcher, images: list[bytes]) -> list:
+    async def scenario():
+        with patch("backend.services.computer_vision.detector", batcher):
+            return await asyncio.gather(*(yolov11_detect_img_bytes(img) for img in images), return_exceptions=True)
+
+    return asyncio.run(scenario())
+
+class TestDetectionBatcher:
+    def test_concurrent_images_share_one_detect_batch_call(self):
+        fake = FakeBatchDetector()
+
+        results = detect_through_batcher(DetectionBatcher(fake, max_batch_size=8, max_wait_ms=5), [b"a", b"b", b"c"])
+
+        assert results == [["a"], ["b"], ["c"]]
+        assert fake.batches == [[b"a", b"b", b"c"]]
+
+    def test_full_batch_is_sent_without_waiting(self):
+        fake = FakeBatchDetector()
+        start = time.perf_counter()
+
+        results = detect_through_batcher(DetectionBatcher(fake, max_batch_size=2, max_wait_ms=10_000), [b"a", b"b", b"c", b"d"])
+
+        assert results == [["a"], ["b"], ["c"], ["d"]]
+        assert fake.batches == [[b"a", b"b"], [b"c", b"d"]]
+        assert time.perf_counter() - start < 1
+
+    def test_lone_image_is_sent_after_the_wait(self):
+        fake = FakeBatchDetector()
+        start = time.perf_counter()
+
+        assert detect_through_batcher(DetectionBatcher(fake, max_batch_size=8, max_wait_ms=50), [b"a"]) == [["a"]]
+        assert time.perf_counter() - start >= 0.05
+
+    def test_failed_image_only_fails_its_own_request(self):
+        results = detect_through_batcher(DetectionBatcher(FakeBatchDetector(), max_batch_size=8, max_wait_ms=5), [b"a", b"broken"])
+
+        assert results[0] == ["a"]
+        assert isinstance(results[1], YOLOv11Error)
+        app.state.logger.log_error.assert_called_once()
+
+    def test_failed_batch_fails_every_request_in_it(self):
+        fake = FakeBatchDetector(error=ConnectionError("inference down"))
+
+        results = detect_through_batcher(DetectionBatcher(fake, max_batch_size=8, max_wait_ms=5), [b"a", b"b"])
+
+        assert all(isinstance(result, YOLOv11Error) for result in results)
+
+    def test_close_detects_pending_images_before_closing_the_detector(self):
+        fake = FakeBatchDetector()
+        batcher = DetectionBatcher(fake, max_batch_size=2, max_wait_ms=10_000)
+
+        async def scenario():
+            requests = [asyncio.create_task(batcher.detect(img)) for img in (b"a", b"b", b"c")]
+            # Lets "a" and "b" go out as a full batch and "c" wait for the timer
+            await asyncio.sleep(0)
+
+            await batcher.close()
+
+            return await asyncio.wait_for(asyncio.gather(*requests), 1)
+
+        assert asyncio.run(scenario()) == [["a"], ["b"], ["c"]]
+        assert fake.batches == [[b"a", b"b"], [b"c"]]
+        assert fake.closed_with_batches == 2
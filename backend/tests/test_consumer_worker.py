@@ -0,0 +1,25 @@
+from backend.infra.consumer_worker import RestartBackoff
+
+class TestRestartBackoff:
+    def test_delay_doubles_up_to_the_cap(self):
+        backoff = RestartBackoff(max_restarts=10, window_seconds=300, base_delay=1.0, max_delay=5.0)
+
+        delays = [backoff.next_delay(now=float(i)) for i in range(5)]
+
+        assert delays == [1.0, 2.0, 4.0, 5.0, 5.0]
+
+    def test_gives_up_after_too_many_restarts_within_the_window(self):
+        backoff = RestartBackoff(max_restarts=3, window_seconds=60)
+
+        for now in (0.0, 1.0, 2.0):
+            assert backoff.next_delay(now) is not None
+
+        assert backoff.next_delay(3.0) is None
+
+    def test_restarts_outside_the_window_are_forgotten(self):
+        backoff = RestartBackoff(max_restarts=3, window_seconds=60, base_delay=1.0)
+
+        for now in (0.0, 1.0, 2.0):
+            backoff.next_delay(now)
+
+        assert backoff.next_delay(61.5) == 2.0
@@ -0,0 +1,114 @@
+import asyncio
+from datetime import datetime
+from unittest.mock import Mock
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from backend.main import app
+from backend.infra.db import RDS, ThreadPoolRDS
+
+@pytest.fixture(autouse=True)
+def setup_app_state():
+    app.state.logger = Mock()
+    app.state.logger.log_error = Mock()
+
+@pytest.fixture
+def rds():
+    return RDS(create_engine("sqlite://", poolclass=StaticPool, connect_args={ "check_same_thread": False }))
+
+class TestSnapCatalogPagination:
+    def test_keyset_pages_cover_every_snap_once_newest_first(self, rds):
+        # Two snaps share each timestamp so pages have to break ties on s3_key
+        rds.reconcile_user_snaps(1, [
+            {
+                "s3_key": f"1/snap/{i}.jpg",
+                "img_url": f"https://example.com/{i}.jpg",
+                "file_size": 1024,
+                "content_type": "image/jpeg",
+                "created_at": datetime(2025, 1, 1 + i // 2),
+            }
+            for i in range(7)
+        ], rds.read_snap_catalog_clock())
+        rds.create_snap(2, "2/snap/other.jpg", "https://example.com/other.jpg", 1024, "image/jpeg")
+
+        pages, after = [], None
+
+        while page := rds.read_snaps(1, limit=3, after=after):
+            pages.append([snap["s3_key"] for snap in page])
+            after = (datetime.fromisoformat(page[-1]["created_at"]), page[-1]["s3_key"])
+
+        assert pages == [
+            ["1/snap/6.jpg", "1/snap/5.jpg", "1/snap/4.jpg"],
+            ["1/snap/3.jpg", "1/snap/2.jpg", "1/snap/1.jpg"],
+            ["1/snap/0.jpg"],
+        ]
+        assert [snap["s3_key"] for snap in rds.read_snaps(1)] == sum(pages, [])
+
+class TestThreadPoolRDS:
+    def test_rds_methods_are_awaited_on_the_executor(self, rds):
+        thread_pool_rds = ThreadPoolRDS(rds)
+
+        try:
+            assert asyncio.run(thread_pool_rds.get_snap_count(1)) == 0
+
+        finally:
+            asyncio.run(thread_pool_rds.dispose())
+
+    @pytest.mark.parametrize("name", ["SessionLocal", "not_an_rds_method", "_hash_password"])
+    def test_other_attributes_are_not_wrapped(self, rds, name):
+        thread_pool_rds = ThreadPoolRDS(rds)
+
+        with pytest.raises(AttributeError):
+            getattr(thread_pool_rds, name)
+
+class TestAsyncRDSParity:
+    def test_async_rds_returns_what_rds_returns(self, rds):
+        pytest.importorskip("aiosqlite")
+
+        from sqlalchemy.ext.asyncio import create_async_engine
+        from backend.infra.db import AsyncRDS
+
+        async def run_async() -> list:
+            async_rds = AsyncRDS(create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool))
+            await async_rds.create_tables()
+
+            try:
+                return [
+                    await async_rds.create_user("Ada", username="ada", password="secret", email="ada@example.com"),
+                    await async_rds.create_user("Bob", oauth_provider="google", oauth_provider_user_id="g-1"),
+                    await async_rds.update_user(1, first_name="Ada L"),
+                    await async_rds.create_snap(1, "1/snap/a.jpg", "https://example.com/a.jpg", 1024, "image/jpeg"),
+                    await async_rds.get_snap_count(1),
+                    await async_rds.check_normal_login_creds("ada@example.com", "secret"),
+                    await async_rds.check_normal_login_creds("ada", "wrong"),
+                    await async_rds.fetch_normal_user("ada", "secret"),
+                    await async_rds.check_and_fetch_oauth_login_creds("g-1"),
+                    await async_rds.create_user_preference(1, "dark"),
+                    await async_rds.read_user_preference(1),
+                    await async_rds.delete_snap("1/snap/a.jpg"),
+                    await async_rds.read_newest_snap(1),
+                ]
+
+            finally:
+                await async_rds.dispose()
+
+        def run_sync() -> list:
+            return [
+                rds.create_user("Ada", username="ada", password="secret", email="ada@example.com"),
+                rds.create_user("Bob", oauth_provider="google", oauth_provider_user_id="g-1"),
+                rds.update_user(1, first_name="Ada L"),
+                rds.create_snap(1, "1/snap/a.jpg", "https://example.com/a.jpg", 1024, "image/jpeg"),
+                rds.get_snap_count(1),
+                rds.check_normal_login_creds("ada@example.com", "secret"),
+                rds.check_normal_login_creds("ada", "wrong"),
+                rds.fetch_normal_user("ada", "secret"),
+                rds.check_and_fetch_oauth_login_creds("g-1"),
+                rds.create_user_preference(1, "dark"),
+                rds.read_user_preference(1),
+                rds.delete_snap("1/snap/a.jpg"),
+                rds.read_newest_snap(1),
+            ]
+
+        assert asyncio.run(run_async()) == run_sync()
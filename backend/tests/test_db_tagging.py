@@ -0,0 +1,188 @@
+import os
+import asyncio
+from datetime import datetime, timezone
+from unittest.mock import Mock, AsyncMock, patch
+
+import pytest
+
+from backend.main import app
+from backend.infra.db_tagging import MongoDB, MongoDBError, MongoDBIndexError, IMAGE_TAGS_INDEXES
+
+@pytest.fixture(autouse=True)
+def setup_app_state():
+    app.state.logger = Mock()
+    app.state.logger.log_error = Mock()
+
+class FakeAsyncCursor:
+    "Stand-in for pymongo's AsyncCursor that records how many documents were pulled"
+
+    def __init__(self, documents, error=None):
+        self.documents = documents
+        self.error = error
+        self.pulled = 0
+        self.closed = False
+
+    def sort(self, key, direction):
+        self.sort_args = (key, direction)
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.closed = True
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.error:
+            raise self.error
+
+        if self.pulled == len(self.documents):
+            raise StopAsyncIteration
+
+        self.pulled += 1
+
+        return self.documents[self.pulled - 1]
+
+class TestStreamImgTagsAndCaptions:
+    @patch("backend.infra.db_tagging.ASYNC_MONGO_COLLECTION")
+    def test_find_uses_projection_batch_size_and_newest_first(self, mock_collection):
+        cursor = FakeAsyncCursor([{ "s3_key": "1/snap/a.jpg", "tags": [], "caption": "" }])
+        mock_collection.find.return_value = cursor
+
+        async def scenario():
+            return [doc async for doc in MongoDB.stream_img_tags_and_captions(1)]
+
+        documents = asyncio.run(scenario())
+
+        assert documents == [{ "s3_key": "1/snap/a.jpg", "tags": [], "caption": "" }]
+        assert mock_collection.find.call_args[0][0] == { "user_id": 1 }
+        assert mock_collection.find.call_args[1]["projection"] == {
+            "_id": 0, "s3_key": 1, "tags": 1, "caption": 1, "created_at": 1,
+        }
+        assert "batch_size" in mock_collection.find.call_args[1]
+        assert cursor.sort_args == ("created_at", -1)
+        assert cursor.closed
+
+    @patch("backend.infra.db_tagging.ASYNC_MONGO_COLLECTION")
+    def test_documents_are_pulled_as_they_are_consumed(self, mock_collection):
+        cursor = FakeAsyncCursor([{ "s3_key": f"1/snap/{i}.jpg" } for i in range(1000)])
+        mock_collection.find.return_value = cursor
+
+        async def scenario():
+            async for _ in MongoDB.stream_img_tags_and_captions(1):
+                break
+
+        asyncio.run(scenario())
+
+        assert cursor.pulled == 1
+
+    @patch("backend.infra.db_tagging.ASYNC_MONGO_COLLECTION")
+    def test_read_failure_is_logged_and_raised(self, mock_collection):
+        mock_collection.find.return_value = FakeAsyncCursor([], error=ConnectionError("mongo down"))
+
+        async def scenario():
+            return [doc async for doc in MongoDB.stream_img_tags_and_captions(1)]
+
+        with pytest.raises(MongoDBError):
+            asyncio.run(scenario())
+
+        app.state.logger.log_error.assert_called_once()
+
+class TestEnsureIndexes:
+    @patch("backend.infra.db_tagging.ASYNC_MONGO_COLLECTION")
+    def test_matching_indexes_pass(self, mock_collection):
+        mock_collection.create_indexes = AsyncMock()
+        mock_collection.index_information = AsyncMock(return_value={
+            "_id_": { "key": [("_id", 1)] },
+            "user_id_1_created_at_-1": { "key": [("user_id", 1), ("created_at", -1)] },
+            "s3_key_1": { "key": [("s3_key", 1)], "unique": True },
+        })
+
+        asyncio.run(MongoDB.ensure_indexes())
+
+        mock_collection.create_indexes.assert_awaited_once_with(IMAGE_TAGS_INDEXES)
+
+    @patch("backend.infra.db_tagging.ASYNC_MONGO_COLLECTION")
+    def test_non_unique_s3_key_index_is_reported(self, mock_collection):
+        mock_collection.create_indexes = AsyncMock()
+        mock_collection.index_information = AsyncMock(return_value={
+            "user_id_1_created_at_-1": { "key": [("user_id", 1), ("created_at", -1)] },
+            "s3_key_1": { "key": [("s3_key", 1)] },
+        })
+
+        with pytest.raises(MongoDBIndexError, match="s3_key_1"):
+            asyncio.run(MongoDB.ensure_indexes())
+
+        app.state.logger.log_error.assert_called_once()
+
+def plan_stages(plan) -> list[dict]:
+    "Every stage in an explain() plan, whichever plan shape the server version reports"
+
+    if isinstance(plan, list):
+        return [stage for item in plan for stage in plan_stages(item)]
+
+    if not isinstance(plan, dict):
+        return []
+
+    stages = [plan] if "stage" in plan else []
+
+    return stages + [stage for value in plan.values() for stage in plan_stages(value)]
+
+class TestIndexUsage:
+    "Runs against a real MongoDB, MONGO_TEST_CONNECTION_STRING or a local mongod, skipped without one"
+
+    @pytest.fixture
+    def collection(self):
+        from pymongo import MongoClient
+        from pymongo.errors import PyMongoError
+        from backend.infra.mongo_index_migration import convert_string_created_at, create_indexes
+
+        client = MongoClient(os.getenv("MONGO_TEST_CONNECTION_STRING", "mongodb://localhost:27017"), serverSelectionTimeoutMS=500)
+
+        try:
+            client.admin.command("ping")
+
+        except PyMongoError:
+            pytest.skip("no MongoDB to explain against")
+
+        collection = client["firesnaps_index_test"]["image_tags"]
+        collection.drop()
+        collection.insert_many([
+            {
+                "user_id": user_id,
+                "s3_key": f"{user_id}/snap/{i}.jpg",
+                "tags": ["dog"],
+                "caption": "",
+                "created_at": datetime(2025, 1, 1, tzinfo=timezone.utc).replace(minute=i % 60).isoformat(),
+            }
+            for user_id in range(1, 21)
+            for i in range(50)
+        ])
+
+        convert_string_created_at(collection)
+        assert create_indexes(collection) == []
+
+        yield collection
+
+        client.drop_database("firesnaps_index_test")
+        client.close()
+
+    def test_created_at_is_stored_as_a_date(self, collection):
+        assert isinstance(collection.find_one()["created_at"], datetime)
+
+    def test_listing_walks_the_compound_index_without_sorting(self, collection):
+        plan = collection.find({ "user_id": 3 }).sort("created_at", -1).explain()
+        stages = plan_stages(plan["queryPlanner"]["winningPlan"])
+
+        assert any(stage["stage"] == "IXSCAN" and stage.get("indexName") == "user_id_1_created_at_-1" for stage in stages)
+        assert not any(stage["stage"] == "SORT" for stage in stages)
+
+    def test_s3_key_lookups_use_the_unique_index(self, collection):
+        plan = collection.find({ "s3_key": "3/snap/7.jpg" }).explain()
+        stages = plan_stages(plan["queryPlanner"]["winningPlan"])
+
+        assert any(stage.get("indexName") == "s3_key_1" for stage in stages) \
+            or any(stage["stage"] == "EXPRESS_IXSCAN" for stage in stages)
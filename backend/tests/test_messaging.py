@@ -0,0 +1,788 @@
+import json
+import asyncio
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock, AsyncMock, patch
+
+import pytest
+from pymongo import UpdateOne, DeleteOne
+from pymongo.errors import BulkWriteError
+
+from backend.main import app
+from backend.infra.messaging import (
+    AdaptiveTokenBucket,
+    KafkaProducerGateway,
+    KafkaDeliveryError,
+    KafkaMessageMissingTagsError,
+    send_kafka_message,
+    PROCESSED_MESSAGE_TTL_SECONDS,
+    PartitionOffsetTracker,
+    process_batch,
+    process_batch_concurrently,
+    process_with_retries,
+    S3_BUCKET,
+    MONGODB_BUCKET,
+)
+
+@pytest.fixture(autouse=True)
+def setup_app_state():
+    app.state.logger = Mock()
+    app.state.logger.log_error = Mock()
+
+@pytest.fixture(autouse=True)
+def no_backpressure_sleep():
+    with patch("backend.infra.messaging.time.sleep") as mock:
+        yield mock
+
+class FakeProducer:
+    "Stand-in for confluent_kafka.Producer that serves delivery reports on poll"
+
+    def __init__(self, error=None, buffer_errors=0):
+        self.error = error
+        self.buffer_errors = buffer_errors
+        self.pending = []
+        self.produced = []
+        self.flushes = 0
+
+    def produce(self, topic, key, value, on_delivery):
+        if self.buffer_errors:
+            self.buffer_errors -= 1
+            raise BufferError("Local: Queue full")
+
+        msg = Mock()
+        msg.topic.return_value = topic
+        msg.offset.return_value = len(self.produced)
+
+        self.produced.append((topic, key, value))
+        self.pending.append((on_delivery, msg))
+
+    def poll(self, timeout):
+        pending, self.pending = self.pending, []
+
+        for on_delivery, msg in pending:
+            on_delivery(self.error, msg)
+
+        return len(pending)
+
+    def flush(self, timeout):
+        self.flushes += 1
+        self.poll(timeout)
+        return 0
+
+class UnreachableBrokerProducer(FakeProducer):
+    "Accepts messages but never gets a delivery report back"
+
+    def poll(self, timeout):
+        return 0
+
+    def flush(self, timeout):
+        self.flushes += 1
+        return len(self.pending)
+
+class FakeRecord:
+    "Stand-in for a consumed confluent_kafka.Message"
+
+    def __init__(self, topic, message, partition=0, offset=0, key=None):
+        self._topic = topic
+        self._value = json.dumps(message).encode("utf-8")
+        self._partition = partition
+        self._offset = offset
+        self._key = (key or "").encode("utf-8")
+
+    def error(self):
+        return None
+
+    def topic(self):
+        return self._topic
+
+    def value(self):
+        return self._value
+
+    def key(self):
+        return self._key
+
+    def partition(self):
+        return self._partition
+
+    def offset(self):
+        return self._offset
+
+def add_img_tags_record(s3_key, offset=0, message_id=None):
+    return FakeRecord("mongodb.add_img_tags", {
+        "message_id": message_id,
+        "operation": "add_img_tags",
+        "user_id": 1,
+        "s3_key": s3_key,
+        "tags": ["dog"],
+        "caption": "",
+        "created_at": "2025-01-01T00:00:00",
+    }, offset=offset, key=s3_key)
+
+def write_img_caption_record(s3_key, caption, offset=0):
+    return FakeRecord("mongodb.write_img_caption", {
+        "operation": "write_img_caption",
+        "s3_key": s3_key,
+        "caption": caption,
+    }, offset=offset, key=s3_key)
+
+class TestKafkaProducerGateway:
+    def test_send_awaits_delivery_report(self):
+        async def scenario():
+            producer = FakeProducer()
+            gateway = KafkaProducerGateway(producer, poll_timeout=0.01)
+            gateway.start()
+
+            await gateway.send("redis.delete_session", "session:1", { "operation": "delete_session" })
+            await gateway.stop()
+
+            return producer
+
+        producer = asyncio.run(scenario())
+
+        assert producer.produced[0][0] == "redis.delete_session"
+        assert producer.produced[0][1] == b"session:1"
+
+    def test_send_raises_on_failed_delivery(self):
+        async def scenario():
+            gateway = KafkaProducerGateway(FakeProducer(error="Broker: Not leader"), poll_timeout=0.01)
+            gateway.start()
+
+            try:
+                await gateway.send("redis.add_otp", "a@b.co", { "operation": "add_otp" })
+
+            finally:
+                await gateway.stop()
+
+        with pytest.raises(KafkaDeliveryError):
+            asyncio.run(scenario())
+
+    def test_send_gives_up_when_no_delivery_report_arrives(self):
+        async def scenario():
+            gateway = KafkaProducerGateway(UnreachableBrokerProducer(), poll_timeout=0.01, flush_timeout=0.05)
+            gateway.start()
+
+            try:
+                await gateway.send("redis.add_otp", "a@b.co", { "operation": "add_otp" })
+
+            finally:
+                await gateway.stop(timeout=0)
+
+        with pytest.raises(KafkaDeliveryError, match="no delivery report"):
+            asyncio.run(scenario())
+
+    def test_group_commit_send_gives_up_after_a_partial_flush(self):
+        async def scenario():
+            gateway = KafkaProducerGateway(UnreachableBrokerProducer(), group_commit_window_ms=5, flush_timeout=0.05)
+            gateway.start()
+
+            try:
+                await gateway.send("redis.add_otp", "a@b.co", { "operation": "add_otp" })
+
+            finally:
+                await gateway.stop(timeout=0)
+
+        with pytest.raises(KafkaDeliveryError, match="no delivery report"):
+            asyncio.run(scenario())
+
+    def test_send_without_wait_logs_failed_delivery(self):
+        async def scenario():
+            gateway = KafkaProducerGateway(FakeProducer(error="Broker: Not leader"), poll_timeout=0.01)
+            gateway.start()
+
+            await gateway.send("s3.delete_snap", "1/snap/a.jpg", { "operation": "delete_snap" }, wait=False)
+            await gateway.stop()
+
+        asyncio.run(scenario())
+
+        app.state.logger.log_error.assert_called_once()
+
+    def test_produce_retries_when_local_queue_is_full(self):
+        async def scenario():
+            producer = FakeProducer(buffer_errors=1)
+            gateway = KafkaProducerGateway(producer, poll_timeout=0.01)
+            gateway.start()
+
+            await gateway.send("mongodb.write_img_caption", "1/snap/a.jpg", { "operation": "write_img_caption" })
+            await gateway.stop()
+
+            return producer
+
+        assert len(asyncio.run(scenario()).produced) == 1
+
+    def test_group_commit_acknowledges_concurrent_sends_with_one_flush(self):
+        async def scenario():
+            producer = FakeProducer()
+            gateway = KafkaProducerGateway(producer, group_commit_window_ms=20)
+            gateway.start()
+
+            await asyncio.gather(*(
+                gateway.send("redis.add_new_session", f"session:{i}", { "operation": "add_new_session" })
+                for i in range(50)
+            ))
+            await gateway.stop()
+
+            return producer
+
+        producer = asyncio.run(scenario())
+
+        assert len(producer.produced) == 50
+        # One group-commit flush for the window plus the final flush from stop()
+        assert producer.flushes == 2
+
+class CallerDeliveryError(Exception):
+    pass
+
+class CallerProduceError(Exception):
+    pass
+
+class TestSendKafkaMessage:
+    @pytest.mark.parametrize("gateway_error, raised", [
+        (KafkaDeliveryError("redis.add_otp: Broker: Not leader"), CallerDeliveryError),
+        (BufferError("Local: Queue full"), CallerProduceError),
+    ])
+    def test_gateway_errors_become_the_callers_errors(self, gateway_error, raised):
+        with patch("backend.infra.messaging.producer_gateway") as mock_gateway:
+            mock_gateway.send = AsyncMock(side_effect=gateway_error)
+
+            with pytest.raises(raised, match="in add_otp"):
+                asyncio.run(send_kafka_message(
+                    "add_otp",
+                    "redis.add_otp",
+                    "a@b.co",
+                    { "operation": "add_otp" },
+                    (CallerDeliveryError, CallerProduceError),
+                ))
+
+        app.state.logger.log_error.assert_called_once()
+
+    def test_fire_and_forget_sends_go_through_the_background_gateway(self):
+        with patch("backend.infra.messaging.producer_gateway") as mock_gateway, \
+             patch("backend.infra.messaging.background_producer_gateway") as mock_background_gateway:
+            mock_gateway.send = AsyncMock()
+            mock_background_gateway.send = AsyncMock()
+
+            asyncio.run(send_kafka_message(
+                "add_otp",
+                "redis.add_otp",
+                "a@b.co",
+                { "operation": "add_otp", "written_through": True },
+                (CallerDeliveryError, CallerProduceError),
+                wait=False,
+            ))
+
+        mock_gateway.send.assert_not_called()
+        mock_background_gateway.send.assert_awaited_once()
+
+class TestProcessBatchMongoDB:
+    @patch("backend.infra.messaging.MONGO_COLLECTION")
+    def test_mongodb_records_are_written_in_one_ordered_bulk_write(self, mock_collection):
+        records = [
+            add_img_tags_record("1/snap/a.jpg", offset=0),
+            write_img_caption_record("1/snap/a.jpg", "first", offset=1),
+            FakeRecord("mongodb.delete_img_tags_and_captions", {
+                "operation": "delete_img_tags_and_captions",
+                "s3_key": "1/snap/a.jpg",
+            }, offset=2),
+        ]
+
+        succeeded, failed = process_batch(records)
+
+        assert succeeded == records
+        assert failed == []
+        mock_collection.bulk_write.assert_called_once()
+        writes = mock_collection.bulk_write.call_args[0][0]
+
+        assert [type(write) for write in writes] == [UpdateOne, UpdateOne, DeleteOne]
+        assert writes[0]._doc["$set"]["created_at"] == datetime(2025, 1, 1)
+        assert mock_collection.bulk_write.call_args[1]["ordered"] is True
+        mock_collection.insert_one.assert_not_called()
+
+    @patch("backend.infra.messaging.MONGO_COLLECTION")
+    def test_bulk_write_error_is_mapped_to_failing_record(self, mock_collection):
+        mock_collection.bulk_write.side_effect = [
+            BulkWriteError({ "writeErrors": [{ "index": 1, "code": 11000, "errmsg": "duplicate key" }] }),
+            None,
+        ]
+
+        records = [
+            add_img_tags_record("1/snap/a.jpg", offset=10),
+            add_img_tags_record("1/snap/b.jpg", offset=11),
+            add_img_tags_record("1/snap/c.jpg", offset=12),
+        ]
+
+        succeeded, failed = process_batch(records)
+
+        assert succeeded == [records[0], records[2]]
+        assert [record for record, _ in failed] == [records[1]]
+        # The writes after the failing one are sent again in their own bulk_write
+        assert len(mock_collection.bulk_write.call_args_list[1][0][0]) == 1
+
+    @patch("backend.infra.messaging.MONGO_COLLECTION")
+    def test_later_delete_for_a_failed_key_is_not_applied_ahead_of_the_retried_write(self, mock_collection):
+        mock_collection.bulk_write.side_effect = [
+            BulkWriteError({ "writeErrors": [{ "index": 0, "code": 11000, "errmsg": "duplicate key" }] }),
+            None,
+            None,
+        ]
+
+        records = [
+            add_img_tags_record("1/snap/a.jpg", offset=0),
+            FakeRecord("mongodb.delete_img_tags_and_captions", {
+                "operation": "delete_img_tags_and_captions",
+                "s3_key": "1/snap/a.jpg",
+            }, offset=1, key="1/snap/a.jpg"),
+            add_img_tags_record("1/snap/b.jpg", offset=2),
+        ]
+
+        tracker = PartitionOffsetTracker(records)
+        process_with_retries(records, tracker)
+
+        sent = [
+            [(type(write), write._filter["s3_key"]) for write in call[0][0]]
+            for call in mock_collection.bulk_write.call_args_list
+        ]
+
+        assert sent == [
+            [(UpdateOne, "1/snap/a.jpg"), (DeleteOne, "1/snap/a.jpg"), (UpdateOne, "1/snap/b.jpg")],
+            # The delete for a.jpg waits for the retry instead of going out with b.jpg
+            [(UpdateOne, "1/snap/b.jpg")],
+            [(UpdateOne, "1/snap/a.jpg"), (DeleteOne, "1/snap/a.jpg")],
+        ]
+        assert tracker.positions()[1] == []
+
+class TestProcessBatchRedis:
+    @patch("backend.infra.messaging.REDIS_CLIENT")
+    def test_redis_records_share_one_pipeline(self, mock_redis):
+        pipeline = mock_redis.pipeline.return_value
+        pipeline.execute.return_value = [1, True, 1, 1, 1]
+
+        records = [
+            FakeRecord("redis.add_new_session", {
+                "operation": "add_new_session",
+                "session_key": "session:1",
+                "user_id": 1,
+                "thumbnail_img_url": "",
+                "created_at": "2025-01-01T00:00:00",
+            }, offset=0),
+            FakeRecord("redis.place_thumbnail_img_url", {
+                "operation": "place_thumbnail_img_url",
+                "session_key": "session:1",
+                "thumbnail_img_url": "https://example.com/a.jpg",
+            }, offset=1),
+            FakeRecord("redis.add_otp", { "operation": "add_otp", "otp": 123456, "email": "a@b.co" }, offset=2),
+        ]
+
+        succeeded, failed = process_batch(records)
+
+        assert len(succeeded) == 3
+        mock_redis.pipeline.assert_called_once_with(transaction=False)
+        pipeline.execute.assert_called_once_with(raise_on_error=False)
+        pipeline.expire.assert_called_once()
+        pipeline.publish.assert_called_once_with("session_invalidation", "session:1")
+        mock_redis.hset.assert_not_called()
+
+    @patch("backend.infra.messaging.REDIS_CLIENT")
+    def test_failed_command_only_affects_its_record(self, mock_redis):
+        pipeline = mock_redis.pipeline.return_value
+        pipeline.execute.return_value = [1, 1, Exception("WRONGTYPE"), 1, 1, 1]
+
+        records = [
+            FakeRecord("redis.delete_session", { "operation": "delete_session", "session_key": f"session:{i}" }, offset=i)
+            for i in range(3)
+        ]
+
+        succeeded, failed = process_batch(records)
+
+        assert succeeded == [records[0], records[2]]
+        assert [record for record, _ in failed] == [records[1]]
+
+    @patch("backend.infra.messaging.REDIS_CLIENT")
+    def test_applied_record_after_a_failed_one_with_its_key_is_retried_after_it(self, mock_redis):
+        pipeline = mock_redis.pipeline.return_value
+        # add_new_session fails, the delete_session queued after it in the same round trip succeeds
+        pipeline.execute.side_effect = [[Exception("OOM"), 1, 1, 1], [1, 1, 1, 1]]
+
+        records = [
+            FakeRecord("redis.add_new_session", {
+                "operation": "add_new_session",
+                "session_key": "session:1",
+                "user_id": 1,
+                "thumbnail_img_url": "",
+                "created_at": "2025-01-01T00:00:00",
+            }, offset=0, key="session:1"),
+            FakeRecord("redis.delete_session", { "operation": "delete_session", "session_key": "session:1" }, offset=1, key="session:1"),
+        ]
+
+        succeeded, failed = process_batch(records)
+
+        assert succeeded == []
+        assert [record for record, _ in failed] == records
+
+        tracker = PartitionOffsetTracker(records)
+        process_with_retries(records, tracker)
+
+        # Retried together in consumption order, so the session ends up deleted
+        queued = [call[0] for call in pipeline.method_calls if call[0] in ("hset", "delete")]
+        assert queued[-2:] == ["hset", "delete"]
+        assert tracker.positions()[1] == []
+
+class TestProcessBatchS3:
+    @patch("backend.infra.messaging.S3_CLIENT")
+    def test_single_key_deletes_are_coalesced_into_delete_objects(self, mock_s3):
+        mock_s3.delete_objects.return_value = {}
+
+        records = [
+            FakeRecord("s3.delete_snap", { "operation": "delete_snap", "s3_key": f"1/snap/{i}.jpg" }, offset=i)
+            for i in range(1500)
+        ]
+
+        succeeded, failed = process_batch(records)
+
+        assert len(succeeded) == 1500
+        assert mock_s3.delete_objects.call_count == 2
+        assert len(mock_s3.delete_objects.call_args_list[0][1]["Delete"]["Objects"]) == 1000
+        assert len(mock_s3.delete_objects.call_args_list[1][1]["Delete"]["Objects"]) == 500
+        mock_s3.delete_object.assert_not_called()
+
+    @patch("backend.infra.messaging.S3_CLIENT")
+    def test_only_failed_keys_are_retried(self, mock_s3):
+        mock_s3.delete_objects.side_effect = [
+            { "Errors": [{ "Key": "1/snap/b.jpg", "Code": "InternalError", "Message": "retry" }] },
+            {},
+        ]
+
+        records = [
+            FakeRecord("s3.delete_snap", { "operation": "delete_snap", "s3_key": "1/snap/a.jpg" }, offset=0),
+            FakeRecord("s3.delete_snap", { "operation": "delete_snap", "s3_key": "1/snap/b.jpg" }, offset=1),
+        ]
+
+        succeeded, failed = process_batch(records)
+
+        assert failed == []
+        retried_objects = mock_s3.delete_objects.call_args_list[1][1]["Delete"]["Objects"]
+        assert retried_objects == [{ "Key": "1/snap/b.jpg" }]
+
+class TestProcessBatchDeleteAllSnaps:
+    @patch("backend.infra.messaging.REDIS_CLIENT")
+    @patch("backend.infra.messaging.S3_CLIENT")
+    def test_pages_are_deleted_and_checkpointed(self, mock_s3, mock_redis):
+        mock_redis.get.return_value = None
+        mock_s3.delete_objects.return_value = {}
+        mock_s3.get_paginator.return_value.paginate.return_value = [
+            { "Contents": [{ "Key": f"1/snap/{page}_{i}.jpg" } for i in range(1000)] }
+            for page in range(3)
+        ]
+
+        succeeded, failed = process_batch([FakeRecord("s3.delete_all_snaps", { "operation": "delete_all_snaps", "user_id": 1 })])
+
+        assert len(succeeded) == 1
+        paginate_kwargs = mock_s3.get_paginator.return_value.paginate.call_args[1]
+        assert paginate_kwargs["Prefix"] == "1/snap/"
+        assert "StartAfter" not in paginate_kwargs
+
+        assert mock_s3.delete_objects.call_count == 3
+        checkpoints = [c[0][1] for c in mock_redis.set.call_args_list]
+        assert checkpoints == ["1/snap/0_999.jpg", "1/snap/1_999.jpg", "1/snap/2_999.jpg"]
+        mock_redis.delete.assert_called_once_with("checkpoint:delete_all_snaps:1")
+
+    @patch("backend.infra.messaging.REDIS_CLIENT")
+    @patch("backend.infra.messaging.S3_CLIENT")
+    def test_listing_resumes_after_checkpoint(self, mock_s3, mock_redis):
+        mock_redis.get.return_value = "1/snap/0_999.jpg"
+        mock_s3.get_paginator.return_value.paginate.return_value = []
+
+        process_batch([FakeRecord("s3.delete_all_snaps", { "operation": "delete_all_snaps", "user_id": 1 })])
+
+        paginate_kwargs = mock_s3.get_paginator.return_value.paginate.call_args[1]
+        assert paginate_kwargs["StartAfter"] == "1/snap/0_999.jpg"
+
+class TestAdaptiveTokenBucket:
+    def test_rate_increases_additively_on_fast_calls(self):
+        bucket = AdaptiveTokenBucket("redis", initial_rate=100, min_rate=10, max_rate=120, target_latency=0.05, increase_step=15)
+
+        bucket.record(0.01)
+        assert bucket.rate == 115
+
+        bucket.record(0.01)
+        assert bucket.rate == 120
+
+    def test_rate_decreases_multiplicatively_on_slow_or_throttled_calls(self):
+        bucket = AdaptiveTokenBucket("s3", initial_rate=100, min_rate=30, max_rate=1000, target_latency=0.5, increase_step=10)
+
+        bucket.record(1.0)
+        assert bucket.rate == 50
+
+        bucket.record(0.01, throttled=True)
+        assert bucket.rate == 30
+
+    def test_large_batch_within_its_per_token_budget_does_not_lower_the_rate(self):
+        bucket = AdaptiveTokenBucket(
+            "s3", initial_rate=250, min_rate=25, max_rate=3500,
+            target_latency=0.5, target_latency_per_token=0.002, increase_step=25,
+        )
+
+        bucket.record(1.2, tokens=1000)
+        assert bucket.rate == 275
+
+        # The same latency for a single key is still slow
+        bucket.record(1.2)
+        assert bucket.rate == 137.5
+
+    @pytest.mark.parametrize("bucket, latency, tokens", [
+        (S3_BUCKET, 1.2, 1000), # a full delete_objects call
+        (MONGODB_BUCKET, 0.3, 150), # a full batch in one bulk_write
+    ])
+    def test_typical_full_batches_keep_raising_the_backend_rates(self, bucket, latency, tokens):
+        with patch.object(bucket, "rate", 500):
+            bucket.record(latency, tokens=tokens)
+
+            assert bucket.rate > 500
+
+    def test_acquire_beyond_available_tokens_sleeps_off_the_debt(self, no_backpressure_sleep):
+        bucket = AdaptiveTokenBucket("mongodb", initial_rate=100, min_rate=10, max_rate=1000, target_latency=0.25, increase_step=10)
+
+        bucket.acquire(100)
+        no_backpressure_sleep.assert_not_called()
+
+        bucket.acquire(50)
+        assert no_backpressure_sleep.call_args[0][0] == pytest.approx(0.5, abs=0.05)
+
+class TestPartialBatchCommits:
+    def test_commit_stops_at_first_unfinished_offset_per_partition(self):
+        records = [
+            FakeRecord("redis.delete_session", {}, partition=0, offset=offset)
+            for offset in (5, 6, 7)
+        ] + [
+            FakeRecord("redis.delete_session", {}, partition=1, offset=offset)
+            for offset in (3, 4)
+        ]
+
+        tracker = PartitionOffsetTracker(records)
+        tracker.mark_finished([records[0], records[2], records[3], records[4]])
+
+        commits, rewinds = tracker.positions()
+
+        assert {(tp.partition, tp.offset) for tp in commits} == {(0, 6), (1, 5)}
+        assert [(tp.partition, tp.offset) for tp in rewinds] == [(0, 6)]
+
+    @patch("backend.infra.messaging.kafka_producer")
+    @patch("backend.infra.messaging.REDIS_CLIENT")
+    def test_poison_record_is_retried_then_dead_lettered(self, mock_redis, mock_producer):
+        mock_producer.produce.side_effect = lambda **kwargs: kwargs["on_delivery"](None, None)
+
+        records = [
+            FakeRecord("redis.delete_session", { "operation": "delete_session", "session_key": "session:1" }, offset=0),
+            FakeRecord("redis.delete_session", { "operation": "not_an_operation" }, offset=1),
+            FakeRecord("redis.delete_session", { "operation": "delete_session", "session_key": "session:2" }, offset=2),
+        ]
+        mock_redis.pipeline.return_value.execute.return_value = [1, 1, 1, 1]
+
+        tracker = PartitionOffsetTracker(records)
+        process_with_retries(records, tracker)
+
+        commits, rewinds = tracker.positions()
+
+        assert [(tp.partition, tp.offset) for tp in commits] == [(0, 3)]
+        assert rewinds == []
+        assert mock_producer.produce.call_count == 1
+        assert mock_producer.produce.call_args[1]["topic"] == "dead_letter.external_services"
+        assert mock_producer.produce.call_args[1]["headers"]["source_offset"] == "1"
+
+    @patch("backend.infra.messaging.kafka_producer")
+    @patch("backend.infra.messaging.REDIS_CLIENT")
+    def test_record_is_redelivered_when_dead_lettering_fails(self, mock_redis, mock_producer):
+        # No delivery report arrives before the flush times out
+        mock_producer.flush.return_value = 1
+
+        records = [
+            FakeRecord("redis.delete_session", { "operation": "not_an_operation" }, offset=0),
+            FakeRecord("redis.delete_session", { "operation": "delete_session", "session_key": "session:1" }, offset=1),
+        ]
+        mock_redis.pipeline.return_value.execute.return_value = [1, 1]
+
+        tracker = PartitionOffsetTracker(records)
+        process_with_retries(records, tracker)
+
+        commits, rewinds = tracker.positions()
+
+        assert commits == []
+        assert [(tp.partition, tp.offset) for tp in rewinds] == [(0, 0)]
+
+    @patch("backend.infra.messaging.kafka_producer")
+    @patch("backend.infra.messaging.REDIS_CLIENT")
+    def test_each_dead_letter_is_judged_by_its_own_delivery_report(self, mock_redis, mock_producer):
+        def produce(**kwargs):
+            error = "Broker: Message too large" if kwargs["headers"]["source_offset"] == "1" else None
+            kwargs["on_delivery"](error, None)
+
+        mock_producer.produce.side_effect = produce
+        # Unrelated handler messages are still queued on the shared producer
+        mock_producer.flush.return_value = 3
+
+        records = [
+            FakeRecord("redis.delete_session", { "operation": "not_an_operation" }, key=f"session:{offset}", offset=offset)
+            for offset in (0, 1)
+        ]
+
+        tracker = PartitionOffsetTracker(records)
+        process_with_retries(records, tracker)
+
+        commits, rewinds = tracker.positions()
+
+        assert [(tp.partition, tp.offset) for tp in commits] == [(0, 1)]
+        assert [(tp.partition, tp.offset) for tp in rewinds] == [(0, 1)]
+
+class TestConcurrentLanes:
+    @patch("backend.infra.messaging.REDIS_CLIENT")
+    def test_records_for_one_key_stay_in_order_in_one_lane(self, mock_redis):
+        class FakePipeline:
+            def __init__(self):
+                self.commands = 0
+
+            def hset(self, *args, **kwargs):
+                self.commands += 1
+
+            def publish(self, *args):
+                self.commands += 1
+
+            def execute(self, raise_on_error):
+                return [1] * self.commands
+
+        lane_batches = []
+        mock_redis.pipeline.side_effect = lambda transaction: FakePipeline()
+
+        records = [
+            FakeRecord("redis.place_thumbnail_img_url", {
+                "operation": "place_thumbnail_img_url",
+                "session_key": f"session:{i % 5}",
+                "thumbnail_img_url": f"https://example.com/{i}.jpg",
+            }, offset=i, key=f"session:{i % 5}")
+            for i in range(50)
+        ]
+
+        with patch("backend.infra.messaging.process_batch", wraps=process_batch) as mock_process_batch:
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                succeeded, failed = process_batch_concurrently(records, executor, lanes=4)
+
+            for call in mock_process_batch.call_args_list:
+                lane_batches.append(call[0][0])
+
+        assert len(succeeded) == 50
+        assert failed == []
+        assert len(lane_batches) > 1
+
+        for lane in lane_batches:
+            for key in { record.key() for record in lane }:
+                offsets = [record.offset() for record in lane if record.key() == key]
+                assert offsets == sorted(offsets)
+
+        lanes_per_key = {
+            key: sum(1 for lane in lane_batches if any(record.key() == key for record in lane))
+            for key in { record.key() for record in records }
+        }
+        assert set(lanes_per_key.values()) == { 1 }
+
+class TestIdempotentConsumer:
+    def test_produced_messages_carry_a_message_id(self):
+        async def scenario():
+            producer = FakeProducer()
+            gateway = KafkaProducerGateway(producer, poll_timeout=0.01)
+            gateway.start()
+
+            await gateway.send("redis.delete_session", "session:1", { "operation": "delete_session", "session_key": "session:1" })
+            await gateway.send("redis.delete_session", "session:1", { "operation": "delete_session", "session_key": "session:1" })
+            await gateway.stop()
+
+            return [json.loads(value) for _, _, value in producer.produced]
+
+        first, second = asyncio.run(scenario())
+
+        assert first["message_id"] and second["message_id"]
+        assert first["message_id"] != second["message_id"]
+
+    @patch("backend.infra.messaging.MONGO_COLLECTION")
+    @patch("backend.infra.messaging.REDIS_CLIENT")
+    def test_already_processed_messages_are_skipped(self, mock_redis, mock_collection):
+        applied = add_img_tags_record("1/snap/a.jpg", offset=0, message_id="applied")
+        fresh = add_img_tags_record("1/snap/b.jpg", offset=1, message_id="fresh")
+        mock_redis.mget.return_value = [b"1", None]
+
+        succeeded, failed = process_batch([applied, fresh])
+
+        assert succeeded == [applied, fresh]
+        assert failed == []
+        mock_redis.mget.assert_called_once_with(["processed_message:applied", "processed_message:fresh"])
+        assert len(mock_collection.bulk_write.call_args[0][0]) == 1
+        mock_redis.pipeline.return_value.set.assert_called_once_with(
+            "processed_message:fresh", 1, ex=PROCESSED_MESSAGE_TTL_SECONDS,
+        )
+
+    @patch("backend.infra.messaging.MONGO_COLLECTION")
+    @patch("backend.infra.messaging.REDIS_CLIENT")
+    def test_unreachable_dedupe_store_does_not_block_processing(self, mock_redis, mock_collection):
+        record = add_img_tags_record("1/snap/a.jpg", message_id="m")
+        mock_redis.mget.side_effect = ConnectionError("redis down")
+
+        succeeded, failed = process_batch([record])
+
+        assert succeeded == [record]
+        mock_collection.bulk_write.assert_called_once()
+        app.state.logger.log_error.assert_called()
+
+    @patch("backend.infra.messaging.MONGO_COLLECTION")
+    def test_add_img_tags_upserts_on_s3_key_without_overwriting_caption(self, mock_collection):
+        process_batch([add_img_tags_record("1/snap/a.jpg")])
+
+        write = mock_collection.bulk_write.call_args[0][0][0]
+
+        assert write._filter == { "s3_key": "1/snap/a.jpg" }
+        assert write._upsert is True
+        assert "caption" not in write._doc["$set"]
+        assert write._doc["$setOnInsert"] == { "caption": "" }
+
+    @patch("backend.infra.messaging.MONGO_COLLECTION")
+    def test_caption_updates_the_existing_tags_document(self, mock_collection):
+        mock_collection.find.return_value = [{ "s3_key": "1/snap/a.jpg" }]
+
+        succeeded, failed = process_batch([write_img_caption_record("1/snap/a.jpg", "hello")])
+
+        write = mock_collection.bulk_write.call_args[0][0][0]
+
+        assert len(succeeded) == 1
+        assert write._filter == { "s3_key": "1/snap/a.jpg" }
+        assert write._upsert is None
+
+    @patch("backend.infra.messaging.MONGO_COLLECTION")
+    def test_caption_without_tags_document_is_retried_instead_of_upserted(self, mock_collection):
+        mock_collection.find.return_value = []
+        caption = write_img_caption_record("1/snap/a.jpg", "hello", offset=0)
+        other_snap = add_img_tags_record("1/snap/b.jpg", offset=1)
+        delete = FakeRecord("mongodb.delete_img_tags_and_captions", {
+            "operation": "delete_img_tags_and_captions",
+            "s3_key": "1/snap/a.jpg",
+        }, offset=2, key="1/snap/a.jpg")
+
+        succeeded, failed = process_batch([caption, other_snap, delete])
+
+        writes = mock_collection.bulk_write.call_args[0][0]
+
+        assert succeeded == [other_snap]
+        assert [record for record, _ in failed] == [caption, delete]
+        assert isinstance(failed[0][1], KafkaMessageMissingTagsError)
+        # The caption never reaches MongoDB, the delete is applied and retried after it
+        assert [type(write) for write in writes] == [UpdateOne, DeleteOne]
+        assert writes[0]._filter == { "s3_key": "1/snap/b.jpg" }
+
+    @patch("backend.infra.messaging.REDIS_CLIENT")
+    def test_written_through_events_are_not_applied_again(self, mock_redis):
+        record = FakeRecord("redis.add_otp", {
+            "operation": "add_otp",
+            "otp": 123456,
+            "email": "a@b.co",
+            "written_through": True,
+        })
+
+        succeeded, failed = process_batch([record])
+
+        assert succeeded == [record]
+        mock_redis.pipeline.return_value.setex.assert_not_called()
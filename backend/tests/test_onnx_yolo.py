@@ -0,0 +1,165 @@
+import io
+import asyncio
+from unittest.mock import Mock, patch
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("onnxruntime")
+onnx = pytest.importorskip("onnx")
+from onnx import helper, TensorProto
+from PIL import Image
+
+from backend.main import app
+from backend.services import onnx_yolo
+from backend.services.computer_vision import yolov11_detect_img_bytes, OnnxDetector, YOLOv11Error
+
+@pytest.fixture(autouse=True)
+def setup_app_state():
+    app.state.logger = Mock()
+    app.state.logger.log_error = Mock()
+
+CLASS_NAMES = { 0: "dog", 1: "cat" }
+
+def yolo_output(*candidates: tuple[float, float, float, float, float, float]) -> np.ndarray:
+    "(4 + classes, candidates) like one image of a YOLO export, from (cx, cy, w, h, dog, cat) rows"
+    return np.array(candidates, dtype=np.float32).T
+
+def write_fixed_output_model(path, output: np.ndarray, size: int = 64, batch: int | str = 1) -> None:
+    """
+    An ONNX model shaped like a YOLO export (images Bx3xSxS in, Bx(4 + classes)xN out, names in
+    the metadata) that ignores the images and returns `output` for each of them, `batch` is
+    either a fixed size or the name of a dynamic axis
+    """
+
+    graph = helper.make_graph(
+        [
+            helper.make_node("ReduceSum", ["images", "image_axes"], ["totals"], keepdims=1),
+            helper.make_node("Reshape", ["totals", "per_image"], ["per_image_totals"]),
+            helper.make_node("Mul", ["per_image_totals", "zero"], ["nothing"]),
+            helper.make_node("Add", ["fixed", "nothing"], ["output0"]),
+        ],
+        "fixed_yolo",
+        [helper.make_tensor_value_info("images", TensorProto.FLOAT, [batch, 3, size, size])],
+        [helper.make_tensor_value_info("output0", TensorProto.FLOAT, [batch, *output.shape])],
+        initializer=[
+            helper.make_tensor("image_axes", TensorProto.INT64, [3], [1, 2, 3]),
+            helper.make_tensor("per_image", TensorProto.INT64, [3], [-1, 1, 1]),
+            helper.make_tensor("zero", TensorProto.FLOAT, [], [0.0]),
+            helper.make_tensor("fixed", TensorProto.FLOAT, [1, *output.shape], output.flatten().tolist()),
+        ],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)], ir_version=8)
+    helper.set_model_props(model, { "names": repr(CLASS_NAMES) })
+    onnx.save(model, path)
+
+def jpeg_bytes(width: int = 32, height: int = 16) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+class TestPostprocess:
+    def test_candidates_under_the_confidence_are_dropped(self):
+        output = yolo_output((10, 10, 4, 4, 0.9, 0.0), (40, 40, 4, 4, 0.2, 0.3))
+
+        assert onnx_yolo.postprocess(output, CLASS_NAMES, 0.35, 0.5) == ["dog"]
+
+    def test_overlapping_boxes_of_one_class_are_suppressed(self):
+        output = yolo_output((10, 10, 8, 8, 0.6, 0.0), (11, 10, 8, 8, 0.9, 0.0), (40, 40, 8, 8, 0.8, 0.0))
+
+        assert onnx_yolo.postprocess(output, CLASS_NAMES, 0.35, 0.5) == ["dog", "dog"]
+
+    def test_overlapping_boxes_of_different_classes_are_kept(self):
+        output = yolo_output((10, 10, 8, 8, 0.9, 0.0), (10, 10, 8, 8, 0.0, 0.8))
+
+        assert onnx_yolo.postprocess(output, CLASS_NAMES, 0.35, 0.5) == ["dog", "cat"]
+
+    def test_nothing_detected(self):
+        assert onnx_yolo.postprocess(yolo_output((10, 10, 8, 8, 0.1, 0.1)), CLASS_NAMES, 0.35, 0.5) == []
+
+class TestPreprocess:
+    def test_image_is_letterboxed_into_a_square_tensor(self):
+        tensor = onnx_yolo.preprocess(jpeg_bytes(32, 16), 64)
+
+        assert tensor.shape == (1, 3, 64, 64)
+        assert tensor.dtype == np.float32
+        # Padding rows above the 64x32 image are gray, its middle is the image
+        assert tensor[0, 0, 0, 0] == pytest.approx(114 / 255)
+        assert tensor[0, 0, 32, 32] > 0.7
+
+class TestDetect:
+    def test_model_output_becomes_class_names(self, tmp_path):
+        model_path = str(tmp_path / "yolo.onnx")
+        write_fixed_output_model(model_path, yolo_output((10, 10, 8, 8, 0.9, 0.0), (40, 40, 8, 8, 0.0, 0.7)))
+
+        onnx_yolo.load_model(model_path, 0.35, 0.5)
+
+        assert onnx_yolo.detect(jpeg_bytes()) == ["dog", "cat"]
+
+class TestDetectBatch:
+    def load(self, tmp_path, batch: int | str) -> None:
+        model_path = str(tmp_path / "yolo.onnx")
+        write_fixed_output_model(model_path, yolo_output((10, 10, 8, 8, 0.9, 0.0)), batch=batch)
+        onnx_yolo.load_model(model_path, 0.35, 0.5)
+
+    def test_dynamic_batch_export_runs_the_batch_at_once(self, tmp_path):
+        self.load(tmp_path, batch="batch")
+
+        with patch.object(onnx_yolo._session, "run", wraps=onnx_yolo._session.run) as run:
+            results = onnx_yolo.detect_batch([jpeg_bytes()] * 5)
+
+        assert results == [["dog"]] * 5
+        assert run.call_count == 1
+
+    def test_fixed_batch_export_runs_in_chunks_of_its_size(self, tmp_path):
+        self.load(tmp_path, batch=2)
+
+        with patch.object(onnx_yolo._session, "run", wraps=onnx_yolo._session.run) as run:
+            results = onnx_yolo.detect_batch([jpeg_bytes()] * 5)
+
+        assert results == [["dog"]] * 5
+        assert run.call_count == 3
+
+    def test_undecodable_image_only_fails_itself(self, tmp_path):
+        self.load(tmp_path, batch="batch")
+
+        first, broken, last = onnx_yolo.detect_batch([jpeg_bytes(), b"not an image", jpeg_bytes()])
+
+        assert first == last == ["dog"]
+        assert isinstance(broken, Exception)
+
+class TestOnnxDetector:
+    def test_detection_runs_in_the_worker_processes(self, tmp_path):
+        model_path = str(tmp_path / "yolo.onnx")
+        write_fixed_output_model(model_path, yolo_output((10, 10, 8, 8, 0.9, 0.0), (40, 40, 8, 8, 0.0, 0.7)))
+
+        async def scenario():
+            detector = OnnxDetector(model_path, processes=2)
+
+            with patch("backend.services.computer_vision.detector", detector):
+                try:
+                    return await asyncio.gather(*(yolov11_detect_img_bytes(jpeg_bytes()) for _ in range(4)))
+
+                finally:
+                    await detector.close()
+
+        assert asyncio.run(scenario()) == [["dog", "cat"]] * 4
+
+    def test_undecodable_image_raises_yolov11_error(self, tmp_path):
+        model_path = str(tmp_path / "yolo.onnx")
+        write_fixed_output_model(model_path, yolo_output((10, 10, 8, 8, 0.9, 0.0)))
+
+        async def scenario():
+            detector = OnnxDetector(model_path, processes=1)
+
+            with patch("backend.services.computer_vision.detector", detector):
+                try:
+                    return await yolov11_detect_img_bytes(b"not an image")
+
+                finally:
+                    await detector.close()
+
+        with pytest.raises(YOLOv11Error):
+            asyncio.run(scenario())
+
+        app.state.logger.log_error.assert_called_once()
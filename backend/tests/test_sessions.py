@@ -0,0 +1,84 @@
+import asyncio
+from unittest.mock import Mock, AsyncMock, patch
+
+import pytest
+
+from backend.main import app
+from backend.infra.sessions import Redis, SessionCache, SessionInvalidationListener
+
+@pytest.fixture(autouse=True)
+def setup_app_state():
+    app.state.logger = Mock()
+    app.state.logger.log_error = Mock()
+
+@pytest.fixture
+def session_cache():
+    cache = SessionCache(max_entries=2, ttl_seconds=30)
+
+    with patch("backend.infra.sessions.session_cache", cache):
+        yield cache
+
+class TestSessionCache:
+    def test_least_recently_used_session_is_evicted(self, session_cache):
+        session_cache.put("session:a", { "user_id": "1" }, session_cache.generation)
+        session_cache.put("session:b", { "user_id": "2" }, session_cache.generation)
+        session_cache.get("session:a")
+        session_cache.put("session:c", { "user_id": "3" }, session_cache.generation)
+
+        assert session_cache.get("session:a") == { "user_id": "1" }
+        assert session_cache.get("session:b") is None
+        assert session_cache.get("session:c") == { "user_id": "3" }
+
+    @patch("backend.infra.sessions.time.monotonic")
+    def test_sessions_expire_after_ttl(self, mock_monotonic, session_cache):
+        mock_monotonic.return_value = 100.0
+        session_cache.put("session:a", { "user_id": "1" }, session_cache.generation)
+
+        mock_monotonic.return_value = 131.0
+
+        assert session_cache.get("session:a") is None
+
+    def test_read_that_raced_with_an_invalidation_is_not_cached(self, session_cache):
+        generation = session_cache.generation
+        session_cache.invalidate("session:a")
+        session_cache.put("session:a", { "user_id": "1" }, generation)
+
+        assert session_cache.get("session:a") is None
+
+class TestGetCachedSession:
+    @patch("backend.infra.sessions.ASYNC_REDIS_CLIENT")
+    def test_session_is_read_from_redis_once(self, mock_redis, session_cache):
+        mock_redis.hgetall = AsyncMock(return_value={ "user_id": "1" })
+
+        assert asyncio.run(Redis.get_cached_session("session:a")) == { "user_id": "1" }
+        assert asyncio.run(Redis.get_cached_session("session:a")) == { "user_id": "1" }
+        mock_redis.hgetall.assert_awaited_once_with("session:a")
+
+    @patch("backend.infra.sessions.ASYNC_REDIS_CLIENT")
+    def test_missing_session_is_not_cached(self, mock_redis, session_cache):
+        mock_redis.hgetall = AsyncMock(side_effect=[{}, { "user_id": "1" }])
+
+        assert asyncio.run(Redis.get_cached_session("session:a")) == {}
+        assert asyncio.run(Redis.get_cached_session("session:a")) == { "user_id": "1" }
+
+class TestSessionInvalidationListener:
+    @patch("backend.infra.sessions.REDIS_CLIENT")
+    def test_published_session_keys_are_dropped_from_the_cache(self, mock_redis, session_cache):
+        listener = SessionInvalidationListener(session_cache)
+        pubsub = mock_redis.pubsub.return_value
+
+        def get_message(timeout):
+            if session_cache.get("session:a") is None:
+                # Cached again after the cache was cleared on subscribe
+                session_cache.put("session:a", { "user_id": "1" }, session_cache.generation)
+                return None
+
+            listener._stop_event.set()
+            return { "type": "message", "data": "session:a" }
+
+        pubsub.get_message.side_effect = get_message
+        listener._listen()
+
+        pubsub.subscribe.assert_called_once_with("session_invalidation")
+        assert session_cache.get("session:a") is None
+        pubsub.close.assert_called_once()
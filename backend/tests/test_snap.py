@@ -1,16 +1,21 @@
 from unittest.mock import Mock, patch, AsyncMock
 from io import BytesIO
+from datetime import datetime
 
 import pytest
 from fastapi.testclient import TestClient
 from fastapi import UploadFile
+from fastapi_csrf_protect import CsrfProtect
 
 from backend.main import app
+from backend.utils.dependencies import current_session
+from backend.utils.pagination import encode_snap_cursor, decode_snap_cursor
 
-client = TestClient(app)
+client = TestClient(app, base_url="http://localhost")
 
 @pytest.fixture(autouse=True)
 def setup_app_state():
+    app.state.rds = AsyncMock()
     app.state.logger = Mock()
     app.state.logger.log_error = Mock()
 
@@ -42,24 +47,40 @@ def mock_upload_file():
         content_type="image/jpeg"
     )
 
+@pytest.fixture
+def signed_in(mock_session):
+    csrf = Mock()
+    csrf.validate_csrf = AsyncMock()
+    app.dependency_overrides[CsrfProtect] = lambda: csrf
+    app.dependency_overrides[current_session] = lambda: mock_session
+    
+    yield
+    
+    app.dependency_overrides.pop(CsrfProtect, None)
+    app.dependency_overrides.pop(current_session, None)
+
+async def async_iter(items):
+    for item in items:
+        yield item
+
 class TestGetAllSnaps:
     @patch("backend.infra.db_tagging.MongoDB")
-    @patch("backend.infra.storage.S3")
     @patch("backend.infra.sessions.Redis")
-    def test_all_snaps_success(self, mock_redis, mock_s3, mock_mongo, mock_csrf, mock_session):
+    def test_all_snaps_success(self, mock_redis, mock_mongo, mock_csrf, mock_session):
         client.cookies.set("session_key", "test_session")
         
         mock_redis.get_session.return_value = mock_session
-        mock_s3.read_snaps.return_value = [{
+        app.state.rds.read_snaps.return_value = [{
             "img_url": "https://example.com/image.jpg",
             "created_at": "2023-01-01T00:00:00Z",
             "file_size": 1024,
             "s3_key": "test_key"
         }]
-        mock_mongo.read_img_tags_and_captions.return_value = [{
+        mock_mongo.stream_img_tags_and_captions.return_value = async_iter([{
+            "s3_key": "test_key",
             "tags": ["person", "outdoor"],
             "caption": "Test caption"
-        }]
+        }])
         
         response = client.get("/api/v1/snap/all")
         assert response.status_code == 200
@@ -70,6 +91,49 @@ class TestGetAllSnaps:
         assert data[0]["tags"] == ["person", "outdoor"]
         assert data[0]["caption"] == "Test caption"
 
+    @patch("backend.routers.snap.MongoDB")
+    def test_tags_are_joined_by_s3_key_not_position(self, mock_mongo, signed_in):
+        app.state.rds.read_snaps.return_value = [
+            { "img_url": f"https://example.com/{name}.jpg", "created_at": "2025-01-01T00:00:00", "file_size": 1024, "s3_key": name }
+            for name in ("newest", "untagged", "oldest")
+        ]
+        # Mongo sorts by its own created_at and still has a document for a snap deleted from the catalog
+        mock_mongo.stream_img_tags_and_captions.return_value = async_iter([
+            { "s3_key": "oldest", "tags": ["cat"], "caption": "Oldest" },
+            { "s3_key": "deleted", "tags": ["car"], "caption": "Deleted" },
+            { "s3_key": "newest", "tags": ["dog"], "caption": "Newest" },
+        ])
+        
+        response = client.get("/api/v1/snap/all")
+        
+        assert response.status_code == 200
+        assert [(snap["s3_key"], snap["tags"], snap["caption"]) for snap in response.json()] == [
+            ("newest", ["dog"], "Newest"),
+            ("untagged", [], ""),
+            ("oldest", ["cat"], "Oldest"),
+        ]
+
+    @patch("backend.routers.snap.MongoDB")
+    def test_tags_are_read_one_catalog_page_at_a_time(self, mock_mongo, signed_in):
+        snaps = [
+            { "img_url": f"https://example.com/{i}.jpg", "created_at": f"2025-01-0{9 - i}T00:00:00", "file_size": 1024, "s3_key": f"key_{i}" }
+            for i in range(3)
+        ]
+        app.state.rds.read_snaps.side_effect = [snaps[:2], snaps[2:]]
+        mock_mongo.stream_img_tags_and_captions.side_effect = lambda user_id, s3_keys: async_iter([
+            { "s3_key": s3_key, "tags": [s3_key], "caption": "" } for s3_key in s3_keys
+        ])
+
+        with patch("backend.routers.snap.settings.mongo_read_batch_size", 2):
+            response = client.get("/api/v1/snap/all")
+
+        assert response.status_code == 200
+        assert [snap["tags"] for snap in response.json()] == [["key_0"], ["key_1"], ["key_2"]]
+        assert [c.args[1] for c in mock_mongo.stream_img_tags_and_captions.call_args_list] == [["key_0", "key_1"], ["key_2"]]
+        # A short page is the last one, so the catalog isn't asked again
+        assert app.state.rds.read_snaps.call_args_list[1].kwargs["after"] == (datetime(2025, 1, 8), "key_1")
+        assert app.state.rds.read_snaps.call_count == 2
+
     @patch("backend.infra.sessions.Redis")
     def test_all_snaps_exception(self, mock_redis, mock_csrf):
         client.cookies.set("session_key", "test_session")
@@ -78,6 +142,59 @@ class TestGetAllSnaps:
         response = client.get("/api/v1/snap/all")
         assert response.status_code == 500
 
+@pytest.mark.usefixtures("signed_in")
+class TestSnapPagination:
+    @pytest.fixture
+    def catalog(self):
+        snaps = [
+            {
+                "img_url": f"https://example.com/{i}.jpg",
+                "created_at": f"2025-01-0{9 - i}T00:00:00",
+                "file_size": 1024,
+                "s3_key": f"test_user_id/snap/{i}.jpg",
+            }
+            for i in range(3)
+        ]
+        app.state.rds.read_snaps.return_value = snaps
+        
+        return snaps
+
+    @patch("backend.routers.snap.MongoDB")
+    def test_page_has_next_cursor_and_tags_joined_by_key(self, mock_mongo, catalog):
+        mock_mongo.stream_img_tags_and_captions.return_value = async_iter([
+            { "s3_key": "test_user_id/snap/1.jpg", "tags": ["dog"], "caption": "Second" },
+        ])
+        
+        response = client.get("/api/v1/snap/all", params={ "limit": 2 })
+        
+        assert response.status_code == 200
+        assert [snap["s3_key"] for snap in response.json()] == ["test_user_id/snap/0.jpg", "test_user_id/snap/1.jpg"]
+        assert response.json()[0]["tags"] == []
+        assert response.json()[1]["caption"] == "Second"
+        app.state.rds.read_snaps.assert_awaited_with("test_user_id", limit=3, after=None)
+        mock_mongo.stream_img_tags_and_captions.assert_called_with(
+            "test_user_id", ["test_user_id/snap/0.jpg", "test_user_id/snap/1.jpg"],
+        )
+        assert decode_snap_cursor(response.headers["X-Next-Cursor"]) == (datetime(2025, 1, 8), "test_user_id/snap/1.jpg")
+
+    @patch("backend.routers.snap.MongoDB")
+    def test_cursor_resumes_after_last_snap_and_last_page_has_no_cursor(self, mock_mongo, catalog):
+        mock_mongo.stream_img_tags_and_captions.return_value = async_iter([])
+        app.state.rds.read_snaps.return_value = catalog[2:]
+        cursor = encode_snap_cursor(catalog[1])
+        
+        response = client.get("/api/v1/snap/all", params={ "limit": 2, "cursor": cursor })
+        
+        assert response.status_code == 200
+        assert len(response.json()) == 1
+        assert "X-Next-Cursor" not in response.headers
+        app.state.rds.read_snaps.assert_awaited_with("test_user_id", limit=3, after=(datetime(2025, 1, 8), "test_user_id/snap/1.jpg"))
+
+    def test_invalid_cursor_is_rejected(self):
+        response = client.get("/api/v1/snap/all", params={ "limit": 2, "cursor": "not-a-cursor" })
+        
+        assert response.status_code == 400
+
 class TestUploadSnap:
     @patch("backend.infra.db_tagging.MongoDB")
     @patch("backend.infra.computer_vision.yolov11_detect_img_objects")
@@ -87,13 +204,14 @@ class TestUploadSnap:
         client.cookies.set("session_key", "test_session")
         
         mock_redis.get_session.return_value = mock_session
-        mock_s3.upload_snap.return_value = ("https://example.com/image.jpg", "test_s3_key")
+        mock_s3.upload_snap.return_value = ("https://example.com/image.jpg", "test_s3_key", 1024)
         mock_yolo.return_value = ["person", "outdoor"]
         
         response = client.post("/api/v1/snap/upload", files={"img_file": ("test.jpg", mock_upload_file.file, "image/jpeg")})
         assert response.status_code == 200
         
         mock_s3.upload_snap.assert_called_once()
+        app.state.rds.create_snap.assert_called_once()
         mock_redis.place_thumbnail_img_url.assert_called_with("test_session", "https://example.com/image.jpg")
         mock_mongo.add_img_tags.assert_called_with("test_user_id", "test_s3_key", ["person", "outdoor"])
 
@@ -105,6 +223,44 @@ class TestUploadSnap:
         response = client.post("/api/v1/snap/upload", files={"img_file": ("test.jpg", mock_upload_file.file, "image/jpeg")})
         assert response.status_code == 500
 
+@pytest.mark.usefixtures("signed_in")
+class TestPresignedUpload:
+    @patch("backend.routers.snap.S3")
+    def test_presigned_upload_returns_form(self, mock_s3):
+        mock_s3.create_presigned_snap_upload.return_value = {
+            "url": "https://bucket.s3.amazonaws.com/",
+            "fields": { "key": "test_user_id/snap/1_a.jpg" },
+            "s3_key": "test_user_id/snap/1_a.jpg",
+        }
+        
+        response = client.post("/api/v1/snap/upload/presigned", json={ "filename": "test.jpg" })
+        
+        assert response.status_code == 200
+        assert response.json()["s3_key"] == "test_user_id/snap/1_a.jpg"
+        mock_s3.create_presigned_snap_upload.assert_called_with("test_user_id", "test.jpg")
+
+    @patch("backend.routers.snap.MongoDB")
+    @patch("backend.routers.snap.yolov11_detect_img_bytes")
+    @patch("backend.routers.snap.S3")
+    @patch("backend.routers.snap.Redis")
+    def test_upload_complete_tags_uploaded_snap(self, mock_redis, mock_s3, mock_yolo, mock_mongo):
+        client.cookies.set("session_key", "test_session")
+        mock_s3.read_uploaded_snap = AsyncMock(return_value=("https://example.com/image.jpg", b"fake image content"))
+        mock_redis.place_thumbnail_img_url = AsyncMock()
+        mock_yolo.return_value = ["person"]
+        mock_mongo.add_img_tags = AsyncMock()
+        
+        response = client.post("/api/v1/snap/upload/complete", json={ "s3_key": "test_user_id/snap/1_a.jpg" })
+        
+        assert response.status_code == 200
+        mock_s3.read_uploaded_snap.assert_awaited_with("test_user_id", "test_user_id/snap/1_a.jpg")
+        app.state.rds.create_snap.assert_awaited_with(
+            "test_user_id", "test_user_id/snap/1_a.jpg", "https://example.com/image.jpg", 18, mock_s3.get_snap_content_type.return_value,
+        )
+        mock_redis.place_thumbnail_img_url.assert_awaited_with("test_session", "https://example.com/image.jpg")
+        mock_yolo.assert_awaited_with(b"fake image content")
+        mock_mongo.add_img_tags.assert_awaited_with("test_user_id", "test_user_id/snap/1_a.jpg", ["person"])
+
 class TestCaptionSnap:
     @patch("backend.infra.db_tagging.MongoDB")
     def test_caption_post_success(self, mock_mongo, mock_csrf, valid_caption_data):
@@ -0,0 +1,117 @@
+import time
+from datetime import datetime, timezone
+from unittest.mock import Mock, patch
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from backend.main import app
+from backend.infra.db import RDS
+from backend.infra.snap_catalog_reconciler import reconcile
+
+@pytest.fixture(autouse=True)
+def setup_app_state():
+    app.state.logger = Mock()
+    app.state.logger.log_error = Mock()
+
+@pytest.fixture
+def rds():
+    return RDS(create_engine("sqlite://", poolclass=StaticPool, connect_args={ "check_same_thread": False }))
+
+class FakeS3Paginator:
+    "Serves list_objects_v2 pages from a fixed key listing, sorted the way S3 sorts keys"
+
+    def __init__(self, objects):
+        self.objects = sorted(objects, key=lambda obj: obj["Key"])
+
+    def paginate(self, Bucket, Prefix, PaginationConfig):
+        objects = [obj for obj in self.objects if obj["Key"].startswith(Prefix)]
+        page_size = PaginationConfig["PageSize"]
+
+        for start in range(0, len(objects), page_size):
+            yield { "Contents": objects[start:start + page_size] }
+
+def s3_object(s3_key: str, day: int) -> dict:
+    return { "Key": s3_key, "Size": 1024, "LastModified": datetime(2025, 1, day, tzinfo=timezone.utc) }
+
+def create_old_snap(rds, user_id: int, s3_key: str) -> None:
+    "A catalog row from before the run, as if its object had been deleted from S3 since"
+
+    rds.reconcile_user_snaps(user_id, [{
+        "s3_key": s3_key,
+        "img_url": f"https://example.com/{s3_key}",
+        "file_size": 1,
+        "content_type": "image/jpeg",
+        "created_at": datetime(2024, 1, 1),
+    }], rds.read_snap_catalog_clock())
+
+class UploadingDuringListPaginator(FakeS3Paginator):
+    "Completes uploads through the catalog once the first page has been listed, like a user would mid-run"
+
+    def __init__(self, objects, rds, uploads):
+        super().__init__(objects)
+        self.rds = rds
+        self.uploads = uploads
+
+    def paginate(self, Bucket, Prefix, PaginationConfig):
+        for page in super().paginate(Bucket, Prefix, PaginationConfig):
+            yield page
+
+            if self.uploads:
+                # sqlite's CURRENT_TIMESTAMP only has whole seconds, the uploads have to land after the start's
+                time.sleep(1.05)
+
+            for user_id, s3_key in self.uploads:
+                self.rds.create_snap(user_id, s3_key, f"https://example.com/{s3_key}", 1, "image/jpeg")
+
+            self.uploads = []
+
+class TestReconcile:
+    @patch("backend.infra.snap_catalog_reconciler.S3_LIST_PAGE_SIZE", 2)
+    @patch("backend.infra.snap_catalog_reconciler.S3_CLIENT")
+    def test_catalog_is_rebuilt_from_s3(self, mock_s3, rds):
+        mock_s3.get_paginator.return_value = FakeS3Paginator([
+            s3_object("1/snap/a.jpg", 1),
+            s3_object("1/snap/b.png", 3),
+            s3_object("12/snap/c.jpg", 2),
+            s3_object("2/snap/d.gif", 1),
+            s3_object("2/other/e.jpg", 1),
+        ])
+        create_old_snap(rds, 1, "1/snap/deleted.jpg")
+        create_old_snap(rds, 3, "3/snap/deleted.jpg")
+
+        totals = reconcile(rds)
+
+        assert totals == { "users": 4, "upserted": 4, "deleted": 2 }
+        assert [snap["s3_key"] for snap in rds.read_snaps(1)] == ["1/snap/b.png", "1/snap/a.jpg"]
+        assert rds.read_newest_snap(1).endswith("1/snap/b.png")
+        assert rds.get_snap_count(2) == 1
+        assert rds.get_snap_count(3) == 0
+
+    @patch("backend.infra.snap_catalog_reconciler.S3_CLIENT")
+    def test_single_user_leaves_other_users_alone(self, mock_s3, rds):
+        mock_s3.get_paginator.return_value = FakeS3Paginator([s3_object("1/snap/a.jpg", 1)])
+        rds.create_snap(2, "2/snap/b.jpg", "https://example.com/b.jpg", 1, "image/jpeg")
+
+        reconcile(rds, user_id=1)
+
+        assert rds.get_snap_count(1) == 1
+        assert rds.get_snap_count(2) == 1
+
+    @patch("backend.infra.snap_catalog_reconciler.S3_LIST_PAGE_SIZE", 1)
+    @patch("backend.infra.snap_catalog_reconciler.S3_CLIENT")
+    def test_snaps_uploaded_during_the_run_are_kept(self, mock_s3, rds):
+        # 1/snap/late.jpg lands after 1/'s page was listed, 3/ uploads its first snap mid-run
+        mock_s3.get_paginator.return_value = UploadingDuringListPaginator(
+            [s3_object("1/snap/a.jpg", 1), s3_object("2/snap/b.jpg", 1)],
+            rds,
+            [(1, "1/snap/late.jpg"), (3, "3/snap/first.jpg")],
+        )
+        create_old_snap(rds, 1, "1/snap/deleted.jpg")
+
+        totals = reconcile(rds)
+
+        assert totals["deleted"] == 1
+        assert sorted(snap["s3_key"] for snap in rds.read_snaps(1)) == ["1/snap/a.jpg", "1/snap/late.jpg"]
+        assert rds.get_snap_count(3) == 1
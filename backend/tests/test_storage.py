@@ -0,0 +1,122 @@
+import asyncio
+from io import BytesIO
+from unittest.mock import Mock, patch
+
+import pytest
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+
+from backend.main import app
+from backend.infra.storage import S3, S3FileSizeError, S3SnapKeyError, SizeCappedReader
+
+@pytest.fixture(autouse=True)
+def setup_app_state():
+    app.state.logger = Mock()
+    app.state.logger.log_error = Mock()
+
+def make_upload_file(content: bytes, size: int | None = None) -> UploadFile:
+    return UploadFile(
+        BytesIO(content),
+        size=size,
+        filename="test.jpg",
+        headers=Headers({ "content-type": "image/jpeg" }),
+    )
+
+class FakeS3Client:
+    "Reads the upload the way s3transfer does, a chunk at a time"
+
+    def __init__(self):
+        self.uploaded = b""
+        self.config = None
+
+    def upload_fileobj(self, Bucket, Key, Fileobj, ExtraArgs, Config):
+        self.config = Config
+
+        while chunk := Fileobj.read(4):
+            self.uploaded += chunk
+
+        Fileobj.close()
+
+class TestUploadSnap:
+    @patch("backend.infra.storage.S3_CLIENT", new_callable=FakeS3Client)
+    def test_upload_is_streamed_and_file_is_rewound(self, mock_s3):
+        img_file = make_upload_file(b"fake image content")
+
+        asyncio.run(S3.upload_snap(1, img_file))
+
+        assert mock_s3.uploaded == b"fake image content"
+        assert mock_s3.config.multipart_chunksize > 0
+        assert asyncio.run(img_file.read()) == b"fake image content"
+
+    @patch("backend.infra.storage.S3_CLIENT", new_callable=FakeS3Client)
+    def test_streamed_size_is_returned_when_none_was_declared(self, mock_s3):
+        img_file = make_upload_file(b"fake image content", size=None)
+
+        img_url, s3_key, file_size = asyncio.run(S3.upload_snap(1, img_file))
+
+        assert file_size == len(b"fake image content")
+
+    @patch("backend.infra.storage.S3_CLIENT", new_callable=FakeS3Client)
+    def test_declared_size_over_cap_is_rejected_before_upload(self, mock_s3):
+        img_file = make_upload_file(b"x", size=21 * 1024 * 1024)
+
+        with pytest.raises(S3FileSizeError):
+            asyncio.run(S3.upload_snap(1, img_file))
+
+        assert mock_s3.config is None
+        app.state.logger.log_error.assert_called_once()
+
+    @patch("backend.infra.storage.settings")
+    @patch("backend.infra.storage.S3_CLIENT", new_callable=FakeS3Client)
+    def test_cap_is_enforced_while_streaming(self, mock_s3, mock_settings):
+        mock_settings.snap_upload_max_bytes = 8
+        img_file = make_upload_file(b"fake image content")
+
+        with pytest.raises(S3FileSizeError):
+            asyncio.run(S3.upload_snap(1, img_file))
+
+        assert len(mock_s3.uploaded) <= 8
+
+class TestSizeCappedReader:
+    def test_seeking_past_the_cap_fails(self):
+        reader = SizeCappedReader(BytesIO(b"0123456789"), max_bytes=5)
+
+        with pytest.raises(S3FileSizeError):
+            reader.seek(0, 2)
+
+class TestPresignedSnapUpload:
+    @pytest.fixture
+    def moto_s3(self):
+        moto = pytest.importorskip("moto")
+        boto3 = pytest.importorskip("boto3")
+
+        with moto.mock_aws():
+            s3_client = boto3.client("s3", region_name="us-east-1")
+            s3_client.create_bucket(Bucket="snaps")
+
+            with patch("backend.infra.storage.S3_CLIENT", s3_client), patch("backend.infra.storage.BUCKET_NAME", "snaps"):
+                yield s3_client
+
+    def test_presigned_post_upload_can_be_completed(self, moto_s3):
+        import requests
+
+        presigned_upload = S3.create_presigned_snap_upload(1, "test.png")
+
+        assert presigned_upload["s3_key"].startswith("1/snap/")
+        assert presigned_upload["fields"]["Content-Type"] == "image/png"
+
+        response = requests.post(
+            presigned_upload["url"],
+            data=presigned_upload["fields"],
+            files={ "file": ("test.png", b"fake image content", "image/png") },
+        )
+        assert response.status_code in (200, 204)
+
+        img_url, img_content = asyncio.run(S3.read_uploaded_snap(1, presigned_upload["s3_key"]))
+
+        assert img_url.endswith(presigned_upload["s3_key"])
+        assert img_content == b"fake image content"
+
+    def test_snaps_of_other_users_cannot_be_completed(self, moto_s3):
+        with pytest.raises(S3SnapKeyError):
+            asyncio.run(S3.read_uploaded_snap(1, "2/snap/1_a.jpg"))
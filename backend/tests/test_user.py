@@ -9,7 +9,7 @@ client = TestClient(app)
 
 @pytest.fixture(autouse=True)
 def setup_app_state():
-    app.state.rds = Mock()
+    app.state.rds = AsyncMock()
     app.state.logger = Mock()
     app.state.logger.log_error = Mock()
 
@@ -50,15 +50,14 @@ def oauth_user_data():
     }
 
 class TestUserDetails:
-    @patch("backend.infra.storage.S3")
     @patch("backend.infra.sessions.Redis")
-    def test_normal_user_details_success(self, mock_redis, mock_s3, mock_csrf, mock_session, normal_user_data):
+    def test_normal_user_details_success(self, mock_redis, mock_csrf, mock_session, normal_user_data):
         client.cookies.set("session_key", "test_session")
         
         mock_redis.get_session.return_value = mock_session
         app.state.rds.read_user.return_value = normal_user_data
         app.state.rds.read_user_preference.return_value = {}
-        mock_s3.get_snap_count.return_value = 5
+        app.state.rds.get_snap_count.return_value = 5
         
         response = client.get("/api/v1/user/details")
         assert response.status_code == 200
@@ -69,15 +68,14 @@ class TestUserDetails:
         assert data["email"] == "john@example.com"
         assert data["snap_count"] == 5
 
-    @patch("backend.infra.storage.S3")
     @patch("backend.infra.sessions.Redis")
-    def test_oauth_user_details_success(self, mock_redis, mock_s3, mock_csrf, mock_session, oauth_user_data):
+    def test_oauth_user_details_success(self, mock_redis, mock_csrf, mock_session, oauth_user_data):
         client.cookies.set("session_key", "test_session")
         
         mock_redis.get_session.return_value = mock_session
         app.state.rds.read_user.return_value = oauth_user_data
         app.state.rds.read_user_preference.return_value = {}
-        mock_s3.get_snap_count.return_value = 3
+        app.state.rds.get_snap_count.return_value = 3
         
         response = client.get("/api/v1/user/details")
         assert response.status_code == 200
@@ -183,13 +181,12 @@ class TestUserDelete:
 
 class TestRateLimiting:
     @patch("backend.infra.sessions.Redis")
-    @patch("backend.infra.storage.S3")
-    def test_details_rate_limit(self, mock_s3, mock_redis, mock_csrf, mock_session, normal_user_data):
+    def test_details_rate_limit(self, mock_redis, mock_csrf, mock_session, normal_user_data):
         client.cookies.set("session_key", "test_session")
         mock_redis.get_session.return_value = mock_session
         app.state.rds.read_user.return_value = normal_user_data
         app.state.rds.read_user_preference.return_value = {}
-        mock_s3.get_snap_count.return_value = 0
+        app.state.rds.get_snap_count.return_value = 0
         
         # Simulate rate limit
         for _ in range(31):
@@ -0,0 +1,13 @@
+from fastapi import Request
+
+from backend.infra.sessions import Redis
+
+async def current_session(request: Request) -> dict | list:
+    "Resolves the request's session once, served from this process's session cache when possible"
+    
+    session_key = request.cookies.get("session_key")
+    
+    if not session_key:
+        return {}
+    
+    return await Redis.get_cached_session(session_key)
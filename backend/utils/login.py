@@ -1,43 +1,44 @@
+from fastapi.responses import RedirectResponse
+
 from backend.main import app
 from backend.infra.sessions import Redis
-from backend.infra.storage import S3
 
 class OAuthError(Exception):
     "Exception for OAuth operations"
     pass
 
-def update_thumbnail(user_id: int, session_key: str) -> None:
-    most_recent_snap = S3.read_newest_snap(user_id)
+async def update_thumbnail(user_id: int, session_key: str) -> None:
+    most_recent_snap = await app.state.rds.read_newest_snap(user_id)
 
     if most_recent_snap == "":
         return
     
-    Redis.place_thumbnail_img_url(session_key, most_recent_snap)
+    await Redis.place_thumbnail_img_url(session_key, most_recent_snap)
     return
 
-def signup_or_login_oauth(first_name: str, provider: str, oauth_user_id: int) -> str:
+async def signup_or_login_oauth(first_name: str, provider: str, oauth_user_id: int) -> str:
     try:
-        user_id = app.state.rds.check_and_fetch_oauth_login_creds(oauth_user_id)
+        user_id = await app.state.rds.check_and_fetch_oauth_login_creds(oauth_user_id)
         new_account = True
             
         if not user_id:
-            new_user_id = app.state.rds.create_user(
+            new_user_id = await app.state.rds.create_user(
                 first_name=first_name,
                 oauth_provider=provider,
                 oauth_provider_user_id=oauth_user_id,
             )
             
-            app.state.rds.create_user_preference(new_user_id, "light")
+            await app.state.rds.create_user_preference(new_user_id, "light")
             
             user_id = new_user_id
             
         else:
             new_account = False
         
-        session_key = Redis.add_new_session(user_id)
+        session_key = await Redis.add_new_session(user_id)
          
         if not new_account:
-            update_thumbnail(user_id, session_key)
+            await update_thumbnail(user_id, session_key)
             
         return session_key
         
@@ -54,7 +55,7 @@ def redirect_and_set_cookie(session_key: str) -> RedirectResponse:
         value=session_key,
         httponly=True,
         secure=True,
-        same_site="lax",
+        samesite="lax",
         max_age=60 * 60 * 24 * 7 * 4 * 6,
     )
     
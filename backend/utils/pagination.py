@@ -0,0 +1,25 @@
+import json
+import base64
+import binascii
+from datetime import datetime
+
+class InvalidCursorError(ValueError):
+    "Exception for page cursors that weren't issued by the API"
+    pass
+
+def encode_snap_cursor(snap: dict) -> str:
+    "Opaque cursor pointing right after `snap` in a newest-first listing"
+
+    position = json.dumps([snap["created_at"], snap["s3_key"]], separators=(",", ":"))
+
+    return base64.urlsafe_b64encode(position.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_snap_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        position = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, s3_key = json.loads(position)
+
+        return datetime.fromisoformat(created_at), str(s3_key)
+
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {cursor}") from e